@@ -1,5 +1,7 @@
 import log
 import os
+import sys
+import hmac
 import logging
 
 os.environ["TZ"] = "UTC"
@@ -16,14 +18,159 @@ IS_MIGRATION = False
 HOT_RELOAD_ENABLED = API_ENV == 'debug' or API_ENV == 'hot_production'
 FORCE_RECREATE_DATA = API_ENV == 'debug' or IS_MIGRATION
 
+ADMIN_TOKEN = os.environ.get('BG_ADMIN_TOKEN')
+
+# Which versions to load at boot (comma separated, all of them if not set) and
+# how many to load at the same time
+PRELOAD_VERSIONS = os.environ.get('BG_PRELOAD_VERSIONS')
+PRELOAD_VERSIONS = PRELOAD_VERSIONS.split(',') if PRELOAD_VERSIONS else None
+PRELOAD_WORKERS = int(os.environ.get('BG_PRELOAD_WORKERS', 1))
+
+# The most work a single recipe tree request is allowed to do, requests can
+# ask for less but never more. Outside of debugging trees are always stopped
+# well before gunicorn's worker timeout (see gunicorn.conf.py).
+RECIPE_TREE_MAX_NODES = os.environ.get('BG_RECIPE_TREE_MAX_NODES')
+RECIPE_TREE_MAX_NODES = int(RECIPE_TREE_MAX_NODES) if RECIPE_TREE_MAX_NODES else None
+DEFAULT_RECIPE_TREE_MAX_SECONDS = None if API_ENV == 'debug' else 30
+RECIPE_TREE_MAX_SECONDS = os.environ.get('BG_RECIPE_TREE_MAX_SECONDS')
+RECIPE_TREE_MAX_SECONDS = (
+    float(RECIPE_TREE_MAX_SECONDS) if RECIPE_TREE_MAX_SECONDS else DEFAULT_RECIPE_TREE_MAX_SECONDS
+)
+
 BAD_REQUEST = 400
+FORBIDDEN = 403
 SERVER_ERROR = 500
+SERVICE_UNAVAILABLE = 503
+
+RECIPE_TREE_FORMATS = ["tree", "dag"]
 
 os.environ["TZ"] = "UTC"
 app = Flask(__name__)
 cors = CORS(app, resources={r"*": {"origins": "*"}})
 
 
+def is_admin_request():
+    """Admin endpoints need the admin token, without one set they're only
+    available while debugging
+
+    Returns:
+        bool -- True if the request is allowed to use the admin endpoints
+    """
+    if ADMIN_TOKEN is None:
+        return API_ENV == 'debug'
+
+    admin_token = request.headers.get("X-Admin-Token")
+    if admin_token is None:
+        return False
+
+    # Compare in constant time, so the token can't be guessed from how long
+    # it takes to be turned away
+    return hmac.compare_digest(admin_token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+
+def get_recipe_tree_budget(req_json):
+    """Get the budget for building a recipe tree from the request, limited to
+    the server's max budget
+
+    Arguments:
+        req_json {dict} -- The request data, with the optional max_nodes and max_seconds
+
+    Raises:
+        ValueError: If the budget values aren't numbers
+
+    Returns:
+        dict -- The budget, see cookbook.calculator.create_tree_budget
+    """
+    max_nodes = req_json.get("max_nodes")
+    if max_nodes is not None:
+        max_nodes = max(int(max_nodes), 1)
+
+    if RECIPE_TREE_MAX_NODES is not None:
+        max_nodes = min(max_nodes or RECIPE_TREE_MAX_NODES, RECIPE_TREE_MAX_NODES)
+
+    max_seconds = req_json.get("max_seconds")
+    if max_seconds is not None:
+        max_seconds = max(float(max_seconds), 0)
+
+    if RECIPE_TREE_MAX_SECONDS is not None:
+        if max_seconds is None:
+            max_seconds = RECIPE_TREE_MAX_SECONDS
+        max_seconds = min(max_seconds, RECIPE_TREE_MAX_SECONDS)
+
+    return cookbook.calculator.create_tree_budget(max_nodes=max_nodes, max_seconds=max_seconds)
+
+
+@app.route("/ready", methods=["GET"])
+@json_response
+def api_ready():
+    """GET whether every version has been preloaded, responds with a 503 until
+    they have so the load balancer only sends traffic to warm workers
+
+    Returns:
+        dict -- ready and the load state and timings of each version
+    """
+    is_ready = cookbook.preload.is_ready()
+    status = {
+        "ready": is_ready,
+        "versions": cookbook.preload.get_versions_status(),
+    }
+
+    if not is_ready:
+        return status, SERVICE_UNAVAILABLE
+
+    return status
+
+
+@app.route("/admin/caches", methods=["GET"])
+@json_response
+def api_admin_get_caches():
+    """GET the size, hits, misses and evictions of every cache
+
+    Returns:
+        dict -- stats for each cache
+    """
+    if not is_admin_request():
+        abort(FORBIDDEN)
+
+    try:
+        return cookbook.caches.get_caches_stats()
+    except Exception as e:
+        logger.exception(e)
+        abort(SERVER_ERROR)
+
+
+@app.route("/admin/caches/invalidate", methods=["POST"])
+@json_response
+def api_admin_invalidate_caches():
+    """Clear out the caches for a version (or everything)
+
+    Arguments:
+        version {string} - [optional] Version of Minecraft Java Edition, everything if not set
+        caches {list} - [optional] Names of the caches to clear, all of them if not set
+
+    Returns:
+        dict -- how many values were removed from each cache
+    """
+    if not is_admin_request():
+        abort(FORBIDDEN)
+
+    try:
+        req_json = request.get_json(force=True, silent=True) or {}
+        version = req_json.get("version")
+        names = req_json.get("caches")
+        if names is not None:
+            names = [name for name in names if name in cookbook.caches.caches]
+    except Exception as e:
+        logger.exception(e)
+        abort(BAD_REQUEST)
+
+    try:
+        return cookbook.caches.invalidate_caches(version, names=names)
+    except Exception as e:
+        logger.exception(e)
+        abort(SERVER_ERROR)
+
+
 @app.route("/<version>/items", methods=["GET"])
 @json_response
 def api_get_items(version):
@@ -108,8 +255,9 @@ def api_get_supported_recipes_and_items(version):
 
     try:
         recipes = cookbook.data.fetch_all_recipes(version, force_create=FORCE_RECREATE_DATA)
+        recipe_ir = cookbook.data.fetch_all_recipe_ir(version, force_create=FORCE_RECREATE_DATA)
         supported_recipes_by_result = cookbook.data.get_supported_recipes_by_result(
-            version, recipes, force_create=FORCE_RECREATE_DATA
+            version, recipes, recipe_ir=recipe_ir, force_create=FORCE_RECREATE_DATA
         )
         supported_craftable_items = cookbook.data.get_supported_craftable_items(
             version, supported_recipes_by_result, force_create=FORCE_RECREATE_DATA
@@ -174,11 +322,51 @@ def api_parse_items_from_string(version):
             all_tags=all_crafting_data["tags"],
             all_recipes=all_crafting_data["recipes"],
             item_mappings=all_crafting_data["item_mappings"],
+            version=version,
         )
     except Exception:
         abort(SERVER_ERROR)
 
 
+@app.route("/<version>/uses_of", methods=["POST"])
+@json_response
+def api_uses_of(version):
+    """Get all the recipes which use every one of the provided items
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+        items {list} -- Names of the items (or #tags) the recipes need to use
+
+    Returns:
+        dict -- The recipes and the items they make
+    """
+    try:
+        req_json = request.get_json(force=True)
+        items = req_json.get("items", [])
+        if not isinstance(items, list):
+            items = [items]
+        items = [str(item) for item in items]
+    except Exception as e:
+        logger.exception(e)
+        abort(BAD_REQUEST)
+
+    try:
+        all_crafting_data = cookbook.data.get_all_crafting_data(
+            version, force_create=FORCE_RECREATE_DATA
+        )
+
+        return cookbook.calculator.get_recipes_using(
+            items,
+            version=version,
+            all_recipes=all_crafting_data["recipes"],
+            all_tags=all_crafting_data["tags"],
+            supported_recipes=all_crafting_data["supported_recipes"],
+        )
+    except Exception as e:
+        logger.exception(e)
+        abort(SERVER_ERROR)
+
+
 @app.route("/<version>/recipe_tree", methods=["POST"])
 @json_response
 def api_recipe_tree(version):
@@ -188,6 +376,12 @@ def api_recipe_tree(version):
         version {string} -- Version of Minecraft Java Edition
         items {list} -- The items (already formatted) that you'd like crafted
         selected_build_paths {dict} - [optional] the currently selected build paths
+        collapse_cycles {bool} - [optional] don't expand items that loop back to their parent
+        max_depth {int} - [optional] only expand this many levels of items, the rest are collapsed
+        expand_selected {bool} - [optional] always expand the selected path, even past max_depth
+        max_nodes {int} - [optional] stop expanding items once the tree has this many
+        max_seconds {float} - [optional] stop expanding items after this long
+        format {str} - [optional] "tree" (default) or "dag" to send every repeated node only once
 
     Returns:
         [dict] -- [description]
@@ -196,9 +390,18 @@ def api_recipe_tree(version):
         req_json = request.get_json(force=True)
         requested_items = req_json.get("items", [])
         selected_build_paths = req_json.get("selected_build_paths", {})
-    except Exception:
+        collapse_cycles = req_json.get("collapse_cycles", False) is True
+        max_depth = req_json.get("max_depth")
+        if max_depth is not None:
+            max_depth = max(int(max_depth), 0)
+        expand_selected = req_json.get("expand_selected", False) is True
+        response_format = req_json.get("format", "tree")
+        if response_format not in RECIPE_TREE_FORMATS:
+            raise ValueError(f'Unknown recipe tree format: {response_format}')
+        budget = get_recipe_tree_budget(req_json)
+    except Exception as e:
         logger.exception(e)
-        abort(SERVER_ERROR)
+        abort(BAD_REQUEST)
 
     try:
         all_crafting_data = cookbook.data.get_all_crafting_data(
@@ -212,14 +415,142 @@ def api_recipe_tree(version):
             all_recipes=all_crafting_data["recipes"],
             all_tags=all_crafting_data["tags"],
             supported_recipes=all_crafting_data["supported_recipes"],
+            collapse_cycles=collapse_cycles,
+            expand_depth=max_depth,
+            expand_selected=expand_selected,
+            budget=budget,
         )
 
+        if response_format == "dag":
+            return cookbook.calculator.create_recipe_tree_dag(recipe_tree)
+
         return recipe_tree
     except Exception as e:
         logger.exception(e)
         abort(SERVER_ERROR)
 
 
+@app.route("/<version>/expand_recipe_node", methods=["POST"])
+@json_response
+def api_expand_recipe_node(version):
+    """Expand a collapsed node from the recipe tree
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+        handle {str} -- The handle of the collapsed node
+        max_depth {int} - [optional] how many levels of items to expand (default 1)
+        expand_selected {bool} - [optional] always expand the selected path, even past max_depth
+        max_nodes {int} - [optional] stop expanding items once the tree has this many
+        max_seconds {float} - [optional] stop expanding items after this long
+
+    Returns:
+        dict -- The expanded node
+    """
+    try:
+        req_json = request.get_json(force=True)
+        handle = req_json["handle"]
+        max_depth = req_json.get("max_depth", 1)
+        if max_depth is not None:
+            max_depth = max(int(max_depth), 1)
+        expand_selected = req_json.get("expand_selected", False) is True
+        budget = get_recipe_tree_budget(req_json)
+        cookbook.calculator.parse_node_handle(handle)
+    except Exception as e:
+        logger.exception(e)
+        abort(BAD_REQUEST)
+
+    try:
+        all_crafting_data = cookbook.data.get_all_crafting_data(
+            version, force_create=FORCE_RECREATE_DATA
+        )
+
+        return cookbook.calculator.expand_recipe_node(
+            handle,
+            version=version,
+            all_recipes=all_crafting_data["recipes"],
+            all_tags=all_crafting_data["tags"],
+            supported_recipes=all_crafting_data["supported_recipes"],
+            expand_depth=max_depth,
+            expand_selected=expand_selected,
+            budget=budget,
+        )
+    except Exception as e:
+        logger.exception(e)
+        abort(SERVER_ERROR)
+
+
+@app.route("/<version>/recipe_tree_and_shopping_list", methods=["POST"])
+@json_response
+def api_recipe_tree_and_shopping_list(version):
+    """Get the recipe tree for the provided items, and the shopping list for
+    the selected path through it, in one go
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+        items {list} -- The items (already formatted) that you'd like crafted
+        selected_build_paths {dict} - [optional] the currently selected build paths
+        have_already {dict} - [optional] Map of what items you already have created
+        collapse_cycles {bool} - [optional] don't expand items that loop back to their parent
+        format {str} - [optional] "tree" (default) or "dag" to send every repeated node only once
+        max_nodes {int} - [optional] stop expanding items once the tree has this many
+        max_seconds {float} - [optional] stop expanding items after this long
+
+    Returns:
+        dict -- The recipe tree, the selected build paths and the shopping list,
+                if the tree is truncated the shopping list is for what's in it
+    """
+    try:
+        req_json = request.get_json(force=True)
+        requested_items = req_json.get("items", [])
+        selected_build_paths = req_json.get("selected_build_paths", {})
+        have_already = req_json.get("have_already", {})
+        collapse_cycles = req_json.get("collapse_cycles", False) is True
+        response_format = req_json.get("format", "tree")
+        if response_format not in RECIPE_TREE_FORMATS:
+            raise ValueError(f'Unknown recipe tree format: {response_format}')
+        budget = get_recipe_tree_budget(req_json)
+    except Exception as e:
+        logger.exception(e)
+        abort(BAD_REQUEST)
+
+    try:
+        all_crafting_data = cookbook.data.get_all_crafting_data(
+            version, force_create=FORCE_RECREATE_DATA
+        )
+
+        recipe_tree, stats = cookbook.calculator.create_recipe_tree(
+            requested_items,
+            selected_build_paths,
+            version=version,
+            all_recipes=all_crafting_data["recipes"],
+            all_tags=all_crafting_data["tags"],
+            supported_recipes=all_crafting_data["supported_recipes"],
+            collapse_cycles=collapse_cycles,
+            budget=budget,
+        )
+
+        # Truncated nodes don't have their recipes yet, so they're in the
+        # shopping list as they are until they're expanded
+        recipe_path = cookbook.calculator.create_build_paths(recipe_tree, requested_items)
+        shopping_list = cookbook.calculator.create_shopping_list(
+            recipe_path, have_already=have_already
+        )
+
+        if response_format == "dag":
+            recipe_tree = cookbook.calculator.create_recipe_tree_dag(recipe_tree)
+
+        return {
+            "recipe_tree": recipe_tree,
+            "selected_build_paths": recipe_path,
+            "shopping_list": shopping_list,
+            "is_truncated": stats["is_truncated"],
+            "num_nodes": stats["num_nodes"],
+        }
+    except Exception as e:
+        logger.exception(e)
+        abort(SERVER_ERROR)
+
+
 @app.route("/<version>/shopping_list", methods=["POST"])
 @json_response
 def api_shopping_list(version):
@@ -255,5 +586,55 @@ def api_shopping_list(version):
         abort(SERVER_ERROR)
 
 
+@app.route("/<version>/shopping_lists", methods=["POST"])
+@json_response
+def api_shopping_lists(version):
+    """Get a shopping list for each scenario of the recipes selected
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+        recipe_path {dict} -- The chosen recipe path you want to follow
+        scenarios {list} -- Each scenario can have:
+                            have_already {dict} - [optional] Map of the items you already have
+                            recipe_multiplier {int} - [optional] How many times to build the path
+
+    Returns:
+        list -- A shopping list for each scenario
+    """
+    try:
+        req_json = request.get_json(force=True)
+        recipe_path = req_json.get("recipe_path", {})
+        scenarios = []
+        for scenario in req_json.get("scenarios", []):
+            scenarios.append({
+                "have_already": scenario.get("have_already", {}),
+                "recipe_multiplier": max(int(scenario.get("recipe_multiplier", 1)), 0),
+            })
+    except Exception as e:
+        logger.exception(e)
+        abort(BAD_REQUEST)
+
+    try:
+        return cookbook.calculator.create_shopping_lists(recipe_path, scenarios)
+    except Exception as e:
+        logger.exception(e)
+        abort(SERVER_ERROR)
+
+
 if __name__ == "__main__":
-    app.run(debug=HOT_RELOAD_ENABLED, host="0.0.0.0", port="5000")
+    if API_ENV == 'debug':
+        # Werkzeug's development server, with the debugger and hot reloading. The
+        # app actually runs in a child process, only preload there
+        if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+            cookbook.preload.start_preload(
+                versions=PRELOAD_VERSIONS,
+                max_workers=PRELOAD_WORKERS,
+                force_create=FORCE_RECREATE_DATA,
+            )
+
+        app.run(debug=True, host="0.0.0.0", port=os.environ.get('BG_API_PORT', 5000))
+    else:
+        # Everything else is served by gunicorn, see gunicorn.conf.py. It takes
+        # over this process so it gets the signals for graceful reloads.
+        config_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), "gunicorn.conf.py")
+        os.execv(sys.executable, [sys.executable, "-m", "gunicorn", "--config", config_file])
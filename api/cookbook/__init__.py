@@ -1,4 +1,8 @@
 from . import constants
+from . import caches
 from . import utils
+from . import recipes
 from . import data
+from . import graph
 from . import calculator
+from . import preload
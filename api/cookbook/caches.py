@@ -0,0 +1,219 @@
+"""CACHES
+Every cache used by the cookbook, each one is a named (and optionally size
+limited) cache with keys scoped by version, so they can all be inspected and
+cleared from one place
+"""
+import os
+import logging
+
+os.environ["TZ"] = "UTC"
+logger = logging.getLogger(__name__)
+
+import functools
+import threading
+from collections import OrderedDict, defaultdict
+
+# All the caches that have been created, by name
+caches = {}
+
+
+class Cache:
+    """A least recently used cache, once there are more than `max_size` entries
+    the ones that haven't been used for the longest are dropped. Every key is
+    scoped by a version, use None for anything that's the same for every version.
+    """
+
+    def __init__(self, name, max_size=None):
+        self.name = name
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.version_keys = defaultdict(set)
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, version, key, default=None):
+        """Get a value from the cache
+
+        Arguments:
+            version {string} -- Version of Minecraft Java Edition
+            key {hashable} -- The key of the value
+
+        Keyword Arguments:
+            default {any} -- What to return if the key isn't cached (default: {None})
+
+        Returns:
+            any -- The cached value
+        """
+        with self.lock:
+            try:
+                value = self.entries[(version, key)]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self.entries.move_to_end((version, key))
+            self.hits += 1
+            return value
+
+    def set(self, version, key, value):
+        """Add a value to the cache, dropping the least recently used values
+        if we're over the max size
+
+        Arguments:
+            version {string} -- Version of Minecraft Java Edition
+            key {hashable} -- The key of the value
+            value {any} -- The value to cache
+        """
+        with self.lock:
+            self.entries[(version, key)] = value
+            self.entries.move_to_end((version, key))
+            self.version_keys[version].add(key)
+
+            while self.max_size is not None and len(self.entries) > self.max_size:
+                (evicted_version, evicted_key), _ = self.entries.popitem(last=False)
+                self.version_keys[evicted_version].discard(evicted_key)
+                self.evictions += 1
+
+    def invalidate(self, version=None):
+        """Remove the values for a version, or everything
+
+        Keyword Arguments:
+            version {string} -- Version of Minecraft Java Edition, None for all (default: {None})
+
+        Returns:
+            int -- How many values were removed
+        """
+        with self.lock:
+            if version is None:
+                num_removed = len(self.entries)
+                self.entries.clear()
+                self.version_keys.clear()
+                return num_removed
+
+            keys = self.version_keys.pop(version, set())
+            for key in keys:
+                del self.entries[(version, key)]
+
+            return len(keys)
+
+    def get_lock(self, version, key):
+        """Get the lock for loading a value, so only one thread loads it at a
+        time. The locks are never removed, so only use them for keys there are
+        a few of per version (like whole datasets).
+
+        Arguments:
+            version {string} -- Version of Minecraft Java Edition
+            key {hashable} -- The key of the value
+
+        Returns:
+            threading.RLock -- The lock for the key
+        """
+        with self.lock:
+            key_lock = self.key_locks.get((version, key))
+            if key_lock is None:
+                key_lock = threading.RLock()
+                self.key_locks[(version, key)] = key_lock
+
+            return key_lock
+
+    def get_stats(self):
+        """How the cache is doing
+
+        Returns:
+            dict -- The size, limits and counters of the cache
+        """
+        with self.lock:
+            return {
+                "name": self.name,
+                "max_size": self.max_size,
+                "size": len(self.entries),
+                "size_by_version": {
+                    str(version): len(keys)
+                    for (version, keys) in self.version_keys.items()
+                    if len(keys) > 0
+                },
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def create_cache(name, max_size=None):
+    """Create a new cache and register it
+
+    Arguments:
+        name {str} -- Name of the cache
+
+    Keyword Arguments:
+        max_size {int} -- Max number of values to keep, None for no limit (default: {None})
+
+    Returns:
+        Cache -- The new cache
+    """
+    cache = Cache(name, max_size=max_size)
+    caches[name] = cache
+    return cache
+
+
+def single_flight(cache, key):
+    """Decorator for functions which load a value into a cache for a version
+    (their first argument). If lots of requests need the value at the same time
+    only the first one loads it, the rest wait for it to finish. The function
+    has to check the cache itself first thing, that's how the waiting requests
+    get the value that was just loaded.
+
+    Arguments:
+        cache {Cache} -- The cache the value is stored in
+        key {hashable} -- The key of the value
+
+    Returns:
+        function -- The decorator
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(version, *args, **kwargs):
+            # Don't bother with the lock if it's already loaded
+            if not kwargs.get("force_create", False):
+                cached_value = cache.get(version, key)
+                if cached_value is not None:
+                    return cached_value
+
+            with cache.get_lock(version, key):
+                return func(version, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def get_caches_stats():
+    """Get the stats of every cache
+
+    Returns:
+        dict -- The stats of each cache, by name
+    """
+    return {name: cache.get_stats() for (name, cache) in caches.items()}
+
+
+def invalidate_caches(version=None, names=None):
+    """Clear out caches for a version (or everything)
+
+    Keyword Arguments:
+        version {string} -- Version of Minecraft Java Edition, None for all (default: {None})
+        names {list} -- Names of the caches to clear, None for all (default: {None})
+
+    Returns:
+        dict -- How many values were removed from each cache, by name
+    """
+    if names is None:
+        names = list(caches.keys())
+
+    num_removed = {}
+    for name in names:
+        num_removed[name] = caches[name].invalidate(version)
+
+    logger.info(f'Invalidated caches for version {version}: {num_removed}')
+    return num_removed
@@ -7,15 +7,48 @@ logger = logging.getLogger(__name__)
 import time
 import math
 import json
+import base64
+import hashlib
 from collections import defaultdict
 import cookbook.utils
+import cookbook.graph
+import cookbook.recipes
+import cookbook.caches
+
+# How many values each of the (per item / recipe) caches can hold, across
+# all versions
+INGREDIENTS_CACHE_SIZE = 20000
+RECIPE_STATS_CACHE_SIZE = 50000
+RECIPE_TREE_CACHE_SIZE = 20000
 
 # Holds all cached responses
-ingredients_cache = defaultdict(dict)
-recipe_tree_cache = defaultdict(dict)
+ingredients_cache = cookbook.caches.create_cache(
+    "ingredients", max_size=INGREDIENTS_CACHE_SIZE
+)
+precompiled_ingredients_cache = cookbook.caches.create_cache("precompiled_ingredients")
+tag_index_cache = cookbook.caches.create_cache("tag_index")
+recipe_graph_cache = cookbook.caches.create_cache("recipe_graph")
+recipe_stats_cache = cookbook.caches.create_cache(
+    "recipe_stats", max_size=RECIPE_STATS_CACHE_SIZE
+)
+recipe_stats_table_cache = cookbook.caches.create_cache("recipe_stats_table")
+recipe_tree_cache = cookbook.caches.create_cache(
+    "recipe_tree", max_size=RECIPE_TREE_CACHE_SIZE
+)
+
+CALCULATOR_CACHES = [
+    ingredients_cache.name,
+    precompiled_ingredients_cache.name,
+    tag_index_cache.name,
+    recipe_graph_cache.name,
+    recipe_stats_cache.name,
+    recipe_stats_table_cache.name,
+    recipe_tree_cache.name,
+]
 
 def get_ingredients(recipe, all_tags, version):
-    """Get the ingredients for a given recipe
+    """Get the ingredients for a given recipe, these will already be there if the
+    version was loaded with cookbook.data.get_all_crafting_data
 
     Arguments:
         recipe {dict} -- Minecraft recipe
@@ -24,92 +57,242 @@ def get_ingredients(recipe, all_tags, version):
     Returns:
         list -- All ingredients for the recipe
     """
-    cached_value = ingredients_cache.get(version, {}).get(recipe["name"])
+    cached_value = ingredients_cache.get(version, recipe["name"])
     if cached_value is not None:
         return cached_value
 
-    # If this recipe isn't supported return no ingredients
-    if not cookbook.utils.is_supported_recipe(recipe):
-        ingredients_cache[version][recipe["name"]] = []
-        return []
+    recipe = cookbook.recipes.create_recipe(cookbook.recipes.create_recipe_ir(recipe))
+    return get_recipe_ingredients(recipe, all_tags, version)
+
+
+def get_recipe_ingredients(recipe, all_tags, version):
+    """Get the ingredients for a recipe, see cookbook.recipes. The ingredients
+    are already in their canonical shape, so each one is either an item, any
+    of the items in a tag or one of a set of options.
+
+    Arguments:
+        recipe {cookbook.recipes.Recipe} -- The recipe
+        all_tags {dict} -- All game tags
+
+    Returns:
+        list -- All ingredients for the recipe
+    """
+    cached_value = ingredients_cache.get(version, recipe.name)
+    if cached_value is not None:
+        return cached_value
 
     ingredients = []
-    single_ingredient_recipes = [
-        "minecraft:smelting",
-        "minecraft:stonecutting",
-        "minecraft:smoking",
-        "minecraft:blasting"
-    ]
 
-    # Crafting recipes are a bit more complicated
-    if recipe["type"] == 'minecraft:crafting_shaped':
-        ingredients = get_shaped_recipe_ingredients(recipe, all_tags)
-    elif recipe["type"] == 'minecraft:smithing':
-        raw_ingredients = [
-            recipe.get("base"),
-            recipe.get("addition"),
-        ]
-        ingredients = format_recipe_ingredients(raw_ingredients, all_tags)
+    for ingredient in recipe.ingredients:
+        if "item" in ingredient:
+            ingredients.append({"name": ingredient["item"], "amount_required": ingredient["amount"]})
+        elif "tag" in ingredient:
+            # Any of the items in the tag will do
+            tag_values = get_tag_values(ingredient["tag"], all_tags, version=version)
+            ingredients.append([
+                {"name": tag_value["item"], "amount_required": ingredient["amount"], "group": tag_value["group"]}
+                for tag_value in tag_values
+            ])
+        else:
+            # Any one of the options will do
+            ingredients.append([
+                {"name": option["item"], "amount_required": option["amount"]}
+                for option in ingredient["options"]
+            ])
+
+    ingredients_cache.set(version, recipe.name, ingredients)
+    return ingredients
+
+
+def invalidate_caches(version):
+    """Clear out everything the calculator has cached for a version, it all
+    comes from the version's data so has to go when the data changes
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+
+    Returns:
+        dict -- How many values were removed from each cache, by name
+    """
+    return cookbook.caches.invalidate_caches(version, names=CALCULATOR_CACHES)
+
+
+@cookbook.caches.single_flight(precompiled_ingredients_cache, "recipe_ingredients")
+def precompile_ingredients(version, all_recipes, all_tags, supported_recipes, force_create=False):
+    """Format the ingredients of every supported recipe for a version up front,
+    so get_ingredients is only ever a lookup while handling requests. Lots of
+    recipes end up with the exact same ingredients (all the planks, wool, etc.)
+    so those all share the same list.
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+        all_recipes {dict} -- All the recipes in the game
+        all_tags {dict} -- All the tags in the game
+        supported_recipes {dict} -- Only the supported recipes in the game!
+
+    Keyword Arguments:
+        force_create {bool} -- Format the ingredients again even if we already have (default: {False})
+
+    Returns:
+        dict -- The formatted ingredients keyed by recipe name
+    """
+    if not force_create:
+        cached_value = precompiled_ingredients_cache.get(version, "recipe_ingredients")
+        if cached_value is not None:
+            return cached_value
     else:
-        raw_ingredients = recipe.get("ingredients", recipe.get("ingredient", []))
+        ingredients_cache.invalidate(version)
 
-        if recipe["type"] in single_ingredient_recipes and len(raw_ingredients) > 1:
-            raw_ingredients = [raw_ingredients]
+    recipe_models = cookbook.recipes.get_recipe_models(version, all_recipes)
+    recipe_ingredients = {}
 
-        ingredients = format_recipe_ingredients(raw_ingredients, all_tags)
+    for recipe_names in supported_recipes.values():
+        for recipe_name in recipe_names:
+            ingredients = get_recipe_ingredients(recipe_models[recipe_name], all_tags, version)
 
-    ingredients_cache[version][recipe["name"]] = ingredients
-    return ingredients
+            # Identical ingredients (in this version or any other) share a list
+            ingredients = cookbook.utils.share_record(ingredients)
+            ingredients_cache.set(version, recipe_name, ingredients)
+            recipe_ingredients[recipe_name] = ingredients
+
+    precompiled_ingredients_cache.set(version, "recipe_ingredients", recipe_ingredients)
+    return recipe_ingredients
 
 
-def get_shaped_recipe_ingredients(recipe, all_tags):
-    """Shaped recipes are a bit complicated, we need to understand the shape
-    in order to know the right amount of ingredients we need.
+def get_precompiled_data(version):
+    """Get everything that's been precompiled for a version, so it can be saved
+    in the version's snapshot (see cookbook.data.save_snapshot)
 
     Arguments:
-        recipe {dict} -- Minecraft recipe
-        all_tags {dict} -- All game tags
+        version {string} -- Version of Minecraft Java Edition
 
     Returns:
-        list -- All of the ingredients for this recipe
+        dict -- The precompiled ingredients, tag index and recipe graph
+    """
+    return {
+        "recipe_ingredients": precompiled_ingredients_cache.get(version, "recipe_ingredients"),
+        "tag_index": tag_index_cache.get(version, "tag_index"),
+        "recipe_graph": recipe_graph_cache.get(version, "recipe_graph"),
+    }
+
+
+def load_precompiled_data(version, precompiled_data):
+    """Load the data from get_precompiled_data back into the caches
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+        precompiled_data {dict} -- The precompiled data for the version
     """
-    ingredient_list = []
-    pattern_counts = {}
+    recipe_ingredients = precompiled_data["recipe_ingredients"]
+    if recipe_ingredients is not None:
+        recipe_ingredients = {
+            recipe_name: cookbook.utils.share_record(ingredients)
+            for (recipe_name, ingredients) in recipe_ingredients.items()
+        }
+        for (recipe_name, ingredients) in recipe_ingredients.items():
+            ingredients_cache.set(version, recipe_name, ingredients)
+        precompiled_ingredients_cache.set(version, "recipe_ingredients", recipe_ingredients)
+
+    if precompiled_data["tag_index"] is not None:
+        tag_index_cache.set(version, "tag_index", precompiled_data["tag_index"])
+
+    recipe_graph = precompiled_data["recipe_graph"]
+    if recipe_graph is not None:
+        recipe_graph["recipe_ingredients"] = [
+            cookbook.utils.share_record(ingredients)
+            for ingredients in recipe_graph["recipe_ingredients"]
+        ]
+        recipe_graph_cache.set(version, "recipe_graph", recipe_graph)
+
+
+def get_tag_closure(tag_name, all_tags, closures, visiting=None):
+    """Tags can have tags (which can have tags...) so flatten a tag out to every
+    item in it. Items only show up once, the first time they're found, with the
+    tag they were directly a part of as their group.
 
-    # Every shaped recipe has a pattern which describes where the ingredients
-    # need to be placed in order to craft the correct item
-    for row in recipe["pattern"]:
-        for cell in row:
-            # If the cell value is not as part of the recipe key let's skip
-            if cell not in recipe["key"]:
+    Arguments:
+        tag_name {str} -- Name of the tag to flatten
+        all_tags {dict} -- List of all tags that are available
+        closures {dict} -- The already flattened tags, this tag is added to it
+
+    Keyword Arguments:
+        visiting {set} -- The tags we're in the middle of flattening (default: {None})
+
+    Returns:
+        tuple -- (item name, group) for every item in the tag
+    """
+    cached_value = closures.get(tag_name)
+    if cached_value is not None:
+        return cached_value
+
+    if visiting is None:
+        visiting = set()
+
+    # Tags which include themselves (somewhere down the line) would go on forever
+    visiting.add(tag_name)
+
+    found_values = {}
+    for value in all_tags[tag_name]["values"]:
+        # If it's a tag in a tag, add all of it's items too
+        if cookbook.utils.is_tag_name(value):
+            nested_tag_name = cookbook.utils.parse_item_name(value)
+            if nested_tag_name in visiting or nested_tag_name not in all_tags:
                 continue
 
-            # Increment a counter of how many times we've seen this cell value
-            if cell not in pattern_counts:
-                pattern_counts[cell] = 1
-            else:
-                pattern_counts[cell] += 1
+            nested_values = get_tag_closure(nested_tag_name, all_tags, closures, visiting)
+            for (item_name, group) in nested_values:
+                found_values.setdefault(item_name, group)
+        else:
+            found_values.setdefault(cookbook.utils.parse_item_name(value), tag_name)
 
-    # Now we have a mapping of cell values to the amount of times they're seen
-    for key, count in pattern_counts.items():
-        # Get the ingredient that maps to the cell
-        ingredient = recipe["key"][key]
+    visiting.discard(tag_name)
 
-        # Oh, is the ingredient a list? That means it's an option set of items
-        # that could be used to craft this recipe.
-        is_group = isinstance(ingredient, list)
+    closure = tuple(found_values.items())
+    closures[tag_name] = closure
+    return closure
 
-        # Format the recipe ingredients we've gotten and add them to the final
-        # list of all ingredients for this recipe.
-        ingredient_list += format_recipe_ingredients(
-            ingredient, all_tags, force_amount_required=count, is_group=is_group
-        )
 
-    # Whew, finally done with this.
-    return ingredient_list
+@cookbook.caches.single_flight(tag_index_cache, "tag_index")
+def get_tag_index(version, all_tags):
+    """Get the flattened tags for a version, and the other way around, all the
+    tags an item is in (including through the tags in tags)
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+        all_tags {dict} -- All the tags in the game
+
+    Returns:
+        dict -- {
+            tag_values: (item name, group) for every item in the tag, by tag name
+            item_tags: Names of all the tags the item is in, by item name
+        }
+    """
+    cached_value = tag_index_cache.get(version, "tag_index")
+    if cached_value is not None:
+        return cached_value
+
+    tag_values = {}
+    for tag_name in all_tags:
+        get_tag_closure(tag_name, all_tags, tag_values)
+
+    item_tags = defaultdict(list)
+    for tag_name in sorted(tag_values.keys()):
+        for (item_name, _) in tag_values[tag_name]:
+            item_tags[item_name].append(tag_name)
+
+    tag_index = {
+        "tag_values": tag_values,
+        "item_tags": {
+            item_name: tuple(tag_names)
+            for (item_name, tag_names) in item_tags.items()
+        },
+    }
+
+    tag_index_cache.set(version, "tag_index", tag_index)
+    return tag_index
 
 
-def get_tag_values(tag, all_tags, amount_required=None):
+def get_tag_values(tag, all_tags, amount_required=None, version=None):
     """Tags can have tags so get a list of all the tag values
 
     Arguments:
@@ -118,35 +301,50 @@ def get_tag_values(tag, all_tags, amount_required=None):
 
     Keyword Arguments:
         amount_required {int} -- How many of the tag do we need? (default: {None})
+        version {string} -- Use the tag index for this version (default: {None})
 
     Returns:
         list -- All the values of the tag
     """
-    found_values = []
     tag_name = cookbook.utils.parse_item_name(tag)
-    tag_values = all_tags[tag_name]["values"]
 
-    for value in tag_values:
-        is_tag = cookbook.utils.is_tag_name(value)
+    if version is not None:
+        tag_closure = get_tag_index(version, all_tags)["tag_values"][tag_name]
+    else:
+        tag_closure = get_tag_closure(tag_name, all_tags, {})
 
-        # If it's a tag in a tag it's time for recursion baby!
-        if is_tag:
-            # += is python list math we're adding a list to a list
-            found_values += get_tag_values(
-                value, all_tags, amount_required=amount_required
-            )
-        # Oop basic tag, let's just format it correctly and save it to our list
-        else:
-            item = {"item": value, "group": tag_name}
-            if amount_required is not None:
-                item["amount_required"] = amount_required
-            found_values.append(item)
+    found_values = []
+    for (item_name, group) in tag_closure:
+        item = {"item": item_name, "group": group}
+        if amount_required is not None:
+            item["amount_required"] = amount_required
+        found_values.append(item)
 
     return found_values
 
 
+def get_item_tags(item_name, version, all_tags):
+    """Get every tag an item is a part of
+
+    Arguments:
+        item_name {str} -- The item
+        version {string} -- Version of Minecraft Java Edition
+        all_tags {dict} -- All the tags in the game
+
+    Returns:
+        tuple -- The names of the tags
+    """
+    return get_tag_index(version, all_tags)["item_tags"].get(item_name, ())
+
+
 def format_recipe_ingredients(
-    ingredients, all_tags, is_group=False, force_amount_required=None, level=0, group_at_level=0
+    ingredients,
+    all_tags,
+    is_group=False,
+    force_amount_required=None,
+    level=0,
+    group_at_level=0,
+    version=None,
 ):
     """Given a list of raw ingredients format them to be used by the calculator
 
@@ -155,96 +353,976 @@ def format_recipe_ingredients(
         all_tags {dict} -- List of all tags that are available
 
 
-    Keyword Arguments:
-        is_group {bool} -- Are we working with an item group (default: {False})
-        force_amount_required {int} -- Value we'd like to set amount_required to (default: {None})
-        level {int} -- How many levels deep of ingredients are we? (default: {0})
+    Keyword Arguments:
+        is_group {bool} -- Are we working with an item group (default: {False})
+        force_amount_required {int} -- Value we'd like to set amount_required to (default: {None})
+        level {int} -- How many levels deep of ingredients are we? (default: {0})
+        version {string} -- Use the tag index for this version (default: {None})
+
+    Returns:
+        list -- All of the ingredients we've formatted
+    """
+    formatted_ingredients = []
+    found_ingredients = {}
+
+    # Make sure we're working with a list of ingredients
+    if not isinstance(ingredients, list):
+        ingredients = [ingredients]
+
+    for (index, ingredient) in enumerate(ingredients):
+        group = None
+
+        # If we're working with a list of ingredients or a tag (which in the end
+        # results in a list of ingredients)
+        if isinstance(ingredient, list) or (
+            isinstance(ingredient, dict) and ingredient.get("tag") is not None
+        ):
+            # if we're here we're workign with a group of ingredients, which means
+            # they can be used interchangeably
+            group_at_level = level + 1
+
+            # If it's a dictionary, get all the tag values so we interate over
+            # a list of items
+            if isinstance(ingredient, dict):
+                next_ingredients = get_tag_values(
+                    ingredient.get("tag"), all_tags, version=version
+                )
+            else:
+                next_ingredients = ingredient
+
+            # Time for recursion! Let's call this function again with this
+            # nested list of ingredients and add the output to our collection of
+            # formatted ingredients.
+            formatted_ingredients += format_recipe_ingredients(
+                next_ingredients,
+                all_tags,
+                force_amount_required=force_amount_required,
+                is_group=True,
+                level=level + 1,
+                group_at_level=group_at_level,
+                version=version,
+            )
+
+            # Move on to the next, nothing else to see here
+            continue
+
+        if isinstance(ingredient, dict):
+            item = ingredient.get("item", ingredient.get("name"))
+            group = ingredient.get("group")
+        else:
+            item = ingredient
+
+        # Parse the item name
+        name = cookbook.utils.parse_item_name(item)
+
+        # If we want to force set the amount required do so!
+        if force_amount_required is not None:
+            found_ingredients[name] = {
+                "name": name,
+                "amount_required": force_amount_required,
+            }
+        else:
+            # Oh, this is our first time seeing this ingredient so let's setup the dict
+            if name not in found_ingredients:
+                found_ingredients[name] = {
+                    "name": name,
+                    "amount_required": 1,
+                }
+            # Not our first time, add to our count of amount required for this item
+            else:
+                found_ingredients[name]["amount_required"] += 1
+
+        # If we're a part of a group make sure to set the group
+        if group is not None:
+            found_ingredients[name]["group"] = group
+
+    # Add the top level basic found ingredients then append our nested recursively
+    # found ingredients
+    formatted_ingredients = list(found_ingredients.values()) + formatted_ingredients
+
+    # If we're at the top level and we're working with a group, make sure it's
+    # combined together in a single list
+    if is_group and level == group_at_level:
+        formatted_ingredients = [formatted_ingredients]
+
+    # :D
+    return formatted_ingredients
+
+
+@cookbook.caches.single_flight(recipe_graph_cache, "recipe_graph")
+def get_recipe_graph(version, all_recipes, all_tags, supported_recipes):
+    """Get the compiled recipe graph for a version, see graph.compile_recipe_graph
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+        all_recipes {dict} -- All the recipes in the game
+        all_tags {dict} -- All the tags in the game
+        supported_recipes {dict} -- Only the supported recipes in the game!
+
+    Returns:
+        dict -- The compiled recipe graph
+    """
+    cached_value = recipe_graph_cache.get(version, "recipe_graph")
+    if cached_value is not None:
+        return cached_value
+
+    recipe_models = cookbook.recipes.get_recipe_models(version, all_recipes)
+    recipe_ingredients = {}
+    for recipe_names in supported_recipes.values():
+        for recipe_name in recipe_names:
+            recipe = recipe_models[recipe_name]
+            recipe_ingredients[recipe_name] = get_recipe_ingredients(recipe, all_tags, version)
+
+    graph = cookbook.graph.compile_recipe_graph(
+        recipe_models, supported_recipes, recipe_ingredients
+    )
+
+    recipe_graph_cache.set(version, "recipe_graph", graph)
+    return graph
+
+
+def get_recipes_using(items, version, all_recipes, all_tags, supported_recipes):
+    """Find the recipes which use all of the given items. A tag (#planks) means
+    any of the items in the tag can be used.
+
+    Arguments:
+        items {list} -- Names of the items (or tags) the recipes need to use
+        version {string} -- Version of Minecraft Java Edition
+        all_recipes {dict} -- All the recipes in the game
+        all_tags {dict} -- All the tags in the game
+        supported_recipes {dict} -- Only the supported recipes in the game!
+
+    Returns:
+        dict -- {
+            recipes: Names of the recipes that use all of the items
+            results: Names of the items those recipes make
+        }
+    """
+    graph = get_recipe_graph(version, all_recipes, all_tags, supported_recipes)
+    found_recipe_ids = None
+
+    for item in items:
+        if cookbook.utils.is_tag_name(item):
+            tag_name = cookbook.utils.parse_item_name(item).lstrip("#")
+            tag_closure = get_tag_index(version, all_tags)["tag_values"].get(tag_name, ())
+            item_names = [item_name for (item_name, _) in tag_closure]
+        else:
+            item_names = [cookbook.utils.parse_item_name(item)]
+
+        item_recipe_ids = set()
+        for item_name in item_names:
+            item_id = graph["item_ids"].get(item_name)
+            if item_id is not None:
+                item_recipe_ids.update(graph["item_uses"][item_id])
+
+        if found_recipe_ids is None:
+            found_recipe_ids = item_recipe_ids
+        else:
+            found_recipe_ids &= item_recipe_ids
+
+    # Recipe ids are in the same order as the graph, custom recipes first
+    found_recipe_ids = sorted(found_recipe_ids or [])
+
+    return {
+        "recipes": [graph["recipe_names"][recipe_id] for recipe_id in found_recipe_ids],
+        "results": sorted({
+            graph["item_names"][graph["recipe_results"][recipe_id]]
+            for recipe_id in found_recipe_ids
+        }),
+    }
+
+
+def get_relevant_ancestors(item_name, ancestors, recipe_graph):
+    """An item's subtree can only run into ancestors from it's own strongly
+    connected component (anything else can't be crafted from the item), so
+    those are the only ancestors that change what the subtree looks like.
+
+    Arguments:
+        item_name {str} -- The item to check
+        ancestors {dict} -- All the item names we've had in this branch of the tree
+        recipe_graph {dict} -- The compiled recipe graph for the version
+
+    Returns:
+        tuple -- Sorted names of the ancestors in the item's component
+    """
+    component_id = recipe_graph["item_components"][recipe_graph["item_ids"][item_name]]
+    if not recipe_graph["component_is_cyclic"][component_id]:
+        return ()
+
+    component = recipe_graph["components"][component_id]
+    if len(component) < len(ancestors):
+        return tuple(sorted(name for name in component if name in ancestors))
+
+    return tuple(sorted(name for name in ancestors if name in component))
+
+
+def is_collapsed_cycle(item_name, ancestors, recipe_graph):
+    """Check if the item would take us back around a known recipe loop, that's
+    if it's in the same cyclic component as the item whose recipe we're on.
+
+    Arguments:
+        item_name {str} -- The ingredient to check
+        ancestors {dict} -- All the item names we've had in this branch of the tree
+        recipe_graph {dict} -- The compiled recipe graph for the version
+
+    Returns:
+        bool -- True if the item is part of the same recipe loop as it's parent
+    """
+    if len(ancestors) == 0:
+        return False
+
+    item_id = recipe_graph["item_ids"][item_name]
+    parent_id = recipe_graph["item_ids"][next(reversed(ancestors))]
+    component_id = recipe_graph["item_components"][item_id]
+
+    return (
+        recipe_graph["component_is_cyclic"][component_id]
+        and recipe_graph["item_components"][parent_id] == component_id
+    )
+
+
+def get_item_cache_key(item_name, selected_recipe, ancestors, recipe_graph, collapse_cycles):
+    """Everything that changes what an item's recipes look like, used as the key
+    for both the cached item stats and the cached item recipe trees.
+
+    Arguments:
+        item_name {str} -- The item
+        selected_recipe {dict} -- The selected build path for this item's recipe
+        ancestors {dict} -- All the item names we've had in this branch of the tree
+        recipe_graph {dict} -- The compiled recipe graph for the version
+        collapse_cycles {bool} -- Are we collapsing recipe loops
+
+    Returns:
+        tuple -- The cache key
+    """
+    return (
+        item_name,
+        get_relevant_ancestors(item_name, ancestors, recipe_graph),
+        json.dumps(selected_recipe, sort_keys=True) if selected_recipe else None,
+        collapse_cycles,
+    )
+
+
+def create_node_id(prefix, name, *content):
+    """Ids are made from everything that goes into a node, so the same request
+    always gives back the exact same tree, and the same subtree always gets the
+    same id wherever it shows up.
+
+    Arguments:
+        prefix {str} -- What kind of node it is (node, recipe)
+        name {str} -- The item or recipe name
+        *content -- Everything else which decides what the node looks like
+
+    Returns:
+        str -- The node id
+    """
+    content_hash = hashlib.sha1(
+        json.dumps(content, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()[:16]
+
+    return f'{prefix}-{name}-{content_hash}'
+
+
+def get_recipe_efficiency(amount_created, recipe_stats):
+    """How good is this recipe? The more it creates from the fewest ingredients
+    the better, and anything that loops back on itself is penalized.
+
+    Arguments:
+        amount_created {int} -- How many items the recipe makes
+        recipe_stats {dict} -- Stats for the recipe's ingredients
+
+    Returns:
+        int -- The recipe efficiency
+    """
+    recipe_efficiency = (
+        amount_created
+        - recipe_stats["min_items_required"]
+        + recipe_stats["most_efficient_node"]
+    )
+
+    if recipe_stats["node_is_circular"]:
+        recipe_efficiency = -2 * abs(recipe_efficiency)
+
+    return recipe_efficiency
+
+
+def add_node_stats(stats, node_stats, amount_required, is_group, has_recipes):
+    """Add an item node to the stats of the list of ingredients it's a part of.
+    Option groups only need the best node, everything else needs them all.
+
+    Arguments:
+        stats {dict} -- The stats of the ingredient list, updated in place
+        node_stats {dict} -- The item node stats (None if it has no recipes)
+        amount_required {int} -- How many of the item we need
+        is_group {bool} -- Is the ingredient list an option group
+        has_recipes {bool} -- Will the item be crafted
+
+    Returns:
+        bool -- True if the node is now the most efficient one in the list
+    """
+    if not is_group:
+        stats["min_items_required"] += amount_required
+
+    if not has_recipes:
+        if (
+            stats["most_efficient_node"] is None or
+            stats["most_efficient_node"] < 0
+        ):
+            stats["most_efficient_node"] = 0
+            return True
+
+        return False
+
+    if not is_group:
+        stats["min_items_required"] += node_stats["min_recipe_ingredients"]
+
+    if (
+        stats["most_efficient_node"] is None or
+        node_stats["max_recipe_efficiency"] > stats["most_efficient_node"]
+    ):
+        stats["most_efficient_node"] = node_stats["max_recipe_efficiency"]
+
+        if is_group:
+            stats["min_items_required"] = node_stats["min_recipe_ingredients"]
+
+        return True
+
+    return False
+
+
+def get_ingredients_stats(
+    ingredients,
+    selected_build_paths,
+    version,
+    all_recipes,
+    all_tags,
+    supported_recipes,
+    ancestors,
+    is_group=False,
+    collapse_cycles=False,
+):
+    """Get the stats create_recipe_tree would give a list of ingredients without
+    building any of the tree nodes.
+
+    Arguments:
+        ingredients {list} -- Formatted ingredients, see format_recipe_ingredients
+        selected_build_paths {dict} -- The already selected build paths
+        version {string} -- Version of Minecraft Java Edition
+        all_recipes {dict} -- All the recipes in the game
+        all_tags {dict} -- All the tags in the game
+        supported_recipes {dict} -- Only the supported recipes in the game!
+        ancestors {dict} -- All the item names we've had in this branch of the tree
+
+    Keyword Arguments:
+        is_group {bool} -- Are the ingredients an option group (default: {False})
+        collapse_cycles {bool} -- Never expand items that loop back to their parent (default: {False})
+
+    Returns:
+        dict -- The ingredient stats
+    """
+    recipe_graph = get_recipe_graph(version, all_recipes, all_tags, supported_recipes)
+
+    stats = {
+        'found_nodes': [],
+        'node_is_circular': False,
+        'most_efficient_node': None,
+        'min_items_required': 0,
+    }
+
+    for ingredient in ingredients:
+        if isinstance(ingredient, list):
+            group_stats = get_ingredients_stats(
+                ingredient,
+                selected_build_paths,
+                version=version,
+                all_recipes=all_recipes,
+                all_tags=all_tags,
+                supported_recipes=supported_recipes,
+                ancestors=ancestors,
+                is_group=True,
+                collapse_cycles=collapse_cycles,
+            )
+
+            if group_stats["node_is_circular"]:
+                stats["node_is_circular"] = True
+
+            stats["min_items_required"] += 1
+            continue
+
+        item_name = ingredient["name"]
+        if item_name == 'self':
+            continue
+
+        amount_required = ingredient.get("amount_required", 1)
+        stats['found_nodes'].append(item_name)
+
+        item_id = recipe_graph["item_ids"].get(item_name)
+        has_recipes = item_id is not None and len(recipe_graph["item_recipes"][item_id]) > 0
+        is_circular_ref = has_recipes and (
+            item_name in ancestors or
+            (collapse_cycles and is_collapsed_cycle(item_name, ancestors, recipe_graph))
+        )
+
+        if is_circular_ref or not has_recipes:
+            add_node_stats(stats, None, amount_required, is_group, False)
+
+            if is_circular_ref:
+                stats["node_is_circular"] = True
+
+            continue
+
+        item_stats = get_item_node_stats(
+            item_name,
+            selected_build_paths.get(item_name, {}).get('recipe', {}),
+            version=version,
+            all_recipes=all_recipes,
+            all_tags=all_tags,
+            supported_recipes=supported_recipes,
+            ancestors=ancestors,
+            collapse_cycles=collapse_cycles,
+        )
+
+        if item_stats["node_is_circular"]:
+            stats["node_is_circular"] = True
+
+        add_node_stats(stats, item_stats["stats"], amount_required, is_group, True)
+
+    if stats["most_efficient_node"] is None:
+        stats["most_efficient_node"] = 0
+
+    return stats
+
+
+def get_item_stats(
+    item_name,
+    selected_recipe,
+    version,
+    all_recipes,
+    all_tags,
+    supported_recipes,
+    ancestors,
+    collapse_cycles=False,
+):
+    """Score every recipe for an item and pick the one that should be selected,
+    without building any of the tree nodes. Cached the same way as
+    create_item_recipe_tree, the entries with no ancestors or selected
+    recipes make up the stats table for the version (see get_recipe_stats_table).
+
+    Arguments:
+        item_name {str} -- The item we're getting the stats for
+        selected_recipe {dict} -- The selected build path for this item's recipe
+        version {string} -- Version of Minecraft Java Edition
+        all_recipes {dict} -- All the recipes in the game
+        all_tags {dict} -- All the tags in the game
+        supported_recipes {dict} -- Only the supported recipes in the game!
+        ancestors {dict} -- All the item names we've had in this branch of the tree
+
+    Keyword Arguments:
+        collapse_cycles {bool} -- Never expand items that loop back to their parent (default: {False})
+
+    Returns:
+        dict -- {
+            stats: The item node stats (max_recipe_efficiency, min_recipe_ingredients)
+            node_is_circular: True if any of the recipes hit a circular reference
+            recipes: The efficiency and recipe_stats of each of the item's recipes
+            selected_recipe_idx: Index of the recipe which should be selected
+        }
+    """
+    recipe_graph = get_recipe_graph(version, all_recipes, all_tags, supported_recipes)
+    item_id = recipe_graph["item_ids"][item_name]
+
+    cache_key = get_item_cache_key(
+        item_name, selected_recipe, ancestors, recipe_graph, collapse_cycles
+    )
+
+    cached_value = recipe_stats_cache.get(version, cache_key)
+    if cached_value is not None:
+        return cached_value
+
+    ancestors[item_name] = True
+
+    recipes = []
+    node_stats = {
+        "max_recipe_efficiency": None,
+        "min_recipe_ingredients": None,
+    }
+    node_is_circular = False
+
+    selected_recipe_name = selected_recipe.get('name')
+    selected_recipe_idx = None
+    most_efficient_recipe_idx = None
+
+    for (recipe_idx, recipe_id) in enumerate(recipe_graph["item_recipes"][item_id]):
+        recipe_stats = get_ingredients_stats(
+            recipe_graph["recipe_ingredients"][recipe_id],
+            selected_recipe.get('ingredients', {}),
+            version=version,
+            all_recipes=all_recipes,
+            all_tags=all_tags,
+            supported_recipes=supported_recipes,
+            ancestors=ancestors,
+            collapse_cycles=collapse_cycles,
+        )
+        recipe_efficiency = get_recipe_efficiency(
+            recipe_graph["recipe_amounts_created"][recipe_id], recipe_stats
+        )
+
+        if recipe_stats["node_is_circular"]:
+            node_is_circular = True
+
+        recipes.append({
+            "efficiency": recipe_efficiency,
+            "recipe_stats": recipe_stats,
+        })
+
+        # The selected recipe is always picked, otherwise go with the most
+        # efficient recipe we can find
+        if recipe_graph["recipe_names"][recipe_id] == selected_recipe_name:
+            selected_recipe_idx = recipe_idx
+        elif (
+            node_stats["max_recipe_efficiency"] is None or
+            recipe_efficiency > node_stats["max_recipe_efficiency"]
+        ):
+            node_stats["max_recipe_efficiency"] = recipe_efficiency
+            node_stats["min_recipe_ingredients"] = recipe_stats["min_items_required"]
+            most_efficient_recipe_idx = recipe_idx
+
+    del ancestors[item_name]
+
+    if selected_recipe_idx is None:
+        selected_recipe_idx = most_efficient_recipe_idx
+
+    if node_stats["max_recipe_efficiency"] is None:
+        node_stats["max_recipe_efficiency"] = 0
+
+    if node_stats["min_recipe_ingredients"] is None:
+        node_stats["min_recipe_ingredients"] = 0
+
+    item_stats = {
+        "stats": node_stats,
+        "node_is_circular": node_is_circular,
+        "recipes": recipes,
+        "selected_recipe_idx": selected_recipe_idx,
+    }
+
+    recipe_stats_cache.set(version, cache_key, item_stats)
+    return item_stats
+
+
+def get_item_node_stats(
+    item_name,
+    selected_recipe,
+    version,
+    all_recipes,
+    all_tags,
+    supported_recipes,
+    ancestors,
+    collapse_cycles=False,
+):
+    """Get just the node stats of an item (see get_item_stats). Without a
+    selected recipe or any ancestors from the item's recipe loop, they come
+    straight from the version's stats table once it's been worked out.
+
+    Arguments:
+        item_name {str} -- The item we're getting the stats for
+        selected_recipe {dict} -- The selected build path for this item's recipe
+        version {string} -- Version of Minecraft Java Edition
+        all_recipes {dict} -- All the recipes in the game
+        all_tags {dict} -- All the tags in the game
+        supported_recipes {dict} -- Only the supported recipes in the game!
+        ancestors {dict} -- All the item names we've had in this branch of the tree
+
+    Keyword Arguments:
+        collapse_cycles {bool} -- Never expand items that loop back to their parent (default: {False})
+
+    Returns:
+        dict -- {
+            stats: The item node stats (max_recipe_efficiency, min_recipe_ingredients)
+            node_is_circular: True if any of the recipes hit a circular reference
+        }
+    """
+    recipe_graph = get_recipe_graph(version, all_recipes, all_tags, supported_recipes)
+
+    # Only look the table up, it's worked out with this function so we can't
+    # wait for it here
+    stats_table = recipe_stats_table_cache.get(version, "recipe_stats_table")
+    if (
+        stats_table is not None and
+        not selected_recipe and
+        not collapse_cycles and
+        len(get_relevant_ancestors(item_name, ancestors, recipe_graph)) == 0
+    ):
+        item_id = recipe_graph["item_ids"][item_name]
+        return {
+            "stats": {
+                "max_recipe_efficiency": stats_table["max_recipe_efficiency"][item_id],
+                "min_recipe_ingredients": stats_table["min_recipe_ingredients"][item_id],
+            },
+            "node_is_circular": stats_table["node_is_circular"][item_id],
+        }
+
+    return get_item_stats(
+        item_name,
+        selected_recipe,
+        version=version,
+        all_recipes=all_recipes,
+        all_tags=all_tags,
+        supported_recipes=supported_recipes,
+        ancestors=ancestors,
+        collapse_cycles=collapse_cycles,
+    )
+
+
+@cookbook.caches.single_flight(recipe_stats_table_cache, "recipe_stats_table")
+def get_recipe_stats_table(version, all_recipes, all_tags, supported_recipes):
+    """Work out the stats of every craftable item in a version once, so scoring
+    an item's recipes doesn't need to go all the way down to the raw materials
+    on every request (see get_item_node_stats). The components of the recipe graph come
+    with ingredients first, so by the time we get to an item everything it's
+    crafted from has already been scored. Items in a recipe loop are scored as
+    if they were the top of the tree.
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+        all_recipes {dict} -- All the recipes in the game
+        all_tags {dict} -- All the tags in the game
+        supported_recipes {dict} -- Only the supported recipes in the game!
+
+    Returns:
+        dict -- Lists indexed by item id of:
+            max_recipe_efficiency, min_recipe_ingredients and node_is_circular
+    """
+    cached_value = recipe_stats_table_cache.get(version, "recipe_stats_table")
+    if cached_value is not None:
+        return cached_value
+
+    recipe_graph = get_recipe_graph(version, all_recipes, all_tags, supported_recipes)
+    num_items = len(recipe_graph["item_names"])
+
+    stats_table = {
+        "max_recipe_efficiency": [0] * num_items,
+        "min_recipe_ingredients": [0] * num_items,
+        "node_is_circular": [False] * num_items,
+    }
+
+    for component in recipe_graph["components"]:
+        for item_name in sorted(component):
+            item_id = recipe_graph["item_ids"][item_name]
+
+            if len(recipe_graph["item_recipes"][item_id]) == 0:
+                continue
+
+            item_stats = get_item_stats(
+                item_name,
+                {},
+                version=version,
+                all_recipes=all_recipes,
+                all_tags=all_tags,
+                supported_recipes=supported_recipes,
+                ancestors={},
+            )
+
+            stats_table["max_recipe_efficiency"][item_id] = item_stats["stats"]["max_recipe_efficiency"]
+            stats_table["min_recipe_ingredients"][item_id] = item_stats["stats"]["min_recipe_ingredients"]
+            stats_table["node_is_circular"][item_id] = item_stats["node_is_circular"]
+
+    recipe_stats_table_cache.set(version, "recipe_stats_table", stats_table)
+    return stats_table
+
+
+def create_tree_budget(max_nodes=None, max_seconds=None):
+    """Create a budget for how much of a recipe tree we're willing to build.
+    Once it's used up the rest of the tree isn't expanded, those nodes are
+    marked as truncated (with a handle to expand them later).
+
+    The budget is checked before expanding each item, so a tree can go over
+    max_nodes by the ingredients of the last item that was expanded.
+
+    Keyword Arguments:
+        max_nodes {int} -- Max number of item nodes in the tree (default: {None})
+        max_seconds {float} -- Max time to spend building the tree (default: {None})
+
+    Returns:
+        dict -- The budget, or None if there's no limit
+    """
+    if max_nodes is None and max_seconds is None:
+        return None
+
+    return {
+        "max_nodes": max_nodes,
+        "deadline": None if max_seconds is None else time.monotonic() + max_seconds,
+        "num_nodes": 0,
+        "is_exhausted": False,
+    }
+
+
+def fits_in_budget(budget, num_nodes):
+    """Is there enough budget left for a number of nodes?
+
+    Arguments:
+        budget {dict} -- The budget from create_tree_budget
+        num_nodes {int} -- How many nodes we'd like to add
+
+    Returns:
+        bool -- True if the nodes fit
+    """
+    if budget is None or budget["max_nodes"] is None:
+        return True
+
+    return budget["num_nodes"] + num_nodes <= budget["max_nodes"]
+
+
+def is_budget_exhausted(budget):
+    """Have we used up all of the budget? Once it is, it stays that way so
+    every node after it is truncated too.
+
+    Arguments:
+        budget {dict} -- The budget from create_tree_budget
+
+    Returns:
+        bool -- True if nothing else should be expanded
+    """
+    if budget is None:
+        return False
+
+    if not budget["is_exhausted"]:
+        budget["is_exhausted"] = (
+            (budget["max_nodes"] is not None and budget["num_nodes"] >= budget["max_nodes"]) or
+            (budget["deadline"] is not None and time.monotonic() >= budget["deadline"])
+        )
+
+    return budget["is_exhausted"]
+
+
+def create_node_handle(
+    item_name,
+    amount_required,
+    group,
+    selected,
+    selected_recipe,
+    relevant_ancestors,
+    collapse_cycles,
+):
+    """Collapsed nodes aren't expanded into their recipes, instead they get an
+    opaque handle with everything needed to expand them later, see expand_recipe_node
+
+    Arguments:
+        item_name {str} -- The item of the collapsed node
+        amount_required {int} -- How many of the item we need
+        group {str} -- The tag the item is a part of
+        selected {bool} -- Is the node selected
+        selected_recipe {dict} -- The selected build path for this item's recipe
+        relevant_ancestors {tuple} -- The ancestors in the item's recipe loop
+        collapse_cycles {bool} -- Are we collapsing recipe loops
+
+    Returns:
+        str -- The node handle
+    """
+    handle = json.dumps(
+        [
+            item_name,
+            amount_required,
+            group,
+            selected,
+            selected_recipe,
+            relevant_ancestors,
+            collapse_cycles,
+        ],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(handle.encode("utf-8")).decode("ascii")
+
+
+def parse_node_handle(handle):
+    """Get the node data back from a handle created by create_node_handle
+
+    Arguments:
+        handle {str} -- The node handle
+
+    Raises:
+        ValueError: If the handle isn't one of ours
 
     Returns:
-        list -- All of the ingredients we've formatted
+        dict -- The node data
     """
-    formatted_ingredients = []
-    found_ingredients = {}
-
-    # Make sure we're working with a list of ingredients
-    if not isinstance(ingredients, list):
-        ingredients = [ingredients]
+    try:
+        (
+            item_name,
+            amount_required,
+            group,
+            selected,
+            selected_recipe,
+            relevant_ancestors,
+            collapse_cycles,
+        ) = json.loads(base64.urlsafe_b64decode(handle.encode("ascii")))
+    except Exception:
+        raise ValueError(f'Invalid node handle: {handle}')
+
+    return {
+        "name": item_name,
+        "amount_required": amount_required,
+        "group": group,
+        "selected": selected,
+        "selected_recipe": selected_recipe,
+        "relevant_ancestors": relevant_ancestors,
+        "collapse_cycles": collapse_cycles,
+    }
 
-    for (index, ingredient) in enumerate(ingredients):
-        group = None
 
-        # If we're working with a list of ingredients or a tag (which in the end
-        # results in a list of ingredients)
-        if isinstance(ingredient, list) or (
-            isinstance(ingredient, dict) and ingredient.get("tag") is not None
-        ):
-            # if we're here we're workign with a group of ingredients, which means
-            # they can be used interchangeably
-            group_at_level = level + 1
+def create_item_recipe_tree(
+    item_name,
+    selected_recipe,
+    version,
+    all_recipes,
+    all_tags,
+    supported_recipes,
+    ancestors,
+    collapse_cycles=False,
+    expand_depth=None,
+    expand_selected=False,
+    is_selected_path=False,
+    budget=None,
+):
+    """Generate the recipes (and their ingredient trees) for a single item.
+    This is the expensive part of the recipe tree, and the same ingredients show
+    up all over the place, so the result is cached per version, item, the
+    ancestors in the item's recipe loop and the selected recipe path below it.
 
-            # If it's a dictionary, get all the tag values so we interate over
-            # a list of items
-            if isinstance(ingredient, dict):
-                next_ingredients = get_tag_values(ingredient.get("tag"), all_tags)
-            else:
-                next_ingredients = ingredient
+    Arguments:
+        item_name {str} -- The item we're getting the recipes for
+        selected_recipe {dict} -- The selected build path for this item's recipe
+        version {string} -- Version of Minecraft Java Edition
+        all_recipes {dict} -- All the recipes in the game
+        all_tags {dict} -- All the tags in the game
+        supported_recipes {dict} -- Only the supported recipes in the game!
+        ancestors {dict} -- All the item names we've had in this branch of the tree
 
-            # Time for recursion! Let's call this function again with this
-            # nested list of ingredients and add the output to our collection of
-            # formatted ingredients.
-            formatted_ingredients += format_recipe_ingredients(
-                next_ingredients,
-                all_tags,
-                force_amount_required=force_amount_required,
-                is_group=True,
-                level=level + 1,
-                group_at_level=group_at_level,
-            )
+    Keyword Arguments:
+        collapse_cycles {bool} -- Never expand items that loop back to their parent (default: {False})
+        expand_depth {int} -- How many levels of ingredients to expand, None for all (default: {None})
+        expand_selected {bool} -- Always expand the selected path (default: {False})
+        is_selected_path {bool} -- Is this item on the selected path (default: {False})
+        budget {dict} -- How much of the tree we can still build, see create_tree_budget (default: {None})
 
-            # Move on to the next, nothing else to see here
-            continue
+    Returns:
+        dict -- {
+            recipes: The recipe nodes for the item
+            stats: The item node stats (max_recipe_efficiency, min_recipe_ingredients)
+            node_is_circular: True if any of the recipes hit a circular reference
+            num_nodes: How many item nodes are in the recipes
+            is_truncated: True if the budget ran out before all of it was built
+        }
+    """
+    graph = get_recipe_graph(version, all_recipes, all_tags, supported_recipes)
+    item_id = graph["item_ids"][item_name]
+
+    is_selected_path = expand_selected and is_selected_path
+    cache_key = get_item_cache_key(
+        item_name, selected_recipe, ancestors, graph, collapse_cycles
+    ) + (expand_depth, is_selected_path)
+
+    # A cached tree that's bigger than what's left of the budget has to be built
+    # again, so it can be truncated where the budget runs out
+    cached_value = recipe_tree_cache.get(version, cache_key)
+    if cached_value is not None and fits_in_budget(budget, cached_value["num_nodes"]):
+        if budget is not None:
+            budget["num_nodes"] += cached_value["num_nodes"]
+        return cached_value
 
-        if isinstance(ingredient, dict):
-            item = ingredient.get("item", ingredient.get("name"))
-            group = ingredient.get("group")
-        else:
-            item = ingredient
+    # The efficiency of every recipe, and which one is selected, has already
+    # been worked out without having to build the tree
+    item_stats = get_item_stats(
+        item_name,
+        selected_recipe,
+        version=version,
+        all_recipes=all_recipes,
+        all_tags=all_tags,
+        supported_recipes=supported_recipes,
+        ancestors=ancestors,
+        collapse_cycles=collapse_cycles,
+    )
+
+    # Add our item to the branch while we build it, we'll use this later! The
+    # ancestors are shared by the whole tree so it's removed again once we're done.
+    ancestors[item_name] = True
+
+    recipe_tree = []
+    num_nodes = 0
+    is_truncated = False
+
+    # For every recipe we want to get it's ingredients, then generate another
+    # branch of the recipe tree for how to craft those items -- sounds like
+    # a lot and it is! Let's get started...
+    # The graph already has the recipes sorted with custom recipes first
+    for (recipe_idx, recipe_id) in enumerate(graph["item_recipes"][item_id]):
+        recipe_name = graph["recipe_names"][recipe_id]
+        is_selected_recipe = recipe_idx == item_stats["selected_recipe_idx"]
+
+        # What does this recipe create?
+        result_name = graph["item_names"][graph["recipe_results"][recipe_id]]
+
+        # And how much of it does this recipe make?
+        amount_created = graph["recipe_amounts_created"][recipe_id]
+
+        # Get a list of all the ingredients
+        ingredients = graph["recipe_ingredients"][recipe_id]
+
+        new_selected_build_paths = selected_recipe.get('ingredients', {})
+
+        # Create our recipe tree for each ingredient -- this logic has
+        # it's own function instead of calling recipe_tree again because
+        # ingredients can be a list of arrays of any depth. Yep.
+        response, response_stats = create_recipe_tree(
+            ingredients,
+            new_selected_build_paths,
+            version=version,
+            all_recipes=all_recipes,
+            all_tags=all_tags,
+            supported_recipes=supported_recipes,
+            ancestors=ancestors,
+            collapse_cycles=collapse_cycles,
+            expand_depth=expand_depth,
+            expand_selected=expand_selected,
+            is_selected_path=is_selected_path and is_selected_recipe,
+            budget=budget,
+        )
 
-        # Parse the item name
-        name = cookbook.utils.parse_item_name(item)
+        num_nodes += response_stats["num_nodes"]
+        if response_stats["is_truncated"]:
+            is_truncated = True
+
+        # Wow wow, we've finally made it! We have a final recipe node for
+        # a given item! The id and amount required are filled in by whoever needs it.
+        recipe_node = {
+            "id": None,
+            "name": recipe_name,
+            "type": graph["recipe_types"][recipe_id],
+            "result_name": result_name,
+            "amount_required": None,
+            "amount_created": amount_created,
+            "ingredients": response,
+            "efficiency": item_stats["recipes"][recipe_idx]["efficiency"],
+            "selected": is_selected_recipe,
+            "recipe_stats": item_stats["recipes"][recipe_idx]["recipe_stats"],
+        }
 
-        # If we want to force set the amount required do so!
-        if force_amount_required is not None:
-            found_ingredients[name] = {
-                "name": name,
-                "amount_required": force_amount_required,
-            }
-        else:
-            # Oh, this is our first time seeing this ingredient so let's setup the dict
-            if name not in found_ingredients:
-                found_ingredients[name] = {
-                    "name": name,
-                    "amount_required": 1,
-                }
-            # Not our first time, add to our count of amount required for this item
-            else:
-                found_ingredients[name]["amount_required"] += 1
+        recipe_tree.append(recipe_node)
 
-        # If we're a part of a group make sure to set the group
-        if group is not None:
-            found_ingredients[name]["group"] = group
+    del ancestors[item_name]
 
-    # Add the top level basic found ingredients then append our nested recursively
-    # found ingredients
-    formatted_ingredients = list(found_ingredients.values()) + formatted_ingredients
+    item_recipe_tree = {
+        "recipes": recipe_tree,
+        "stats": item_stats["stats"],
+        "node_is_circular": item_stats["node_is_circular"],
+        "num_nodes": num_nodes,
+        "is_truncated": is_truncated,
+    }
 
-    # If we're at the top level and we're working with a group, make sure it's
-    # combined together in a single list
-    if is_group and level == group_at_level:
-        formatted_ingredients = [formatted_ingredients]
+    # Only whole trees are cached, a truncated tree is only good for this request
+    if not is_truncated:
+        recipe_tree_cache.set(version, cache_key, item_recipe_tree)
 
-    # :D
-    return formatted_ingredients
+    return item_recipe_tree
 
 # @profile
 def create_recipe_tree(
@@ -256,12 +1334,24 @@ def create_recipe_tree(
     supported_recipes,
     ancestors=None,
     is_group=False,
+    collapse_cycles=False,
+    expand_depth=None,
+    expand_selected=False,
+    is_selected_path=True,
+    budget=None,
 ):
     """Using the list of `items` provided, generate it's recipe tree. A recipe tree
     is an item with a list of the recipes that craft it, each recipe has a set
     of ingredients they require, and each ingredient has a list of recipes that
     craft it... you can see how this goes on and on.
 
+    The tree doesn't have to be built all the way down, with `expand_depth` only
+    that many levels of items are expanded into their recipes, and with
+    `expand_selected` the selected path is always expanded. Any item that isn't
+    expanded is marked with `is_collapsed` and gets a `handle` which can be
+    passed to expand_recipe_node to get the rest of it's tree. Items that
+    aren't expanded because the `budget` ran out are also marked `is_truncated`.
+
     Arguments:
         items {list} -- All the items to be crafted
         selected_build_paths {list} - The already selected build paths
@@ -270,21 +1360,31 @@ def create_recipe_tree(
         supported_recipes {dict} -- Only the supported recipes in the game!
 
     Keyword Arguments:
-        ancestors {list} -- All the item names we've had in this branch of the tree (default: {None})
+        ancestors {dict} -- All the item names we've had in this branch of the tree (default: {None})
+        is_group {bool} -- Are the items an option group (default: {False})
+        collapse_cycles {bool} -- Never expand items that loop back to their parent (default: {False})
+        expand_depth {int} -- How many levels of items to expand, None for all (default: {None})
+        expand_selected {bool} -- Always expand the selected path (default: {False})
+        is_selected_path {bool} -- Are the items on the selected path (default: {True})
+        budget {dict} -- How much of the tree we can still build, see create_tree_budget (default: {None})
 
     Returns:
         list -- Our entire recipe tree!
     """
-    cache_enabled = False
-    cache_key = json.dumps(items)
-    if cache_enabled and cache_key in recipe_tree_cache:
-        tree, stats = recipe_tree_cache[cache_key]
-        return tree, stats
-
-    # If no ancestors setup the list
+    # If no ancestors setup the dict, it's used as an ordered set so checking
+    # for an ancestor doesn't have to scan the whole branch
     has_no_ancestors = ancestors is None or len(ancestors) == 0
     if ancestors is None:
-        ancestors = []
+        ancestors = {}
+    elif not isinstance(ancestors, dict):
+        ancestors = dict.fromkeys(ancestors, True)
+
+    recipe_graph = get_recipe_graph(version, all_recipes, all_tags, supported_recipes)
+
+    # Make sure every item has been scored before we start building the tree,
+    # the default stats of every item come from the table
+    if has_no_ancestors:
+        get_recipe_stats_table(version, all_recipes, all_tags, supported_recipes)
 
     tree = []
     stats = {
@@ -292,11 +1392,17 @@ def create_recipe_tree(
         'node_is_circular': False,
         'most_efficient_node': None,
         'min_items_required': 0,
+        'num_nodes': 0,
+        'is_truncated': False,
     }
 
     found_selected_node = not is_group
     selected_node_idx = None
 
+    # The nodes which have recipes, we'll come back to them once we know which
+    # of the nodes are selected
+    craftable_nodes = []
+
     for (item_index, item) in enumerate(items):
         if isinstance(item, dict):
             amount_required = item.get("amount_required", 1)
@@ -314,7 +1420,8 @@ def create_recipe_tree(
                 item,
                 all_tags,
                 force_amount_required=amount_required,
-                is_group=isinstance(item, list)
+                is_group=isinstance(item, list),
+                version=version,
             )
 
             if len(item) == 1:
@@ -333,11 +1440,20 @@ def create_recipe_tree(
                 supported_recipes=supported_recipes,
                 ancestors=ancestors,
                 is_group=True,
+                collapse_cycles=collapse_cycles,
+                expand_depth=expand_depth,
+                expand_selected=expand_selected,
+                is_selected_path=is_selected_path,
+                budget=budget,
             )
 
             if res_stats["node_is_circular"]:
                 stats["node_is_circular"] = True
 
+            stats["num_nodes"] += res_stats["num_nodes"]
+            if res_stats["is_truncated"]:
+                stats["is_truncated"] = True
+
             stats["min_items_required"] += amount_required
 
             tree.append(response)
@@ -353,7 +1469,7 @@ def create_recipe_tree(
 
         # Wicked, let's setup our tree node structure.
         node = {
-            "id": f'node-{item_name}-{time.time()}',
+            "id": None,
             "name": item_name,
             "group": item.get("group"),
             "amount_required": amount_required,
@@ -367,34 +1483,34 @@ def create_recipe_tree(
         }
 
         stats['found_nodes'].append(item_name)
+        stats['num_nodes'] += 1
+        if budget is not None:
+            budget["num_nodes"] += 1
 
         if is_group and item_name in selected_build_paths:
             node["selected"] = True
             found_selected_node = True
 
-        if not is_group:
-            stats["min_items_required"] += amount_required
+        # Get the id of this item in the compiled recipe graph
+        item_id = recipe_graph["item_ids"].get(item_name)
 
-        # Get all of the recipes that create this item
-        found_recipes = supported_recipes.get(item_name)
+        # If FALSE this item does not need to be crafted
+        has_recipes = item_id is not None and len(recipe_graph["item_recipes"][item_id]) > 0
 
         # If TRUE we've found a circular reference. That means the current
-        # item has already been found earlier in the recipe tree.
-        is_circular_ref = item_name in ancestors
-
-        # If FALSE this item does not need to be crafted
-        has_recipes = found_recipes is not None
+        # item has already been found earlier in the recipe tree, or we're
+        # collapsing cycles and this item loops back to it's parent.
+        is_circular_ref = has_recipes and (
+            item_name in ancestors or
+            (collapse_cycles and is_collapsed_cycle(item_name, ancestors, recipe_graph))
+        )
 
 
         if is_circular_ref or not has_recipes:
             node["stats"]["max_recipe_efficiency"] = 0
             node["stats"]["min_recipe_ingredients"] = 0
 
-            if (
-                stats["most_efficient_node"] is None or
-                stats["most_efficient_node"] < 0
-            ):
-                stats["most_efficient_node"] = 0
+            if add_node_stats(stats, None, amount_required, is_group, False):
                 selected_node_idx = len(tree)
 
             if is_circular_ref:
@@ -403,146 +1519,408 @@ def create_recipe_tree(
             tree.append(node)
             continue
 
-        custom_recipes = []
-        game_recipes = []
-        for recipe_name in found_recipes:
-            if "custom-" in recipe_name:
-                custom_recipes.append(recipe_name)
-            else:
-                game_recipes.append(recipe_name)
+        item_build_path = selected_build_paths.get(item_name, {})
+        selected_recipe = item_build_path.get('recipe', {})
 
-        custom_recipes.sort()
-        game_recipes.sort()
-        sorted_recipes = custom_recipes + game_recipes
+        item_stats = get_item_node_stats(
+            item_name,
+            selected_recipe,
+            version=version,
+            all_recipes=all_recipes,
+            all_tags=all_tags,
+            supported_recipes=supported_recipes,
+            ancestors=ancestors,
+            collapse_cycles=collapse_cycles,
+        )
 
-        # Create a new copy of the ancestors for this branch of the tree
-        new_ancestors = ancestors.copy()
-        # Add our item to the branch, we'll use this later!
-        new_ancestors.append(item_name)
+        if item_stats["node_is_circular"]:
+            stats["node_is_circular"] = True
 
-        recipe_tree = []
-        found_circular_node = False
+        node["num_recipes"] = len(recipe_graph["item_recipes"][item_id])
+        node["stats"] = dict(item_stats["stats"])
 
-        item_build_path = selected_build_paths.get(item_name, {})
-        selected_recipe = item_build_path.get('recipe', {})
-        found_selected_recipe = False
-        selected_recipe_idx = None
+        if add_node_stats(stats, node["stats"], amount_required, is_group, True):
+            selected_node_idx = len(tree)
 
-        # For every recipe we want to get it's ingredients, then generate another
-        # branch of the recipe tree for how to craft those items -- sounds like
-        # a lot and it is! Let's get started...
-        for (recipe_index, recipe_name) in enumerate(sorted_recipes):
-            recipe = all_recipes[recipe_name]
+        craftable_nodes.append((node, selected_recipe))
+        tree.append(node)
 
-            # Somehow this recipe isn't supported, and ya know what. F-it let's skip
-            if not cookbook.utils.is_supported_recipe(recipe):
-                continue
+    if not found_selected_node and is_group:
+        tree[selected_node_idx]["selected"] = True
 
-            # What does this recipe create?
-            result_name = cookbook.utils.parse_item_name(recipe["result"].get("item"))
+    if stats["most_efficient_node"] is None:
+        stats["most_efficient_node"] = 0
 
-            # And how much of it does this recipe make?
-            amount_created = recipe["result"].get("count", 1)
+    # Now that we know what's selected, build out the recipes of every node
+    # we want to expand
+    if expand_depth is None:
+        next_expand_depth = None
+    else:
+        next_expand_depth = max(expand_depth - 1, 0)
+
+    for (node, selected_recipe) in craftable_nodes:
+        node_is_selected_path = is_selected_path and node["selected"]
+        is_expanded = (
+            expand_depth is None or
+            expand_depth > 0 or
+            (expand_selected and node_is_selected_path)
+        )
 
-            # Get a list of all the ingredients
-            ingredients = get_ingredients(recipe, all_tags, version)
+        # Ran out of budget, this node will have to be expanded later
+        is_truncated = is_expanded and is_budget_exhausted(budget)
+        if is_truncated:
+            is_expanded = False
+            stats["is_truncated"] = True
 
-            new_selected_build_paths = selected_recipe.get('ingredients', {})
+        # Everything that decides what the recipes of this node look like, the
+        # same key the item recipe tree is cached with
+        item_cache_key = get_item_cache_key(
+            node["name"], selected_recipe, ancestors, recipe_graph, collapse_cycles
+        )
 
-            # Create our recipe tree for each ingredient -- this logic has
-            # it's own function instead of calling recipe_tree again because
-            # ingredients can be a list of arrays of any depth. Yep.
-            response, recipe_stats = create_recipe_tree(
-                ingredients,
-                new_selected_build_paths,
-                version=version,
-                all_recipes=all_recipes,
-                all_tags=all_tags,
-                supported_recipes=supported_recipes,
-                ancestors=new_ancestors,
+        if not is_expanded:
+            node["id"] = create_node_id(
+                "node",
+                node["name"],
+                item_cache_key,
+                "truncated" if is_truncated else "collapsed",
+                node["amount_required"],
+                node["group"],
+                node["selected"],
             )
+            node["is_collapsed"] = True
+            if is_truncated:
+                node["is_truncated"] = True
+            node["handle"] = create_node_handle(
+                node["name"],
+                node["amount_required"],
+                node["group"],
+                node["selected"],
+                selected_recipe,
+                item_cache_key[1],
+                collapse_cycles,
+            )
+            continue
 
-            recipe_efficiency = amount_created - recipe_stats["min_items_required"] + recipe_stats['most_efficient_node']
+        item_recipe_tree = create_item_recipe_tree(
+            node["name"],
+            selected_recipe,
+            version=version,
+            all_recipes=all_recipes,
+            all_tags=all_tags,
+            supported_recipes=supported_recipes,
+            ancestors=ancestors,
+            collapse_cycles=collapse_cycles,
+            expand_depth=next_expand_depth,
+            expand_selected=expand_selected,
+            is_selected_path=node_is_selected_path,
+            budget=budget,
+        )
 
-            if recipe_stats["node_is_circular"]:
-                stats["node_is_circular"] = True
-                recipe_efficiency = -2 * abs(recipe_efficiency)
-
-            # Wow wow, we've finally made it! We have a final recipe node for
-            # a given item!
-            recipe_node = {
-                "id": f'recipe-{recipe_name}-{time.time()}',
-                "name": recipe.get("name", recipe_name),
-                "type": recipe["type"],
-                "result_name": result_name,
-                "amount_required": amount_required,
-                "amount_created": amount_created,
-                "ingredients": response,
-                "efficiency": recipe_efficiency,
-                "selected": False,
-                "recipe_stats": recipe_stats,
-            }
+        stats["num_nodes"] += item_recipe_tree["num_nodes"]
 
-            if recipe_node['name'] == selected_recipe.get('name'):
-                found_selected_recipe = True
-                recipe_node['selected'] = True
-            elif (
-                node["stats"]["max_recipe_efficiency"] is None or
-                recipe_efficiency > node["stats"]["max_recipe_efficiency"]
-            ):
-                node["stats"]["max_recipe_efficiency"] = recipe_efficiency
-                node["stats"]["min_recipe_ingredients"] = recipe_stats["min_items_required"]
-                selected_recipe_idx = len(recipe_tree)
+        item_cache_key += (next_expand_depth, expand_selected and node_is_selected_path)
 
-            recipe_tree.append(recipe_node)
+        # Part of the tree under this node is missing, so it's not the same
+        # as the whole one
+        if item_recipe_tree["is_truncated"]:
+            stats["is_truncated"] = True
+            item_cache_key += ("truncated",)
 
-        if not found_selected_recipe and selected_recipe_idx is not None:
-            recipe_tree[selected_recipe_idx]["selected"] = True
+        node["id"] = create_node_id(
+            "node",
+            node["name"],
+            item_cache_key,
+            node["amount_required"],
+            node["group"],
+            node["selected"],
+        )
 
-        if node["stats"]["max_recipe_efficiency"] is None:
-            node["stats"]["max_recipe_efficiency"] = 0
+        # The cached recipe nodes are shared, so give this node it's own copies
+        # with the amount we need of the item
+        node["recipes"] = [
+            dict(
+                recipe_node,
+                id=create_node_id(
+                    "recipe",
+                    recipe_node["name"],
+                    item_cache_key,
+                    node["amount_required"],
+                ),
+                amount_required=node["amount_required"],
+            )
+            for recipe_node in item_recipe_tree["recipes"]
+        ]
 
-        if node["stats"]["min_recipe_ingredients"] is None:
-            node["stats"]["min_recipe_ingredients"] = 0
+    # Nodes without recipes are just the item itself
+    for node in tree:
+        if isinstance(node, dict) and node["id"] is None:
+            node["id"] = create_node_id(
+                "node",
+                node["name"],
+                node["amount_required"],
+                node["group"],
+                node["selected"],
+            )
 
-        if not is_group:
-            stats["min_items_required"] += node["stats"]["min_recipe_ingredients"]
+    # Wow, we got a tree -- perfect!
+    return tree, stats
 
-        if (
-            stats["most_efficient_node"] is None or
-            node["stats"]["max_recipe_efficiency"] > stats["most_efficient_node"]
-        ):
-            stats["most_efficient_node"] = node["stats"]["max_recipe_efficiency"]
-            selected_node_idx = len(tree)
 
-            if is_group:
-                stats["min_items_required"] = node["stats"]["min_recipe_ingredients"]
+def create_recipe_tree_dag(recipe_tree):
+    """The same subtrees show up all over a recipe tree, eg. every recipe which
+    needs a stick has the whole stick -> planks -> logs tree under it. Since
+    node ids come from their content, every node can be stored once in a table
+    and everywhere else it's used is replaced by it's id.
 
-        node["num_recipes"] = len(recipe_tree)
-        node["recipes"] = recipe_tree
-        tree.append(node)
+    Ingredients (and the root of the tree) become lists of node ids, with
+    option groups still being nested lists.
 
-    if not found_selected_node and is_group:
-        tree[selected_node_idx]["selected"] = True
+    Arguments:
+        recipe_tree {list} -- A recipe tree from create_recipe_tree
 
-    if stats["most_efficient_node"] is None:
-        stats["most_efficient_node"] = 0
+    Returns:
+        dict -- {
+            root: The node ids of the top of the tree
+            nodes: Every node in the tree, keyed by id
+        }
+    """
+    nodes = {}
 
-    recipe_tree_cache[cache_key] = [tree, stats]
+    def add_nodes(tree):
+        refs = []
 
-    # Wow, we got a tree -- perfect!
-    return tree, stats
+        for node in tree:
+            if isinstance(node, list):
+                refs.append(add_nodes(node))
+                continue
+
+            refs.append(node["id"])
+
+            # Seen it already, the rest of it's tree is the same too
+            if node["id"] in nodes:
+                continue
+
+            nodes[node["id"]] = dict(
+                node,
+                recipes=[
+                    dict(recipe_node, ingredients=add_nodes(recipe_node["ingredients"]))
+                    for recipe_node in node["recipes"]
+                ],
+            )
+
+        return refs
 
+    root = add_nodes(recipe_tree)
 
-def create_shopping_list(
-    path,
-    have_already=None,
-    parent_used_leftovers=False,
-    parent_node=None,
-    shopping_list=None,
-    recipe_multiplier=1,
-    level=0
+    return {
+        "root": root,
+        "nodes": nodes,
+    }
+
+
+def expand_recipe_node(
+    handle,
+    version,
+    all_recipes,
+    all_tags,
+    supported_recipes,
+    expand_depth=1,
+    expand_selected=False,
+    budget=None,
 ):
+    """Expand a collapsed node from create_recipe_tree into it's recipes
+
+    Arguments:
+        handle {str} -- The handle of the collapsed node
+        version {string} -- Version of Minecraft Java Edition
+        all_recipes {dict} -- All the recipes in the game
+        all_tags {dict} -- All the tags in the game
+        supported_recipes {dict} -- Only the supported recipes in the game!
+
+    Keyword Arguments:
+        expand_depth {int} -- How many levels of items to expand, None for all (default: {1})
+        expand_selected {bool} -- Always expand the selected path (default: {False})
+        budget {dict} -- How much of the tree we can build, see create_tree_budget (default: {None})
+
+    Raises:
+        ValueError: If the handle isn't valid
+
+    Returns:
+        dict -- The expanded node
+    """
+    node_handle = parse_node_handle(handle)
+    item_name = node_handle["name"]
+
+    selected_build_paths = {}
+    if node_handle["selected_recipe"]:
+        selected_build_paths[item_name] = {"recipe": node_handle["selected_recipe"]}
+
+    # The ancestors in the item's recipe loop are the only ones which change
+    # what it's tree looks like, so they're all we need to pick up where we left off
+    tree, _ = create_recipe_tree(
+        [{
+            "name": item_name,
+            "amount_required": node_handle["amount_required"],
+            "group": node_handle["group"],
+        }],
+        selected_build_paths,
+        version=version,
+        all_recipes=all_recipes,
+        all_tags=all_tags,
+        supported_recipes=supported_recipes,
+        ancestors=dict.fromkeys(node_handle["relevant_ancestors"], True),
+        collapse_cycles=node_handle["collapse_cycles"],
+        expand_depth=expand_depth,
+        expand_selected=expand_selected,
+        budget=budget,
+    )
+
+    node = tree[0]
+    node["selected"] = node_handle["selected"]
+    return node
+
+
+def create_build_paths(recipe_tree, selected_items=None, is_group=False):
+    """Follow the selected nodes (and recipes) of a recipe tree to get the
+    recipe path that create_shopping_list needs. This is the same as
+    createBuildPaths in the app, so the path can be made without sending the
+    tree there and back.
+
+    Arguments:
+        recipe_tree {list} -- A recipe tree from create_recipe_tree (or a list
+                                of recipes / ingredients inside of it)
+
+    Keyword Arguments:
+        selected_items {list} -- The items the tree was created for (default: {None})
+        is_group {bool} -- Are the nodes an option group (default: {False})
+
+    Returns:
+        dict -- The selected recipe path
+    """
+    path = {}
+    has_selected_items = selected_items is not None and len(selected_items) > 0
+
+    def is_selected_tag(selected_item, group):
+        return isinstance(selected_item, dict) and "tag" in selected_item and selected_item["tag"] == group
+
+    for (node_idx, node) in enumerate(recipe_tree):
+        if isinstance(node, list):
+            new_selected_items = None
+            if (
+                has_selected_items and
+                node_idx < len(selected_items) and
+                is_selected_tag(selected_items[node_idx], node[0].get("group"))
+            ):
+                new_selected_items = [selected_items[node_idx]]
+
+            path.update(create_build_paths(node, new_selected_items, is_group=True))
+            continue
+
+        if not node.get("selected"):
+            continue
+
+        selected_item = None
+        if has_selected_items and is_group and is_selected_tag(selected_items[0], node.get("group")):
+            selected_item = selected_items[0]
+        elif (
+            has_selected_items and
+            node_idx < len(selected_items) and
+            isinstance(selected_items[node_idx], dict) and
+            selected_items[node_idx].get("name") == node["name"]
+        ):
+            selected_item = selected_items[node_idx]
+
+        path_node = {
+            "name": node["name"],
+            "tag": node.get("tag"),
+            "selected": node["selected"],
+            "type": node.get("type"),
+            "amount_required": (
+                selected_item.get("amount_required")
+                if selected_item else node.get("amount_required")
+            ),
+            "amount_created": node.get("amount_created"),
+        }
+
+        # Only keep what the node actually has
+        for key in ["tag", "type", "amount_created"]:
+            if path_node[key] is None:
+                del path_node[key]
+
+        if node.get("num_recipes", 0) >= 1:
+            chosen_recipe = create_build_paths(node["recipes"], is_group=True)
+            if len(chosen_recipe) > 0:
+                path_node["recipe"] = next(iter(chosen_recipe.values()))
+        elif node.get("ingredients"):
+            path_node["ingredients"] = create_build_paths(node["ingredients"])
+
+        path[path_node["name"]] = path_node
+
+        if is_group:
+            break
+
+    return path
+
+
+def get_shopping_list_steps(path):
+    """Flatten a recipe path into the list of steps needed to work out it's
+    shopping list. Every item in the path is a step, in the same order we'd
+    reach them walking down the path (parents always come before their
+    ingredients), so the shopping list can be worked out in a single loop.
+
+    Arguments:
+        path {dict} -- The recipe path (branches of the recipe tree) we're taking
+
+    Returns:
+        list -- The steps, each a tuple of (
+            item name,
+            amount required (per craft of the parent),
+            index of the parent step (None at the top of the path),
+            level in the path,
+            amount created by the item's recipe (None if it has no recipe),
+            type of the item's recipe,
+        )
+    """
+    steps = []
+
+    # Walk the path with our own stack instead of recursing, long recipe chains
+    # would otherwise hit the recursion limit. Items are pushed in reverse so
+    # they come back out in the order they're in the path.
+    to_visit = [(node_name, node, None, 0) for (node_name, node) in reversed(path.items())]
+
+    while len(to_visit) > 0:
+        node_name, node, parent_idx, level = to_visit.pop()
+
+        amount_required = node["amount_required"]
+        if not isinstance(amount_required, int):
+            amount_required = 0
+
+        recipe = node.get('recipe')
+        if recipe is None:
+            steps.append((node_name, amount_required, parent_idx, level, None, None))
+            continue
+
+        step_idx = len(steps)
+        steps.append((
+            node_name,
+            amount_required,
+            parent_idx,
+            level,
+            recipe.get("amount_created", 1),
+            recipe["type"],
+        ))
+
+        ingredients = recipe.get('ingredients', {})
+        to_visit += [
+            (ingredient_name, ingredient, step_idx, level + 1)
+            for (ingredient_name, ingredient) in reversed(ingredients.items())
+        ]
+
+    return steps
+
+
+def create_shopping_list(path, have_already=None, recipe_multiplier=1):
     """Based on the recipe tree create the shopping list we need
 
     Arguments:
@@ -553,36 +1931,97 @@ def create_shopping_list(
     Keyword Arguments:
         have_already {dict} -- Key value pair of items to how much you already have
                                 in your base / inventory (default: {None})
-        parent_node {str} -- Item name that came before (default: {None})
-        shopping_list {dict} -- The final resulting shopping list (default: {None})
+        recipe_multiplier {int} -- How many times the whole path is crafted (default: {1})
 
     Returns:
         dict -- Our shopping list by item
     """
+    steps = get_shopping_list_steps(path)
+    return evaluate_shopping_list_steps(
+        steps, have_already=have_already, recipe_multiplier=recipe_multiplier
+    )
 
-    if shopping_list is None:
-        shopping_list = {}
 
-    if have_already is None:
-        have_already = {}
+def create_shopping_lists(path, scenarios):
+    """Create the shopping list for the same recipe path over and over, once
+    for every scenario. The path is only flattened once, so comparing a bunch
+    of inventories (or how many times to build something) is cheap.
 
-    for node_name, node in path.items():
-        node_used_leftovers = parent_used_leftovers
-        # node_name = node["name"]
-        amount_required = node["amount_required"]
+    Arguments:
+        path {dict} -- The recipe path (branches of the recipe tree) we're taking
+        scenarios {list} -- Each a dict with the (optional) have_already and
+                            recipe_multiplier for that shopping list
 
-        if not isinstance(amount_required, int):
-            amount_required = 0
+    Returns:
+        list -- A shopping list for each scenario
+    """
+    steps = get_shopping_list_steps(path)
+
+    return [
+        evaluate_shopping_list_steps(
+            steps,
+            have_already=scenario.get("have_already"),
+            recipe_multiplier=scenario.get("recipe_multiplier", 1),
+        )
+        for scenario in scenarios
+    ]
 
-        amount_required = amount_required * recipe_multiplier
+
+def evaluate_shopping_list_steps(steps, have_already=None, recipe_multiplier=1):
+    """Work out the shopping list for the steps from get_shopping_list_steps
+
+    Arguments:
+        steps {list} -- The flattened recipe path
+
+    Keyword Arguments:
+        have_already {dict} -- Key value pair of items to how much you already have
+                                in your base / inventory (default: {None})
+        recipe_multiplier {int} -- How many times the whole path is crafted (default: {1})
+
+    Returns:
+        dict -- Our shopping list by item
+    """
+    if have_already is None:
+        have_already = {}
+
+    shopping_list = {}
+
+    # What every item requires, dicts are used as ordered sets so we don't have
+    # to scan the list every time an ingredient is added
+    requires = {}
+
+    # How many times each step is crafted and if it's made from leftovers,
+    # the ingredients of the step need to know
+    step_multipliers = [0] * len(steps)
+    step_used_leftovers = [False] * len(steps)
+
+    for (step_idx, step) in enumerate(steps):
+        (
+            node_name,
+            amount_required,
+            parent_idx,
+            level,
+            recipe_amount_created,
+            recipe_type,
+        ) = step
+
+        if parent_idx is None:
+            parent_node = None
+            node_used_leftovers = False
+            amount_required = amount_required * recipe_multiplier
+        else:
+            parent_node = steps[parent_idx][0]
+            node_used_leftovers = step_used_leftovers[parent_idx]
+            amount_required = amount_required * step_multipliers[parent_idx]
 
         # We've found a node we haven't seen before! Let's get it's dict setup
-        if node_name not in shopping_list:
+        item = shopping_list.get(node_name)
+        if item is None:
             have = have_already.get(node_name, 0)
-            shopping_list[node_name] = {
+            item = {
                 "name": node_name,
                 "level": level,
-                "has_recipe": node.get('recipe') is not None,
+                "has_recipe": recipe_amount_created is not None,
                 "amount_required": 0,
                 "amount_available": have,
                 "have": have,
@@ -594,49 +2033,47 @@ def create_shopping_list(
                 "requires": [],
                 "total_created": 0,
             }
+            shopping_list[node_name] = item
+            requires[node_name] = {}
 
-        if level < shopping_list[node_name]["level"]:
-            shopping_list[node_name]["level"] = level
+        if level < item["level"]:
+            item["level"] = level
 
-        have = shopping_list[node_name].get("have", 0)
-        amount_available = shopping_list[node_name].get("amount_available", 0)
-        total_created = shopping_list[node_name].get("total_created", 0)
+        amount_available = item["amount_available"]
 
         if parent_node:
-            if parent_node not in shopping_list[node_name]["amount_used_for"]:
-                 shopping_list[node_name]["amount_used_for"][parent_node] = 0
+            if parent_node not in item["amount_used_for"]:
+                item["amount_used_for"][parent_node] = 0
 
             if not node_used_leftovers:
-                shopping_list[node_name]["amount_used_for"]["recipes"] += amount_required
-                shopping_list[node_name]["amount_used_for"][parent_node] += amount_required
+                item["amount_used_for"]["recipes"] += amount_required
+                item["amount_used_for"][parent_node] += amount_required
 
-            if node_name not in shopping_list[parent_node]["requires"]:
-                shopping_list[parent_node]["requires"].append(node_name)
+            requires[parent_node][node_name] = True
         else:
-            shopping_list[node_name]["amount_used_for"]["self"] += amount_required
+            item["amount_used_for"]["self"] += amount_required
 
         if node_used_leftovers:
-             shopping_list[node_name]["implied_have"] += amount_required
+            item["implied_have"] += amount_required
         else:
-            shopping_list[node_name]["amount_required"] += amount_required
+            item["amount_required"] += amount_required
             amount_available -= amount_required
 
             # Wicked, we had enough available already to craft our item!
             if amount_available >= 0:
-                shopping_list[node_name]["amount_available"] = amount_available
+                item["amount_available"] = amount_available
                 node_used_leftovers = True
 
         # No recipes required to craft this item, so we can move on
-        if node.get('recipe') is None:
+        if recipe_amount_created is None:
             continue
 
         # The following logic is about making sure we have all the right amount
         # counts for this item in our shopping list!
         # v v v v v v v v v v v v v v v v v v v v v v v v v v v v v v v v v v v
 
-        recipe_amount_created = node["recipe"].get("amount_created", 1)
-        shopping_list[node_name]["amount_recipe_creates"] = recipe_amount_created
-        shopping_list[node_name]["recipe_type"] = node["recipe"]["type"]
+        item["amount_recipe_creates"] = recipe_amount_created
+        item["recipe_type"] = recipe_type
 
         if node_used_leftovers:
             next_recipe_multiplier = 0
@@ -644,24 +2081,17 @@ def create_shopping_list(
             missing_amount = abs(amount_available)
             next_recipe_multiplier = math.ceil(missing_amount / recipe_amount_created)
             amount_created = recipe_amount_created * next_recipe_multiplier
-            shopping_list[node_name]["total_created"] += amount_created
-            shopping_list[node_name]["amount_available"] = amount_created - missing_amount
+            item["total_created"] += amount_created
+            item["amount_available"] = amount_created - missing_amount
 
         # ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^ ^
 
-        # Now it's time to get the shopping list required for every ingredient!
-        new_shopping_list = create_shopping_list(
-            node["recipe"].get('ingredients', {}),
-            parent_node=node_name,
-            shopping_list=shopping_list,
-            have_already=have_already,
-            parent_used_leftovers=node_used_leftovers,
-            recipe_multiplier=next_recipe_multiplier,
-            level=level + 1
-        )
+        # The ingredients of this item are up next, they'll need these
+        step_multipliers[step_idx] = next_recipe_multiplier
+        step_used_leftovers[step_idx] = node_used_leftovers
 
-        # Let's join our current list with the new data
-        shopping_list.update(new_shopping_list)
+    for (node_name, item_requires) in requires.items():
+        shopping_list[node_name]["requires"] = list(item_requires)
 
     # And, we're done!
     return shopping_list
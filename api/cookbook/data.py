@@ -10,12 +10,24 @@ import re
 import glob
 import json
 import sys
+import mmap
+import struct
+import marshal
+import hashlib
+import tempfile
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 import cookbook.utils
 import cookbook.constants
+import cookbook.caches
+import cookbook.recipes
+import cookbook.calculator
 
-cur_dir = os.path.dirname(sys.argv[0])
+# All the data paths are relative to the api directory. That's found from this
+# file rather than the script being run, since a server (like gunicorn) isn't
+# started from a script in the api directory
+cur_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
 
 # Source Minecraft Data
 DATA_DIR = "cookbook/data/"
@@ -34,10 +46,53 @@ ITEM_MAPPINGS_FILE = CUSTOM_DATA_DIR + "{version}/item_mappings.json"
 GENERATED_DATA_DIR = DATA_DIR + "generated/"
 ALL_ITEMS_FILE = GENERATED_DATA_DIR + "{version}/all_items.json"
 ALL_RECIPES_FILE = GENERATED_DATA_DIR + "{version}/all_recipes.json"
+ALL_RECIPE_IR_FILE = GENERATED_DATA_DIR + "{version}/all_recipe_ir.json"
 ALL_ITEM_TAGS_FILE = GENERATED_DATA_DIR + "{version}/all_tags.json"
+SNAPSHOT_FILE = GENERATED_DATA_DIR + "{version}/snapshot.bin"
+MANIFEST_FILE = GENERATED_DATA_DIR + "{version}/manifest.json"
+
+# Bump this to throw away every manifest, and regenerate everything from scratch
+MANIFEST_SCHEMA_VERSION = 1
+
+# The snapshot starts with a header of the magic bytes, the snapshot schema
+# version, the marshal version it was written with and a sha256 of the rest
+SNAPSHOT_MAGIC = b"BGSNAP"
+SNAPSHOT_SCHEMA_VERSION = 3
+SNAPSHOT_HEADER = struct.Struct(">6sHH32s")
+
+# The datasets (by their cache names) that are saved in the snapshot
+SNAPSHOT_DATASETS = [
+    "items",
+    "tags",
+    "recipes",
+    "recipe_ir",
+    "item_mappings",
+    "supported_recipes_by_result",
+    "supported_craftable_items",
+]
+
+# The files the snapshot is made from, if any of them change the snapshot is
+# out of date
+SNAPSHOT_SOURCE_FILES = [
+    ALL_ITEMS_FILE,
+    ALL_RECIPES_FILE,
+    ALL_RECIPE_IR_FILE,
+    ALL_ITEM_TAGS_FILE,
+    ITEM_MAPPINGS_FILE,
+]
+
+# The permissions of the generated files, same as any file created with open()
+# under the usual umask
+GENERATED_FILE_MODE = 0o644
+
+# How many source files can be read at the same time
+INGESTION_MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# All the excluded item patterns as one regex, compiled once instead of per item file
+EXCLUDED_ITEMS_REGEX = re.compile('(?:% s)' % '|'.join(cookbook.constants.EXCLUDED_ITEMS_REGEX))
 
 # Holds all cached responses
-cache = defaultdict(dict)
+cache = cookbook.caches.create_cache("data")
 
 
 def get_filename_from_path(fullpath):
@@ -53,6 +108,70 @@ def get_filename_from_path(fullpath):
     return filename
 
 
+def share_dataset(dataset, data):
+    """Most of the data is the same from one version to the next, so every
+    recipe and tag is swapped for the copy shared by all the versions (see
+    utils.share_record) and all the names are interned. Only what's actually
+    different in a version takes up any more memory.
+
+    Arguments:
+        dataset {str} -- Name of the dataset, ex. recipes
+        data {any} -- The data of the dataset
+
+    Returns:
+        any -- The data made up of shared records
+    """
+    if dataset in ["recipes", "recipe_ir", "tags"]:
+        return {
+            sys.intern(name): cookbook.utils.share_record(record)
+            for (name, record) in data.items()
+        }
+
+    return cookbook.utils.intern_strings(data)
+
+
+def set_dataset(version, dataset, data):
+    """Add a dataset of a version to the cache, see share_dataset
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+        dataset {str} -- Name of the dataset, ex. recipes
+        data {any} -- The data of the dataset
+
+    Returns:
+        any -- The data, as it was cached
+    """
+    data = share_dataset(dataset, data)
+    cache.set(version, dataset, data)
+    return data
+
+
+def write_file(target_file, contents):
+    """Write a file all at once, the contents go to a temporary file which then
+    replaces the target file. Anyone reading the file (another thread or worker)
+    gets either the old version or the new one, never half of the new one.
+
+    Arguments:
+        target_file {str} -- Path of the file
+        contents {str|bytes} -- What to write to the file
+    """
+    target_dir = os.path.dirname(target_file)
+    os.makedirs(target_dir, exist_ok=True)
+
+    mode = "wb" if isinstance(contents, bytes) else "w"
+    fd, temp_file = tempfile.mkstemp(dir=target_dir, prefix=".tmp-", suffix=os.path.basename(target_file))
+    try:
+        with os.fdopen(fd, mode) as write_file:
+            write_file.write(contents)
+        # Temporary files are only readable by us, give it the usual permissions
+        os.chmod(temp_file, GENERATED_FILE_MODE)
+        os.replace(temp_file, target_file)
+    except BaseException:
+        os.remove(temp_file)
+        raise
+
+
+@cookbook.caches.single_flight(cache, "item_mappings")
 def fetch_item_mappings(version, force_create=False):
     """Get the generated item mappings, either get them from cache or from the
     filesystem
@@ -69,10 +188,13 @@ def fetch_item_mappings(version, force_create=False):
 
     # Pull from cache if we don't want to force create
     if not force_create:
-        cached_value = cache.get(version, {}).get("item_mappings")
+        cached_value = cache.get(version, "item_mappings")
         if cached_value is not None:
             return cached_value
 
+        if load_snapshot(version):
+            return cache.get(version, "item_mappings")
+
     item_mappings = {}
     try:
         # Pull item_mappings from cached file
@@ -84,71 +206,162 @@ def fetch_item_mappings(version, force_create=False):
     except Exception as e:
         logger.exception(e)
 
-    cache[version]["item_mappings"] = item_mappings
-    return item_mappings
+    # Keep using the cached mappings if nothing's changed, so anything made
+    # from them is still up to date
+    cached_value = cache.get(version, "item_mappings")
+    if cached_value is not None and cached_value == item_mappings:
+        return cached_value
+
+    return set_dataset(version, "item_mappings", item_mappings)
 
 
-def genertate_all_items(version):
-    """Generate all items by pulling the individual files from the directory
+def read_json_file(filepath):
+    """Read and parse a single JSON source file
 
     Arguments:
-        version {string} -- Version of Minecraft Java Edition
+        filepath {str} -- Path of the file
 
     Returns:
-        list -- all item names
+        any -- The parsed JSON
     """
-    raw_items = {}
+    with open(filepath, "r") as f:
+        return json.loads(f.read())
 
-    # Get the items, there is an individual file for each item, from the filesystem.
-    # For each file generate a dictionary mapping the filename (item name) to
-    # the contents of the file
-    items_file_dir = ITEM_FILES_DIR.format(version=version)
-    items_file_dir = os.path.join(cur_dir, items_file_dir)
-    item_files = glob.glob(items_file_dir)
-    for filepath in item_files:
-        with open(filepath, "r") as f:
-            data = f.read()
-            item_data = json.loads(data)
-            filename = get_filename_from_path(filepath)
 
-            is_excluded = filename in cookbook.constants.EXCLUDED_ITEMS
-            is_excluded_fuzzy = any(search in filename for search in cookbook.constants.EXCLUDED_ITEMS_FUZZY)
+def read_source_file(filepath):
+    """Read a source file as is, along with what we need to know if it's
+    changed later on (see update_generated_dataset)
 
-            excluded_items_regex = '(?:% s)' % '|'.join(cookbook.constants.EXCLUDED_ITEMS_REGEX)
-            is_excluded_regex = re.match(excluded_items_regex, filename)
+    Arguments:
+        filepath {str} -- Path of the file
 
-            entity_isnt_allowed = (
-                item_data.get("parent") == "builtin/entity"
-                and filename not in cookbook.constants.ALLOWED_ENTITIES
-            )
+    Returns:
+        tuple -- (fingerprint dict of the mtime, size and hash, contents of the file)
+    """
+    with open(filepath, "rb") as f:
+        contents = f.read()
+        stat = os.fstat(f.fileno())
+
+    fingerprint = {
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "hash": hashlib.sha1(contents).hexdigest(),
+    }
+    return fingerprint, contents
 
-            if is_excluded or is_excluded_fuzzy or is_excluded_regex or entity_isnt_allowed:
-                continue
 
-            raw_items[filename] = item_data
+def read_source_files(filepaths, read_file=read_json_file, max_workers=INGESTION_MAX_WORKERS):
+    """Read lots of small source files at once, the results come back in the
+    same order as the files so anything that depends on the order (like custom
+    files being first) still works
 
-    items = []
-    for name, data in raw_items.items():
-        parent = data.get('parent', '/')
-        parent_type, parent_name = parent.split('/')
+    Arguments:
+        filepaths {list} -- Paths of the files
 
-        if name != parent_name and parent_name in ['crossbow', 'bow', 'fishing_rod']:
-            continue
+    Keyword Arguments:
+        read_file {function} -- Reads a single file (default: {read_json_file})
+        max_workers {int} -- Max number of files to read at the same time (default: {INGESTION_MAX_WORKERS})
 
-        items.append(name)
+    Returns:
+        list -- (filepath, what read_file returned) for each file
+    """
+    if len(filepaths) == 0:
+        return []
 
-    items.sort()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(zip(filepaths, executor.map(read_file, filepaths)))
 
-    # Store the items we formatted and pulled from the system
-    target_file = ALL_ITEMS_FILE.format(version=version)
-    target_file = os.path.join(cur_dir, target_file)
-    os.makedirs(os.path.dirname(target_file), exist_ok=True)
-    with open(target_file, "w") as write_file:
-        json.dump(items, write_file)
 
+def get_source_versions():
+    """Get every version we have the Minecraft source data for
+
+    Returns:
+        list -- The versions, oldest first
+    """
+    versions_dir = os.path.join(cur_dir, MINECRAFT_DATA_DIR)
+    versions = [
+        version
+        for version in os.listdir(versions_dir)
+        if os.path.isdir(os.path.join(versions_dir, version))
+    ]
+
+    return sorted(versions, key=lambda version: [int(part) for part in version.split(".")])
+
+
+def generate_all_versions(versions=None):
+    """Regenerate the items, recipes and tags of every version from the source files
+
+    Keyword Arguments:
+        versions {list} -- Versions to generate, None for all of them (default: {None})
+
+    Returns:
+        dict -- Number of items, recipes and tags generated for each version
+    """
+    if versions is None:
+        versions = get_source_versions()
+
+    generated = {}
+    for version in versions:
+        get_all_crafting_data(version, force_create=True)
+
+        generated[version] = {
+            "items": len(cache.get(version, "items")),
+            "recipes": len(cache.get(version, "recipes")),
+            "tags": len(cache.get(version, "tags")),
+        }
+        logger.info(f'Generated data for version {version}: {generated[version]}')
+
+    return generated
+
+
+def parse_item_file(filepath, item_data):
+    """Work out if an item source file is for an item we want to include
+
+    Arguments:
+        filepath {str} -- Path of the item file
+        item_data {dict} -- Parsed contents of the item file
+
+    Returns:
+        dict -- {item name: True} if the item is included, otherwise empty
+    """
+    filename = get_filename_from_path(filepath)
+
+    is_excluded = filename in cookbook.constants.EXCLUDED_ITEMS
+    is_excluded_fuzzy = any(search in filename for search in cookbook.constants.EXCLUDED_ITEMS_FUZZY)
+    is_excluded_regex = EXCLUDED_ITEMS_REGEX.match(filename)
+
+    entity_isnt_allowed = (
+        item_data.get("parent") == "builtin/entity"
+        and filename not in cookbook.constants.ALLOWED_ENTITIES
+    )
+
+    if is_excluded or is_excluded_fuzzy or is_excluded_regex or entity_isnt_allowed:
+        return {}
+
+    parent = item_data.get('parent', '/')
+    parent_type, parent_name = parent.split('/')
+
+    if filename != parent_name and parent_name in ['crossbow', 'bow', 'fishing_rod']:
+        return {}
+
+    return {filename: True}
+
+
+def genertate_all_items(version):
+    """Generate all items by pulling the individual files from the directory,
+    only the files which have changed since last time are parsed again
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+
+    Returns:
+        list -- all item names
+    """
+    items, _ = update_generated_dataset(version, "items")
     return items
 
 
+@cookbook.caches.single_flight(cache, "items")
 def fetch_all_items(version, force_create=False):
     """Get all items from the cache, the already generated file of parsed data,
     or generate the data.
@@ -167,14 +380,16 @@ def fetch_all_items(version, force_create=False):
         items = genertate_all_items(version)
 
         # Add it to the cache for quick retrival
-        cache[version]["items"] = items
-        return items
+        return set_dataset(version, "items", items)
 
     # Pull data from cache if it exists
-    cached_value = cache.get(version, {}).get("items")
+    cached_value = cache.get(version, "items")
     if cached_value is not None:
         return cached_value
 
+    if load_snapshot(version):
+        return cache.get(version, "items")
+
     items = {}
 
     try:
@@ -194,12 +409,38 @@ def fetch_all_items(version, force_create=False):
         items = genertate_all_items(version)
 
     # Add it to the cache for quick retrival
-    cache[version]["items"] = items
-    return items
+    return set_dataset(version, "items", items)
+
+
+def parse_recipe_file(filepath, recipe_data):
+    """Format a recipe source file
+
+    Arguments:
+        filepath {str} -- Path of the recipe file
+        recipe_data {dict} -- Parsed contents of the recipe file
+
+    Returns:
+        dict -- {recipe name: recipe}
+    """
+    # prefix all custom recipes with "custom" so that we don't overwrite
+    # any existing Minecraft recipes with the same name
+    prefix = "custom-" if CUSTOM_DATA_DIR in filepath else ""
+    filename = get_filename_from_path(filepath)
+    recipe_name = recipe_data.get("name", prefix + filename)
+
+    # Sometimes Minecraft data as recipes results as strings instead of
+    # dicts, let's make sure it's always a dict
+    recipe_result = recipe_data.get("result")
+    if isinstance(recipe_result, str):
+        recipe_data["result"] = {"item": recipe_result}
+
+    recipe_data["name"] = recipe_name
+    return {recipe_name: recipe_data}
 
 
 def generate_all_recipes(version):
-    """Generate all recipes by pulling the individual files from the directory
+    """Generate all recipes by pulling the individual files from the directory,
+    only the files which have changed since last time are parsed again
 
     Arguments:
         version {string} -- Version of Minecraft Java Edition
@@ -207,50 +448,43 @@ def generate_all_recipes(version):
     Returns:
         dict -- All of the recipes keyed by recipe name
     """
-    recipes = {}
+    recipes, _ = update_generated_dataset(version, "recipes")
 
-    # Collect all the standard Minecraft recipes
-    recipes_file_dir = RECIPES_FILES_DIR.format(version=version)
-    recipes_file_dir = os.path.join(cur_dir, recipes_file_dir)
-    recipe_files = glob.glob(recipes_file_dir)
-
-    # Collect all of the custom recipes I created
-    custom_recipes_file_dir = CUSTOM_RECIPES_FILES_DIR.format(version=version)
-    custom_recipes_file_dir = os.path.join(cur_dir, custom_recipes_file_dir)
-    custom_recipe_files = glob.glob(custom_recipes_file_dir)
-
-    # combine both sets of recipes, custom_recipe_files MUST be the first
-    # set of items in the array
-    all_recipe_files = custom_recipe_files + recipe_files
-    for filepath in all_recipe_files:
-        # prefix all custom recipes with "custom" so that we don't overwrite
-        # any existing Minecraft recipes with the same name
-        prefix = "custom-" if CUSTOM_DATA_DIR in filepath else ""
-        with open(filepath, "r") as f:
-            data = f.read()
-            recipe_data = json.loads(data)
-            filename = get_filename_from_path(filepath)
-            recipe_name = recipe_data.get("name", prefix + filename)
+    # The calculator works from the recipe IR, so it's kept in step with the recipes
+    generate_all_recipe_ir(version)
+    return recipes
 
-            # Sometimes Minecraft data as recipes results as strings instead of
-            # dicts, let's make sure it's always a dict
-            recipe_result = recipe_data.get("result")
-            if isinstance(recipe_result, str):
-                recipe_data["result"] = {"item": recipe_result}
 
-            recipe_data["name"] = recipe_name
-            recipes[recipe_name] = recipe_data
+def parse_recipe_ir_file(filepath, recipe_data):
+    """Get the IR of the recipe in a recipe source file, see cookbook.recipes
 
-    # Write the formatted recipe data to a file
-    target_file = ALL_RECIPES_FILE.format(version=version)
-    target_file = os.path.join(cur_dir, target_file)
-    os.makedirs(os.path.dirname(target_file), exist_ok=True)
-    with open(target_file, "w") as write_file:
-        json.dump(recipes, write_file)
+    Arguments:
+        filepath {str} -- Path of the recipe file
+        recipe_data {dict} -- Parsed contents of the recipe file
 
-    return recipes
+    Returns:
+        dict -- {recipe name: recipe IR}
+    """
+    return {
+        recipe_name: cookbook.recipes.create_recipe_ir(recipe, recipe_name=recipe_name)
+        for (recipe_name, recipe) in parse_recipe_file(filepath, recipe_data).items()
+    }
+
+
+def generate_all_recipe_ir(version):
+    """Generate the IR of all recipes, the same way as generate_all_recipes
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+
+    Returns:
+        dict -- The IR of all of the recipes keyed by recipe name
+    """
+    recipe_ir, _ = update_generated_dataset(version, "recipe_ir")
+    return recipe_ir
 
 
+@cookbook.caches.single_flight(cache, "recipes")
 def fetch_all_recipes(version, force_create=False):
     """Get all recipes from the cache, the already generated file of parsed data,
     or generate the data.
@@ -270,14 +504,16 @@ def fetch_all_recipes(version, force_create=False):
         recipes = generate_all_recipes(version)
 
         # Save what we have to the cache
-        cache[version]["recipes"] = recipes
-        return recipes
+        return set_dataset(version, "recipes", recipes)
 
     # Pull the recipes from our cache!
-    cached_value = cache.get(version, {}).get("recipes")
+    cached_value = cache.get(version, "recipes")
     if cached_value is not None:
         return cached_value
 
+    if load_snapshot(version):
+        return cache.get(version, "recipes")
+
     recipes = {}
 
     try:
@@ -299,12 +535,61 @@ def fetch_all_recipes(version, force_create=False):
         recipes = generate_all_recipes(version)
 
     # Save what we have to the cache
-    cache[version]["recipes"] = recipes
-    return recipes
+    return set_dataset(version, "recipes", recipes)
+
+
+
+@cookbook.caches.single_flight(cache, "recipe_ir")
+def fetch_all_recipe_ir(version, force_create=False):
+    """Get the IR of all recipes from the cache, the already generated file of
+    parsed data, or generate the data.
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+
+    Keyword Arguments:
+        force_create {bool} -- Force create from source files (default: {False})
+
+    Returns:
+        dict -- The IR of all recipes keyed by recipe name
+    """
+    if force_create:
+        return set_dataset(version, "recipe_ir", generate_all_recipe_ir(version))
+
+    cached_value = cache.get(version, "recipe_ir")
+    if cached_value is not None:
+        return cached_value
+
+    if load_snapshot(version):
+        return cache.get(version, "recipe_ir")
+
+    try:
+        target_file = ALL_RECIPE_IR_FILE.format(version=version)
+        target_file = os.path.join(cur_dir, target_file)
+        recipe_ir = read_json_file(target_file)
+    except Exception:
+        # Same as the recipes, if there's a problem just generate it again
+        recipe_ir = generate_all_recipe_ir(version)
+
+    return set_dataset(version, "recipe_ir", recipe_ir)
+
+def parse_tag_file(filepath, item_tag_data):
+    """Format a tag source file
+
+    Arguments:
+        filepath {str} -- Path of the tag file
+        item_tag_data {dict} -- Parsed contents of the tag file
+
+    Returns:
+        dict -- {tag name: tag}
+    """
+    filename = get_filename_from_path(filepath)
+    return {filename: item_tag_data}
 
 
 def generate_all_tags(version):
-    """Generate all tags by pulling the individual files from the directory
+    """Generate all tags by pulling the individual files from the directory,
+    only the files which have changed since last time are parsed again
 
     Arguments:
         version {string} -- Version of Minecraft Java Edition
@@ -312,41 +597,278 @@ def generate_all_tags(version):
     Returns:
         dict -- All of the tags keyed by tag name
     """
+    tags, _ = update_generated_dataset(version, "tags")
+    return tags
 
-    tags = {}
 
-    # Get and loop through all the tag files in the source Minecraft directory
-    tags_file_dir = ITEM_TAGS_FILES_DIR.format(version=version)
-    tags_file_dir = os.path.join(cur_dir, tags_file_dir)
-    item_tag_files = glob.glob(tags_file_dir)
-
-    # Collect all of the custom tags I created
-    custom_tag_file_dir = CUSTOM_ITEM_TAGS_FILES_DIR.format(version=version)
-    custom_tag_file_dir = os.path.join(cur_dir, custom_tag_file_dir)
-    custom_tag_files = glob.glob(custom_tag_file_dir)
-
-    # combine both sets of recipes, custom_recipe_files MUST be the first
-    # set of items in the array
-    all_tag_files = custom_tag_files + item_tag_files
-    for filepath in all_tag_files:
-        # prefix all custom recipes with "custom" so that we don't overwrite
-        # any existing Minecraft recipes with the same name
-        with open(filepath, "r") as f:
-            data = f.read()
-            item_tag_data = json.loads(data)
-            filename = get_filename_from_path(filepath)
-            tags[filename] = item_tag_data
+# Everything we generate from the source files. Custom files MUST come before
+# the Minecraft files, if two files have the same name the last one wins.
+GENERATED_DATASETS = {
+    "items": {
+        "source_files": [ITEM_FILES_DIR],
+        "target_file": ALL_ITEMS_FILE,
+        "parse_file": parse_item_file,
+        "is_sorted_list": True,
+    },
+    "recipes": {
+        "source_files": [CUSTOM_RECIPES_FILES_DIR, RECIPES_FILES_DIR],
+        "target_file": ALL_RECIPES_FILE,
+        "parse_file": parse_recipe_file,
+        "is_sorted_list": False,
+    },
+    "recipe_ir": {
+        "source_files": [CUSTOM_RECIPES_FILES_DIR, RECIPES_FILES_DIR],
+        "target_file": ALL_RECIPE_IR_FILE,
+        "parse_file": parse_recipe_ir_file,
+        "is_sorted_list": False,
+    },
+    "tags": {
+        "source_files": [CUSTOM_ITEM_TAGS_FILES_DIR, ITEM_TAGS_FILES_DIR],
+        "target_file": ALL_ITEM_TAGS_FILE,
+        "parse_file": parse_tag_file,
+        "is_sorted_list": False,
+    },
+}
+
+
+def get_file_fingerprint(filepath):
+    """Get the size and modified time of a file
+
+    Arguments:
+        filepath {str} -- Path of the file
+
+    Returns:
+        list -- [size, modified time], or None if the file doesn't exist
+    """
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def get_dataset_source_files(version, dataset):
+    """Get all of the source files a dataset is generated from, in order
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+        dataset {str} -- Name of the dataset, see GENERATED_DATASETS
+
+    Returns:
+        list -- Paths of the source files
+    """
+    source_files = []
+    for source_files_dir in GENERATED_DATASETS[dataset]["source_files"]:
+        source_files_dir = source_files_dir.format(version=version)
+        source_files_dir = os.path.join(cur_dir, source_files_dir)
+        source_files += glob.glob(source_files_dir)
+
+    return source_files
+
 
-    # Store the generated dictionary to the filesystem for easy access
-    target_file = ALL_ITEM_TAGS_FILE.format(version=version)
+def fetch_manifest(version):
+    """Get the manifest of the source files used for the generated data of a
+    version. For each dataset it has every source file's mtime, size, content
+    hash and the keys it added to the generated data, and the size and mtime of
+    the generated file itself.
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+
+    Returns:
+        dict -- The manifest, an empty one if it doesn't exist (or is out of date)
+    """
+    empty_manifest = {
+        "schema_version": MANIFEST_SCHEMA_VERSION,
+        "datasets": {},
+        "outputs": {},
+    }
+
+    try:
+        target_file = MANIFEST_FILE.format(version=version)
+        target_file = os.path.join(cur_dir, target_file)
+        manifest = read_json_file(target_file)
+    except FileNotFoundError:
+        return empty_manifest
+    except Exception as e:
+        logger.exception(e)
+        return empty_manifest
+
+    if manifest.get("schema_version") != MANIFEST_SCHEMA_VERSION:
+        return empty_manifest
+
+    return manifest
+
+
+def save_manifest(version, manifest):
+    """Save the manifest of the source files of a version, see fetch_manifest
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+        manifest {dict} -- The manifest
+    """
+    target_file = MANIFEST_FILE.format(version=version)
     target_file = os.path.join(cur_dir, target_file)
-    os.makedirs(os.path.dirname(target_file), exist_ok=True)
-    with open(target_file, "w") as write_file:
-        json.dump(tags, write_file)
+    write_file(target_file, json.dumps(manifest))
+
+
+def update_generated_dataset(version, dataset):
+    """Bring a generated dataset up to date with it's source files. Using the
+    manifest, only the files which were added or changed are parsed, the values
+    from every other file are reused from the generated data and the ones from
+    removed files are dropped. Without a manifest, everything is generated from
+    scratch.
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+        dataset {str} -- Name of the dataset, see GENERATED_DATASETS
+
+    Returns:
+        tuple -- (the generated data, True if the data changed)
+    """
+    # Only one thread at a time can be updating the same files
+    with cache.get_lock(version, dataset):
+        config = GENERATED_DATASETS[dataset]
+        target_file = config["target_file"].format(version=version)
+        target_file = os.path.join(cur_dir, target_file)
+
+        manifest = fetch_manifest(version)
+        previous_files = manifest["datasets"].get(dataset, {})
+
+        # If the generated file has been changed by something else we can't trust
+        # it, start from scratch
+        is_from_scratch = (
+            dataset not in manifest["datasets"] or
+            manifest["outputs"].get(dataset) != get_file_fingerprint(target_file)
+        )
+        if is_from_scratch:
+            previous_files = {}
+
+        # When two files have the same key only the last one's value ends up in
+        # the generated data, so files with a shared key always get parsed again
+        key_counts = defaultdict(int)
+        for previous_file in previous_files.values():
+            for key in previous_file["keys"]:
+                key_counts[key] += 1
+        shared_keys = {key for (key, count) in key_counts.items() if count > 1}
+
+        # Files are kept in the manifest by their path in the api directory
+        source_files = get_dataset_source_files(version, dataset)
+        source_prefix = os.path.join(cur_dir, "")
+        source_paths = [filepath[len(source_prefix):] for filepath in source_files]
+
+        files = {}
+        files_to_read = []
+        for (filepath, source_path) in zip(source_files, source_paths):
+            previous_file = previous_files.get(source_path)
+            fingerprint = get_file_fingerprint(filepath)
+            if (
+                previous_file is not None and
+                fingerprint == [previous_file["size"], previous_file["mtime"]] and
+                shared_keys.isdisjoint(previous_file["keys"])
+            ):
+                files[source_path] = previous_file
+            else:
+                files_to_read.append(filepath)
+
+        # The mtime can change without the contents changing, only parse the files
+        # where the contents are actually different
+        parsed_files = {}
+        for filepath, (fingerprint, contents) in read_source_files(files_to_read, read_file=read_source_file):
+            source_path = filepath[len(source_prefix):]
+            previous_file = previous_files.get(source_path)
+            if (
+                previous_file is not None and
+                previous_file["hash"] == fingerprint["hash"] and
+                shared_keys.isdisjoint(previous_file["keys"])
+            ):
+                files[source_path] = {**previous_file, **fingerprint}
+                continue
+
+            parsed_files[source_path] = config["parse_file"](filepath, json.loads(contents))
+            files[source_path] = {**fingerprint, "keys": list(parsed_files[source_path].keys())}
+
+        changed_files = [
+            source_path
+            for source_path in parsed_files.keys()
+            if files[source_path]["hash"] != previous_files.get(source_path, {}).get("hash")
+        ]
+        is_changed = is_from_scratch or len(changed_files) > 0 or files.keys() != previous_files.keys()
+
+        if not is_changed:
+            data = read_json_file(target_file)
+        else:
+            previous_values = {}
+            if len(previous_files) > 0:
+                previous_data = read_json_file(target_file)
+                if config["is_sorted_list"]:
+                    previous_values = {key: True for key in previous_data}
+                else:
+                    previous_values = previous_data
+
+            # Put everything back together in the same order as the source files,
+            # so it's exactly what we'd get if everything had been parsed again
+            values = {}
+            for source_path in source_paths:
+                if source_path in parsed_files:
+                    values.update(parsed_files[source_path])
+                else:
+                    for key in files[source_path]["keys"]:
+                        values[key] = previous_values[key]
+
+            data = sorted(values.keys()) if config["is_sorted_list"] else values
+
+            # Store the data we formatted and pulled from the system
+            write_file(target_file, json.dumps(data))
+
+            logger.info(
+                f'Regenerated {dataset} for version {version}: '
+                f'{len(changed_files)} files changed, '
+                f'{len(previous_files.keys() - files.keys())} removed'
+            )
+
+        if is_changed or files != previous_files:
+            # Every dataset shares the manifest, so only one can update it at a time
+            with cache.get_lock(version, "manifest"):
+                manifest = fetch_manifest(version)
+                manifest["datasets"][dataset] = files
+                manifest["outputs"][dataset] = get_file_fingerprint(target_file)
+                save_manifest(version, manifest)
+
+        return data, is_changed
 
-    return tags
 
+def update_generated_data(version):
+    """Bring all the generated data of a version up to date with the source
+    files, and put it in the cache
 
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+
+    Returns:
+        bool -- True if any of the data changed
+    """
+    is_changed = False
+
+    for dataset in GENERATED_DATASETS.keys():
+        data, is_dataset_changed = update_generated_dataset(version, dataset)
+
+        # Keep using what's already cached if nothing's changed, so anything
+        # made from it is still up to date
+        if is_dataset_changed or cache.get(version, dataset) is None:
+            set_dataset(version, dataset, data)
+
+        is_changed = is_changed or is_dataset_changed
+
+    previous_item_mappings = cache.get(version, "item_mappings")
+    item_mappings = fetch_item_mappings(version, force_create=True)
+    is_changed = is_changed or item_mappings is not previous_item_mappings
+
+    return is_changed
+
+
+@cookbook.caches.single_flight(cache, "tags")
 def fetch_all_tags(version, force_create=False):
     """Get all tags from the cache, the already generated file of parsed data,
     or generate the data.
@@ -365,14 +887,16 @@ def fetch_all_tags(version, force_create=False):
     if force_create:
         tags = generate_all_tags(version)
 
-        cache[version]["tags"] = tags
-        return tags
+        return set_dataset(version, "tags", tags)
 
     # Pull tag data from our cached data
-    cached_value = cache.get(version, {}).get("tags")
+    cached_value = cache.get(version, "tags")
     if cached_value is not None:
         return cached_value
 
+    if load_snapshot(version):
+        return cache.get(version, "tags")
+
     tags = {}
     try:
         # Pull tag data from the generated file in the system
@@ -391,11 +915,11 @@ def fetch_all_tags(version, force_create=False):
         tags = generate_all_tags(version)
 
     # Save to cache and return!
-    cache[version]["tags"] = tags
-    return tags
+    return set_dataset(version, "tags", tags)
 
 
-def get_supported_recipes_by_result(version, recipes, force_create=False):
+@cookbook.caches.single_flight(cache, "supported_recipes_by_result")
+def get_supported_recipes_by_result(version, recipes, recipe_ir=None, force_create=False):
     """Returns a dictionary of the recipes supported by the system grouped by
     the resulting item the recipe creates.
 
@@ -404,6 +928,7 @@ def get_supported_recipes_by_result(version, recipes, force_create=False):
         recipes {list} -- All minecraft recipes for the same version
 
     Keyword Arguments:
+        recipe_ir {dict} -- The IR of the recipes, see fetch_all_recipe_ir (default: {None})
         force_create {bool} -- Force create from recipe data (default: {False})
 
     Returns:
@@ -412,33 +937,35 @@ def get_supported_recipes_by_result(version, recipes, force_create=False):
 
     # If we're not force creating pull from cache
     if not force_create:
-        cached_value = cache.get(version, {}).get("supported_recipes_by_result")
+        cached_value = cache.get(version, "supported_recipes_by_result")
         if cached_value is not None:
             return cached_value
 
+        if load_snapshot(version):
+            return cache.get(version, "supported_recipes_by_result")
+
     grouped_by_result = defaultdict(list)
 
-    for recipe_name, recipe in recipes.items():
+    # The recipes have to be loaded again when we're force creating, the
+    # recipes they came from might have changed
+    recipe_models = cookbook.recipes.get_recipe_models(
+        version, recipes, recipe_ir=recipe_ir, force_create=force_create
+    )
+
+    for recipe_name, recipe in recipe_models.items():
         # If the recipe is not supported, skip
-        if not cookbook.utils.is_supported_recipe(recipe):
+        if not recipe.is_supported:
             continue
 
-        recipe_result = recipe.get("result")
+        grouped_by_result[recipe.result_name].append(recipe_name)
 
-        if recipe_result is not None:
-            if isinstance(recipe_result, dict):
-                recipe_result = recipe_result["item"]
-
-            # Pull the actual item name from the recipe result string
-            recipe_result = cookbook.utils.parse_item_name(recipe_result)
-
-        grouped_by_result[recipe_result].append(recipe_name)
-
-    # Store this data in our cache
-    cache[version]["supported_recipes_by_result"] = grouped_by_result
-    return grouped_by_result
+    # Store this data in our cache, as a plain dict so nothing can be added
+    # to it by accident
+    grouped_by_result = dict(grouped_by_result)
+    return set_dataset(version, "supported_recipes_by_result", grouped_by_result)
 
 
+@cookbook.caches.single_flight(cache, "supported_craftable_items")
 def get_supported_craftable_items(
     version, supported_recipes_by_result, force_create=False
 ):
@@ -457,20 +984,23 @@ def get_supported_craftable_items(
 
     # Pull from cache is we don't want to force create
     if not force_create:
-        cached_value = cache.get(version, {}).get("supported_craftable_items")
+        cached_value = cache.get(version, "supported_craftable_items")
         if cached_value is not None:
             return cached_value
 
+        if load_snapshot(version):
+            return cache.get(version, "supported_craftable_items")
+
     # Get the keys from oru list of supported recipes by result
     supported_craftable_items = list(supported_recipes_by_result.keys())
     # Sort the data alphabetically
     supported_craftable_items.sort()
 
     # Store in the cache
-    cache[version]["supported_craftable_items"] = supported_craftable_items
-    return supported_craftable_items
+    return set_dataset(version, "supported_craftable_items", supported_craftable_items)
 
 
+@cookbook.caches.single_flight(cache, "crafting_data")
 def get_all_crafting_data(version, force_create=False):
     """ There's a lot of data available, let's just grab it all in one!
 
@@ -481,20 +1011,55 @@ def get_all_crafting_data(version, force_create=False):
         force_create  {bool} -- Force create all data (default: {False})
 
     Returns:
-        [type] -- [description]
+        dict -- All the data of the version, by dataset
     """
-    items = fetch_all_items(version, force_create=force_create)
-    tags = fetch_all_tags(version, force_create=force_create)
-    recipes = fetch_all_recipes(version, force_create=force_create)
-    item_mappings = fetch_item_mappings(version, force_create=force_create)
+    if not force_create:
+        cached_value = cache.get(version, "crafting_data")
+        if cached_value is not None:
+            return cached_value
+
+    # Only the source files that changed need to be parsed again, and if
+    # nothing changed there's nothing else to rebuild
+    if force_create:
+        force_create = update_generated_data(version)
+
+    items = fetch_all_items(version)
+    tags = fetch_all_tags(version)
+    recipes = fetch_all_recipes(version)
+    recipe_ir = fetch_all_recipe_ir(version)
+    item_mappings = fetch_item_mappings(version)
     supported_recipes_by_result = get_supported_recipes_by_result(
-        version, recipes, force_create=force_create
+        version, recipes, recipe_ir=recipe_ir, force_create=force_create
     )
     supported_craftable_items = get_supported_craftable_items(
         version, supported_recipes_by_result, force_create=force_create
     )
 
-    return {
+    # Everything the calculator worked out from the old data is out of date
+    if force_create:
+        cookbook.calculator.invalidate_caches(version)
+
+    # Get the ingredients of every recipe (and the recipe graph made from
+    # them) ready now, instead of during the first requests for them
+    cookbook.calculator.precompile_ingredients(
+        version, recipes, tags, supported_recipes_by_result, force_create=force_create
+    )
+    cookbook.calculator.get_recipe_graph(
+        version, recipes, tags, supported_recipes_by_result
+    )
+
+    # Save everything we just worked out, so next time it can all be loaded at
+    # once. If it can't be saved (read only, out of space...) don't try again
+    # until the data is created again.
+    is_snapshot_saved = cache.get(version, "has_snapshot") or cache.get(version, "snapshot_failed")
+    if force_create or not is_snapshot_saved:
+        try:
+            save_snapshot(version)
+        except Exception as e:
+            logger.exception(e)
+            cache.set(version, "snapshot_failed", True)
+
+    crafting_data = {
         "items": items,
         "tags": tags,
         "recipes": recipes,
@@ -502,3 +1067,142 @@ def get_all_crafting_data(version, force_create=False):
         "supported_recipes": supported_recipes_by_result,
         "supported_craftable_items": supported_craftable_items,
     }
+
+    # Store in the cache, so the requests after this one don't need to check
+    # all of the above again
+    cache.set(version, "crafting_data", crafting_data)
+    return crafting_data
+
+
+def get_snapshot_sources(version):
+    """Get the size and modified time of every file the snapshot is made from
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+
+    Returns:
+        list -- [file, size, modified time] for each file, or None if it's missing
+    """
+    sources = []
+    for source_file in SNAPSHOT_SOURCE_FILES:
+        source_file = source_file.format(version=version)
+        try:
+            stat = os.stat(os.path.join(cur_dir, source_file))
+            sources.append([source_file, stat.st_size, stat.st_mtime_ns])
+        except OSError:
+            sources.append(None)
+
+    return sources
+
+
+def write_snapshot(target_file, snapshot):
+    """Write a snapshot to a file, see read_snapshot
+
+    Arguments:
+        target_file {str} -- Where to write the snapshot
+        snapshot {dict} -- The snapshot data, anything marshal supports
+    """
+    payload = marshal.dumps(snapshot)
+    header = SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC,
+        SNAPSHOT_SCHEMA_VERSION,
+        marshal.version,
+        hashlib.sha256(payload).digest(),
+    )
+
+    write_file(target_file, header + payload)
+
+
+def read_snapshot(target_file):
+    """Read a snapshot written by write_snapshot. If it was written by another
+    schema or marshal version, or it's been corrupted, there's no snapshot.
+    The file is memory mapped instead of read, so every worker loading the
+    snapshot reads the same pages of the OS's file cache instead of each
+    making their own copy of the file.
+
+    Arguments:
+        target_file {str} -- The snapshot file
+
+    Returns:
+        dict -- The snapshot data, or None if the snapshot can't be used
+    """
+    with open(target_file, "rb") as f:
+        if os.fstat(f.fileno()).st_size < SNAPSHOT_HEADER.size:
+            return None
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, schema_version, marshal_version, checksum = SNAPSHOT_HEADER.unpack_from(data)
+            if (
+                magic != SNAPSHOT_MAGIC or
+                schema_version != SNAPSHOT_SCHEMA_VERSION or
+                marshal_version != marshal.version
+            ):
+                return None
+
+            # The view has to be released before the map can be closed
+            with memoryview(data)[SNAPSHOT_HEADER.size:] as payload:
+                if hashlib.sha256(payload).digest() != checksum:
+                    return None
+
+                return marshal.loads(payload)
+
+
+def save_snapshot(version):
+    """Save all the crafting data of a version, and everything the calculator
+    worked out from it, to the version's snapshot file
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+    """
+    snapshot = {
+        "sources": get_snapshot_sources(version),
+        "datasets": {name: cache.get(version, name) for name in SNAPSHOT_DATASETS},
+        "precompiled": cookbook.calculator.get_precompiled_data(version),
+    }
+
+    # The shared records can't be marshalled as they are, see utils.share_record
+    snapshot = cookbook.utils.to_plain_data(snapshot)
+
+    target_file = SNAPSHOT_FILE.format(version=version)
+    target_file = os.path.join(cur_dir, target_file)
+    write_snapshot(target_file, snapshot)
+    cache.set(version, "has_snapshot", True)
+
+
+@cookbook.caches.single_flight(cache, "has_snapshot")
+def load_snapshot(version):
+    """Load all the crafting data of a version from it's snapshot file, as long
+    as it's still up to date with the generated data files
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+
+    Returns:
+        bool -- True if the snapshot was loaded
+    """
+    # We only need to try once
+    has_snapshot = cache.get(version, "has_snapshot")
+    if has_snapshot is not None:
+        return has_snapshot
+
+    snapshot = None
+    try:
+        target_file = SNAPSHOT_FILE.format(version=version)
+        target_file = os.path.join(cur_dir, target_file)
+        snapshot = read_snapshot(target_file)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.exception(e)
+
+    if snapshot is None or snapshot["sources"] != get_snapshot_sources(version):
+        cache.set(version, "has_snapshot", False)
+        return False
+
+    for name in SNAPSHOT_DATASETS:
+        set_dataset(version, name, snapshot["datasets"][name])
+
+    cookbook.calculator.load_precompiled_data(version, snapshot["precompiled"])
+
+    cache.set(version, "has_snapshot", True)
+    return True
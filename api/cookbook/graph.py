@@ -0,0 +1,257 @@
+"""GRAPH
+Compiled version of the recipe data, every item and recipe gets an integer id
+so the calculator can walk plain lists instead of digging through recipe dicts
+"""
+import os
+import logging
+
+os.environ["TZ"] = "UTC"
+logger = logging.getLogger(__name__)
+
+import sys
+
+
+def sort_recipe_names(recipe_names):
+    """Custom recipes always come first, then the game recipes, and each set is
+    sorted alphabetically
+
+    Arguments:
+        recipe_names {list} -- Names of the recipes to be sorted
+
+    Returns:
+        list -- The sorted recipe names
+    """
+    custom_recipes = []
+    game_recipes = []
+    for recipe_name in recipe_names:
+        if "custom-" in recipe_name:
+            custom_recipes.append(recipe_name)
+        else:
+            game_recipes.append(recipe_name)
+
+    custom_recipes.sort()
+    game_recipes.sort()
+    return custom_recipes + game_recipes
+
+
+def get_ingredient_names(ingredients):
+    """Ingredients can be nested lists of option groups, flatten them out to
+    just the names of the items
+
+    Arguments:
+        ingredients {list} -- Formatted ingredients, see calculator.format_recipe_ingredients
+
+    Returns:
+        list -- All of the item names used by the ingredients
+    """
+    names = []
+
+    for ingredient in ingredients:
+        if isinstance(ingredient, list):
+            names += get_ingredient_names(ingredient)
+        else:
+            names.append(ingredient["name"])
+
+    return names
+
+
+def compile_recipe_graph(recipe_models, supported_recipes, recipe_ingredients):
+    """Compile the recipe data for a version into a graph of items and recipes.
+    Items and recipes are given integer ids, which are indexes into the lists
+    of the graph:
+
+        item_recipes[item_id] -> recipe ids which craft the item (already sorted)
+        recipe_results[recipe_id] -> item id the recipe creates
+        recipe_ingredient_ids[recipe_id] -> item ids the recipe uses
+        item_uses[item_id] -> recipe ids which use the item
+
+    Arguments:
+        recipe_models {dict} -- All the normalized recipes in the game, see cookbook.recipes
+        supported_recipes {dict} -- Supported recipe names grouped by result
+        recipe_ingredients {dict} -- Formatted ingredients keyed by recipe name
+
+    Returns:
+        dict -- The compiled recipe graph
+    """
+    graph = {
+        "item_ids": {},
+        "item_names": [],
+        "item_recipes": [],
+        "recipe_ids": {},
+        "recipe_names": [],
+        "recipe_types": [],
+        "recipe_kinds": [],
+        "recipe_results": [],
+        "recipe_amounts_created": [],
+        "recipe_ingredients": [],
+        "recipe_ingredient_ids": [],
+    }
+
+    def get_item_id(item_name):
+        item_id = graph["item_ids"].get(item_name)
+        if item_id is None:
+            item_name = sys.intern(item_name)
+            item_id = len(graph["item_names"])
+            graph["item_ids"][item_name] = item_id
+            graph["item_names"].append(item_name)
+            graph["item_recipes"].append(())
+
+        return item_id
+
+    for result_name in sorted(supported_recipes.keys()):
+        result_id = get_item_id(result_name)
+        item_recipes = []
+
+        for recipe_name in sort_recipe_names(supported_recipes[result_name]):
+            recipe = recipe_models[recipe_name]
+            ingredients = recipe_ingredients[recipe_name]
+
+            recipe_id = len(graph["recipe_names"])
+            graph["recipe_ids"][recipe_name] = recipe_id
+            graph["recipe_names"].append(recipe.name)
+            graph["recipe_types"].append(recipe.type)
+            graph["recipe_kinds"].append(recipe.kind)
+            graph["recipe_results"].append(result_id)
+            graph["recipe_amounts_created"].append(recipe.amount_created)
+            graph["recipe_ingredients"].append(ingredients)
+            graph["recipe_ingredient_ids"].append(tuple(sorted({
+                get_item_id(ingredient_name)
+                for ingredient_name in get_ingredient_names(ingredients)
+            })))
+
+            item_recipes.append(recipe_id)
+
+        graph["item_recipes"][result_id] = tuple(item_recipes)
+
+    # And the other way around, which recipes is every item used in
+    item_uses = [[] for _ in graph["item_names"]]
+    for (recipe_id, ingredient_ids) in enumerate(graph["recipe_ingredient_ids"]):
+        for ingredient_id in ingredient_ids:
+            item_uses[ingredient_id].append(recipe_id)
+
+    graph["item_uses"] = [tuple(recipe_ids) for recipe_ids in item_uses]
+
+    item_components, components = find_strongly_connected_components(graph)
+    graph["item_components"] = item_components
+    graph["components"] = [
+        frozenset(graph["item_names"][item_id] for item_id in component)
+        for component in components
+    ]
+    graph["component_is_cyclic"] = [
+        len(component) > 1 or is_self_referencing(graph, component[0])
+        for component in components
+    ]
+
+    return graph
+
+
+def get_item_ingredient_ids(graph, item_id):
+    """Get the ids of every item used by any of the recipes for an item
+
+    Arguments:
+        graph {dict} -- The compiled recipe graph
+        item_id {int} -- Id of the item
+
+    Returns:
+        list -- Ids of the ingredients (the edges out of this item)
+    """
+    ingredient_ids = []
+    for recipe_id in graph["item_recipes"][item_id]:
+        ingredient_ids += graph["recipe_ingredient_ids"][recipe_id]
+
+    return ingredient_ids
+
+
+def is_self_referencing(graph, item_id):
+    """Check if any of the recipes for an item use the item itself
+
+    Arguments:
+        graph {dict} -- The compiled recipe graph
+        item_id {int} -- Id of the item
+
+    Returns:
+        bool -- True if the item is one of it's own ingredients
+    """
+    return item_id in get_item_ingredient_ids(graph, item_id)
+
+
+def find_strongly_connected_components(graph):
+    """Group the items of the graph into strongly connected components, every
+    item in a component can be crafted from every other item in it (through
+    some chain of recipes). Items which are part of a recipe loop, like
+    iron_block <-> iron_ingot, will share a component. Uses an iterative
+    version of Tarjan's algorithm so deep recipe chains can't hit the
+    recursion limit. Components come out in reverse topological order, so the
+    ingredients of a component always come before it.
+
+    Arguments:
+        graph {dict} -- The compiled recipe graph
+
+    Returns:
+        tuple -- (
+            list of the component id for each item id,
+            list of components, each a tuple of item ids
+        )
+    """
+    num_items = len(graph["item_names"])
+    item_indexes = [None] * num_items
+    item_lowlinks = [0] * num_items
+    is_on_stack = [False] * num_items
+    stack = []
+
+    item_components = [None] * num_items
+    components = []
+    next_index = 0
+
+    for root_id in range(num_items):
+        if item_indexes[root_id] is not None:
+            continue
+
+        item_indexes[root_id] = item_lowlinks[root_id] = next_index
+        next_index += 1
+        stack.append(root_id)
+        is_on_stack[root_id] = True
+
+        # Each entry is an item and an iterator over the items it still needs to visit
+        to_visit = [(root_id, iter(get_item_ingredient_ids(graph, root_id)))]
+
+        while len(to_visit) > 0:
+            item_id, ingredient_ids = to_visit[-1]
+
+            for ingredient_id in ingredient_ids:
+                if item_indexes[ingredient_id] is None:
+                    item_indexes[ingredient_id] = item_lowlinks[ingredient_id] = next_index
+                    next_index += 1
+                    stack.append(ingredient_id)
+                    is_on_stack[ingredient_id] = True
+                    to_visit.append(
+                        (ingredient_id, iter(get_item_ingredient_ids(graph, ingredient_id)))
+                    )
+                    break
+
+                if is_on_stack[ingredient_id]:
+                    item_lowlinks[item_id] = min(item_lowlinks[item_id], item_indexes[ingredient_id])
+            else:
+                # We've visited everything below this item
+                to_visit.pop()
+
+                if len(to_visit) > 0:
+                    parent_id = to_visit[-1][0]
+                    item_lowlinks[parent_id] = min(item_lowlinks[parent_id], item_lowlinks[item_id])
+
+                # This item is the root of a component, everything above it on
+                # the stack belongs to the same component
+                if item_lowlinks[item_id] == item_indexes[item_id]:
+                    component = []
+                    while True:
+                        component_item_id = stack.pop()
+                        is_on_stack[component_item_id] = False
+                        item_components[component_item_id] = len(components)
+                        component.append(component_item_id)
+
+                        if component_item_id == item_id:
+                            break
+
+                    components.append(tuple(component))
+
+    return item_components, components
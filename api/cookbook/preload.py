@@ -0,0 +1,200 @@
+"""PRELOAD
+Load and warm up the data of every version before the first requests for them
+arrive, and keep track of how far along each version is so we can tell when
+we're ready to take traffic
+"""
+import os
+import logging
+
+os.environ["TZ"] = "UTC"
+logger = logging.getLogger(__name__)
+
+import gc
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cookbook.data
+import cookbook.calculator
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+# The load state of each version that's been preloaded
+versions_status = {}
+versions_status_lock = threading.Lock()
+
+
+def set_version_status(version, **status):
+    """Update the load state of a version
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+        **status -- The fields of the status to update
+    """
+    with versions_status_lock:
+        versions_status.setdefault(version, {}).update(status)
+
+
+def get_versions_status():
+    """Get the load state of every version that's been preloaded
+
+    Returns:
+        dict -- The status of each version, by version
+    """
+    with versions_status_lock:
+        return {
+            version: {**status, "timings": dict(status.get("timings", {}))}
+            for (version, status) in versions_status.items()
+        }
+
+
+def is_ready():
+    """Check if every version that's being preloaded is ready to go
+
+    Returns:
+        bool -- True if there are versions and they've all loaded
+    """
+    with versions_status_lock:
+        return (
+            len(versions_status) > 0 and
+            all(status["state"] == READY for status in versions_status.values())
+        )
+
+
+def preload_version(version, force_create=False):
+    """Load all the crafting data of a version, and work out everything the
+    calculator needs (ingredients, tag index, recipe graph, recipe stats) so
+    none of it happens during a request
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+
+    Keyword Arguments:
+        force_create {bool} -- Force create all data (default: {False})
+
+    Returns:
+        bool -- True if the version loaded
+    """
+    started_at = time.time()
+    timings = {}
+    set_version_status(version, state=LOADING, started_at=started_at, timings=timings)
+
+    try:
+        step_start = time.perf_counter()
+        crafting_data = cookbook.data.get_all_crafting_data(version, force_create=force_create)
+        timings["crafting_data"] = time.perf_counter() - step_start
+
+        step_start = time.perf_counter()
+        cookbook.calculator.get_tag_index(version, crafting_data["tags"])
+        timings["tag_index"] = time.perf_counter() - step_start
+
+        step_start = time.perf_counter()
+        cookbook.calculator.get_recipe_stats_table(
+            version,
+            crafting_data["recipes"],
+            crafting_data["tags"],
+            crafting_data["supported_recipes"],
+        )
+        timings["recipe_stats"] = time.perf_counter() - step_start
+    except Exception as e:
+        logger.exception(e)
+        set_version_status(
+            version,
+            state=FAILED,
+            seconds=time.time() - started_at,
+            error=str(e),
+        )
+        return False
+
+    seconds = time.time() - started_at
+    set_version_status(version, state=READY, seconds=seconds, timings=timings)
+    logger.info(f'Preloaded version {version} in {seconds:.3f}s: {timings}')
+    return True
+
+
+def preload_versions(versions=None, max_workers=1, force_create=False):
+    """Preload a list of versions, see preload_version
+
+    Keyword Arguments:
+        versions {list} -- Versions to preload, None for all of them (default: {None})
+        max_workers {int} -- How many versions to load at the same time (default: {1})
+        force_create {bool} -- Force create all data (default: {False})
+
+    Returns:
+        dict -- The status of each version, by version
+    """
+    if versions is None:
+        versions = cookbook.data.get_source_versions()
+
+    for version in versions:
+        set_version_status(version, state=PENDING, timings={})
+
+    if max_workers > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for version in versions:
+                executor.submit(preload_version, version, force_create=force_create)
+    else:
+        for version in versions:
+            preload_version(version, force_create=force_create)
+
+    return get_versions_status()
+
+
+def start_preload(versions=None, max_workers=1, force_create=False):
+    """Preload versions in the background, so we can start answering requests
+    (like the readiness check) straight away
+
+    Keyword Arguments:
+        versions {list} -- Versions to preload, None for all of them (default: {None})
+        max_workers {int} -- How many versions to load at the same time (default: {1})
+        force_create {bool} -- Force create all data (default: {False})
+
+    Returns:
+        threading.Thread -- The thread doing the preloading
+    """
+    if versions is None:
+        versions = cookbook.data.get_source_versions()
+
+    # Mark everything as pending now, so we're not ready before the thread starts
+    for version in versions:
+        set_version_status(version, state=PENDING, timings={})
+
+    thread = threading.Thread(
+        target=preload_versions,
+        kwargs={"versions": versions, "max_workers": max_workers, "force_create": force_create},
+        name="preload",
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def preload_before_fork(versions=None, max_workers=1, force_create=False):
+    """Preload versions in a server's main process, before it forks its
+    workers. Every worker then starts with all the data already loaded, and
+    since forked processes share memory until it's written to, the workers all
+    share the one copy of it.
+
+    Just reading an object still writes to it (the reference count) but it's
+    the garbage collector which really breaks the sharing, every collection
+    touches every object. So once everything's loaded it's frozen, the
+    collector leaves frozen objects alone.
+
+    Keyword Arguments:
+        versions {list} -- Versions to preload, None for all of them (default: {None})
+        max_workers {int} -- How many versions to load at the same time (default: {1})
+        force_create {bool} -- Force create all data (default: {False})
+
+    Returns:
+        dict -- The status of each version, by version
+    """
+    status = preload_versions(versions=versions, max_workers=max_workers, force_create=force_create)
+
+    gc.collect()
+    gc.freeze()
+    logger.info(f'Froze {gc.get_freeze_count()} objects before forking')
+
+    return status
@@ -0,0 +1,368 @@
+"""RECIPES
+Recipes as they come from the game data can take a bunch of different shapes
+(a pattern and key, a list of ingredients, a single ingredient, a base and an
+addition...) so when the data's generated every recipe is turned into the one
+canonical shape, the recipe IR:
+
+    {
+        "name": "iron_pickaxe",
+        "type": "minecraft:crafting_shaped",
+        "kind": "shaped",
+        "result": "iron_pickaxe",
+        "count": 1,
+        "ingredients": [
+            {"item": "iron_ingot", "amount": 3},
+            {"tag": "planks", "amount": 2},
+            {"options": [{"item": "sand", "amount": 1}, {"item": "red_sand", "amount": 1}]},
+        ],
+    }
+
+Every ingredient is either an item, any item in a tag, or one of a set of
+options. When the data's loaded the IR of each recipe becomes a Recipe, which
+is what the rest of the cookbook works with.
+"""
+import os
+import logging
+
+os.environ["TZ"] = "UTC"
+logger = logging.getLogger(__name__)
+
+import sys
+import cookbook.utils
+import cookbook.caches
+
+# The kinds of recipes, worked out from the recipe type
+UNSUPPORTED = 0
+SHAPED = 1
+SHAPELESS = 2
+SINGLE_INGREDIENT = 3
+SMITHING = 4
+
+# The name of each kind in the recipe IR, indexed by kind
+KIND_NAMES = ["unsupported", "shaped", "shapeless", "single_ingredient", "smithing"]
+
+# Recipe types that don't have a kind of their own are shapeless, their
+# ingredients are just a list of what's needed
+RECIPE_TYPE_KINDS = {
+    "minecraft:crafting_shaped": SHAPED,
+    "minecraft:smithing": SMITHING,
+    "minecraft:smelting": SINGLE_INGREDIENT,
+    "minecraft:stonecutting": SINGLE_INGREDIENT,
+    "minecraft:smoking": SINGLE_INGREDIENT,
+    "minecraft:blasting": SINGLE_INGREDIENT,
+}
+
+# Holds the Recipes of each version
+recipe_models_cache = cookbook.caches.create_cache("recipe_models")
+
+
+class Recipe:
+    """A recipe loaded from it's IR, see the top of this file
+
+    Arguments:
+        name {str} -- Name of the recipe
+        recipe_type {str} -- The type of the recipe, as it is in the game data
+        kind {int} -- One of the recipe kinds above
+        result_name {str} -- Name of the item the recipe creates
+        amount_created {int} -- How many of the item the recipe creates
+        ingredients {tuple} -- The ingredients of the recipe, as they are in the IR
+    """
+
+    __slots__ = (
+        "name",
+        "type",
+        "kind",
+        "result_name",
+        "amount_created",
+        "ingredients",
+    )
+
+    def __init__(self, name, recipe_type, kind, result_name, amount_created, ingredients):
+        self.name = name
+        self.type = recipe_type
+        self.kind = kind
+        self.result_name = result_name
+        self.amount_created = amount_created
+        self.ingredients = ingredients
+
+    def __repr__(self):
+        return f"Recipe({self.name!r}, {self.type!r})"
+
+    @property
+    def is_supported(self):
+        return self.kind != UNSUPPORTED
+
+
+def get_recipe_kind(recipe_type):
+    """Get the kind of a recipe type, see cookbook.utils.is_supported_recipe
+    for which types are supported
+
+    Arguments:
+        recipe_type {str} -- The type of the recipe, as it is in the game data
+
+    Returns:
+        int -- The kind of recipe
+    """
+    if not cookbook.utils.is_supported_recipe({"type": recipe_type}):
+        return UNSUPPORTED
+
+    return RECIPE_TYPE_KINDS.get(recipe_type, SHAPELESS)
+
+
+def get_ingredient_item_name(recipe_name, ingredient):
+    """Get the item name of a raw ingredient which is a single item
+
+    Arguments:
+        recipe_name {str} -- Name of the recipe, for the error message
+        ingredient {str|dict} -- The raw ingredient
+
+    Raises:
+        ValueError: If the ingredient isn't an item
+
+    Returns:
+        str -- Name of the item
+    """
+    item = ingredient
+    if isinstance(ingredient, dict):
+        item = ingredient.get("item", ingredient.get("name"))
+
+    if not isinstance(item, str):
+        raise ValueError(f"Recipe {recipe_name} has an invalid ingredient: {ingredient!r}")
+
+    return cookbook.utils.parse_item_name(item)
+
+
+def get_options_ir(recipe_name, options, amount=None):
+    """Get the IR of a list of options, any one of the items can be used
+
+    Arguments:
+        recipe_name {str} -- Name of the recipe, for the error message
+        options {list} -- The raw ingredients which are the options
+
+    Keyword Arguments:
+        amount {int} -- How many of the chosen option are needed, None to
+            count how many times each option is listed (default: {None})
+
+    Returns:
+        dict -- The options ingredient
+    """
+    option_amounts = {}
+    for option in options:
+        item_name = get_ingredient_item_name(recipe_name, option)
+        if amount is not None:
+            option_amounts[item_name] = amount
+        else:
+            option_amounts[item_name] = option_amounts.get(item_name, 0) + 1
+
+    return {
+        "options": [
+            {"item": item_name, "amount": option_amount}
+            for (item_name, option_amount) in option_amounts.items()
+        ]
+    }
+
+
+def get_shaped_ingredients_ir(recipe):
+    """Get the IR of the ingredients of a shaped recipe. Every key used in the
+    recipe's pattern is an ingredient, and it's needed as many times as it
+    shows up in the pattern.
+
+    Arguments:
+        recipe {dict} -- Minecraft shaped recipe
+
+    Raises:
+        ValueError: If the pattern, key or any of the ingredients are invalid
+
+    Returns:
+        list -- The ingredients
+    """
+    recipe_name = recipe.get("name")
+    pattern = recipe.get("pattern")
+    recipe_key = recipe.get("key")
+    if not isinstance(pattern, list) or not isinstance(recipe_key, dict):
+        raise ValueError(f"Recipe {recipe_name} has an invalid pattern or key")
+
+    pattern_counts = {}
+    for row in pattern:
+        for cell in row:
+            # If the cell value is not as part of the recipe key let's skip
+            if cell not in recipe_key:
+                continue
+
+            pattern_counts[cell] = pattern_counts.get(cell, 0) + 1
+
+    ingredients = []
+    for (key, count) in pattern_counts.items():
+        ingredient = recipe_key[key]
+
+        if isinstance(ingredient, list):
+            ingredients.append(get_options_ir(recipe_name, ingredient, amount=count))
+        elif isinstance(ingredient, dict) and ingredient.get("tag") is not None:
+            tag_name = cookbook.utils.parse_item_name(ingredient["tag"])
+            ingredients.append({"tag": tag_name, "amount": count})
+        else:
+            item_name = get_ingredient_item_name(recipe_name, ingredient)
+            ingredients.append({"item": item_name, "amount": count})
+
+    return ingredients
+
+
+def get_listed_ingredients_ir(recipe_name, raw_ingredients):
+    """Get the IR of a list of ingredients. Items listed more than once are
+    counted, and come before any tags and options (in the order they're
+    first listed).
+
+    Arguments:
+        recipe_name {str} -- Name of the recipe, for the error message
+        raw_ingredients {list} -- The raw ingredients
+
+    Raises:
+        ValueError: If any of the ingredients are invalid
+
+    Returns:
+        list -- The ingredients
+    """
+    item_amounts = {}
+    groups = []
+
+    for ingredient in raw_ingredients:
+        if isinstance(ingredient, list):
+            groups.append(get_options_ir(recipe_name, ingredient))
+        elif isinstance(ingredient, dict) and ingredient.get("tag") is not None:
+            tag_name = cookbook.utils.parse_item_name(ingredient["tag"])
+            groups.append({"tag": tag_name, "amount": 1})
+        else:
+            item_name = get_ingredient_item_name(recipe_name, ingredient)
+            item_amounts[item_name] = item_amounts.get(item_name, 0) + 1
+
+    items = [
+        {"item": item_name, "amount": amount}
+        for (item_name, amount) in item_amounts.items()
+    ]
+    return items + groups
+
+
+def create_recipe_ir(recipe, recipe_name=None):
+    """Turn a recipe from the game data into it's IR, see the top of this file
+
+    Arguments:
+        recipe {dict} -- Minecraft recipe
+
+    Keyword Arguments:
+        recipe_name {str} -- Name to use if the recipe doesn't have one (default: {None})
+
+    Raises:
+        ValueError: If the recipe isn't valid
+
+    Returns:
+        dict -- The recipe IR
+    """
+    recipe_name = recipe.get("name", recipe_name)
+    recipe_type = recipe.get("type")
+    if not isinstance(recipe_type, str):
+        raise ValueError(f"Recipe {recipe_name} has no type")
+
+    kind = get_recipe_kind(recipe_type)
+
+    result_name = None
+    amount_created = 1
+    recipe_result = recipe.get("result")
+    if isinstance(recipe_result, dict):
+        amount_created = recipe_result.get("count", 1)
+        recipe_result = recipe_result.get("item")
+
+    if recipe_result is not None:
+        # Pull the actual item name from the recipe result string
+        result_name = cookbook.utils.parse_item_name(recipe_result)
+
+    if kind != UNSUPPORTED and (
+        result_name is None or not isinstance(amount_created, int) or amount_created < 1
+    ):
+        raise ValueError(f"Recipe {recipe_name} has an invalid result: {recipe.get('result')!r}")
+
+    ingredients = []
+    if kind == SHAPED:
+        ingredients = get_shaped_ingredients_ir(recipe)
+    elif kind == SMITHING:
+        raw_ingredients = [recipe.get("base"), recipe.get("addition")]
+        ingredients = get_listed_ingredients_ir(recipe_name, raw_ingredients)
+    elif kind != UNSUPPORTED:
+        raw_ingredients = recipe.get("ingredients", recipe.get("ingredient", []))
+        if not isinstance(raw_ingredients, list):
+            raw_ingredients = [raw_ingredients]
+
+        # A single ingredient recipe with a list of ingredients can be made
+        # with any one of them
+        if kind == SINGLE_INGREDIENT and len(raw_ingredients) > 1:
+            raw_ingredients = [raw_ingredients]
+
+        ingredients = get_listed_ingredients_ir(recipe_name, raw_ingredients)
+
+    return {
+        "name": recipe_name,
+        "type": recipe_type,
+        "kind": KIND_NAMES[kind],
+        "result": result_name,
+        "count": amount_created,
+        "ingredients": ingredients,
+    }
+
+
+def create_recipe(recipe_ir):
+    """Load a Recipe from it's IR
+
+    Arguments:
+        recipe_ir {dict} -- The recipe IR, see create_recipe_ir
+
+    Returns:
+        Recipe -- The recipe
+    """
+    result_name = recipe_ir["result"]
+    if result_name is not None:
+        result_name = sys.intern(result_name)
+
+    return Recipe(
+        recipe_ir["name"],
+        recipe_ir["type"],
+        KIND_NAMES.index(recipe_ir["kind"]),
+        result_name,
+        recipe_ir["count"],
+        tuple(recipe_ir["ingredients"]),
+    )
+
+
+@cookbook.caches.single_flight(recipe_models_cache, "recipe_models")
+def get_recipe_models(version, all_recipes, recipe_ir=None, force_create=False):
+    """Get the Recipe of every recipe in a version. They're loaded from the
+    generated recipe IR, any recipes which don't have any (like the ones
+    in tests) have it worked out from the recipe itself.
+
+    Arguments:
+        version {string} -- Version of Minecraft Java Edition
+        all_recipes {dict} -- All the recipes in the game
+
+    Keyword Arguments:
+        recipe_ir {dict} -- The IR of all the recipes, by recipe name (default: {None})
+        force_create {bool} -- Load the recipes again even if we already have (default: {False})
+
+    Returns:
+        dict -- The recipes keyed by recipe name
+    """
+    if not force_create:
+        cached_value = recipe_models_cache.get(version, "recipe_models")
+        if cached_value is not None:
+            return cached_value
+
+    if recipe_ir is None:
+        recipe_ir = {}
+
+    recipe_models = {}
+    for (recipe_name, recipe) in all_recipes.items():
+        ir = recipe_ir.get(recipe_name)
+        if ir is None:
+            ir = create_recipe_ir(recipe, recipe_name=recipe_name)
+
+        recipe_models[recipe_name] = create_recipe(ir)
+
+    recipe_models_cache.set(version, "recipe_models", recipe_models)
+    return recipe_models
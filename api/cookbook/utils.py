@@ -9,8 +9,13 @@ os.environ["TZ"] = "UTC"
 logger = logging.getLogger(__name__)
 
 import re
+import sys
+import json
+import hashlib
+import weakref
+import threading
 import inflect
-from collections import defaultdict
+import cookbook.caches
 
 inflect_engine = inflect.engine()
 
@@ -27,7 +32,99 @@ WORD_SEPERATORS_REGEX = re.compile(r"[\W_]+")
 # Regex used for converting block(s) of item to item_block
 BLOCKS_FORMAT_REGEX = re.compile(r"blocks?_of_")
 
-cache = defaultdict(dict)
+supported_recipe_cache = cookbook.caches.create_cache("supported_recipe")
+correct_item_name_cache = cookbook.caches.create_cache("correct_item_name", max_size=10000)
+
+# Records (recipes, tags, ingredients) which are exactly the same in multiple
+# versions are only kept once, by a hash of their contents. Only weak references
+# are kept here, so once nothing uses a record anymore (like when a version's
+# data is created again) it's gone from here too.
+shared_records = weakref.WeakValueDictionary()
+shared_records_lock = threading.Lock()
+
+
+class SharedDict(dict):
+    """A shared record dict, plain dicts can't be weakly referenced"""
+    __slots__ = ("__weakref__",)
+
+
+class SharedList(list):
+    """A shared record list, plain lists can't be weakly referenced"""
+    __slots__ = ("__weakref__",)
+
+
+def intern_strings(value):
+    """Intern every string in a value (including dict keys) so every copy of
+    the same name is the same string in memory
+
+    Arguments:
+        value {any} -- JSON like data
+
+    Returns:
+        any -- The same data, with the strings interned
+    """
+    if isinstance(value, str):
+        return sys.intern(value)
+
+    if isinstance(value, dict):
+        return {intern_strings(key): intern_strings(item) for (key, item) in value.items()}
+
+    if isinstance(value, list):
+        return [intern_strings(item) for item in value]
+
+    if isinstance(value, tuple):
+        return tuple(intern_strings(item) for item in value)
+
+    return value
+
+
+def share_record(record):
+    """Get the one shared copy of a record, if another version (or another
+    part of this one) already has a record with the exact same contents we use
+    theirs instead. Shared records must never be changed!
+
+    Arguments:
+        record {dict|list} -- JSON like data
+
+    Returns:
+        SharedDict|SharedList -- The shared record
+    """
+    record_key = hashlib.sha1(json.dumps(record, sort_keys=True).encode("utf-8")).digest()
+
+    with shared_records_lock:
+        shared_record = shared_records.get(record_key)
+    if shared_record is not None and shared_record == record:
+        return shared_record
+
+    record = intern_strings(record)
+    record = SharedDict(record) if isinstance(record, dict) else SharedList(record)
+
+    with shared_records_lock:
+        shared_records[record_key] = record
+    return record
+
+
+def to_plain_data(value):
+    """Turn shared records (and anything holding them) back into plain dicts
+    and lists, for anything that only takes the exact types (like marshal)
+
+    Arguments:
+        value {any} -- JSON like data
+
+    Returns:
+        any -- The same data, with only plain dicts and lists
+    """
+    if isinstance(value, dict):
+        return {key: to_plain_data(item) for (key, item) in value.items()}
+
+    if isinstance(value, list):
+        return [to_plain_data(item) for item in value]
+
+    if isinstance(value, tuple):
+        return tuple(to_plain_data(item) for item in value)
+
+    return value
+
 
 def parse_item_name(orig_item_name):
     """Get the actual item name from a string, Minecraft prepends items with
@@ -79,11 +176,12 @@ def is_supported_recipe(recipe):
     Returns:
         bool -- True if the recipe is one of the support types below or is custom
     """
-    cached_value = cache.get('supported_recipe', {}).get(recipe["name"])
+    # Only the type of the recipe matters, so that's what we cache by
+    recipe_type = recipe["type"]
+    cached_value = supported_recipe_cache.get(None, recipe_type)
     if cached_value is not None:
         return cached_value
 
-    recipe_type = recipe["type"]
     supported_types = [
         "minecraft:blasting",
         "minecraft:smithing",
@@ -100,12 +198,12 @@ def is_supported_recipe(recipe):
     is_custom = is_custom_recipe(recipe)
     res = is_supported or is_custom
 
-    cache['supported_recipe'][recipe["name"]] = res
+    supported_recipe_cache.set(None, recipe_type, res)
     return res
 
 
 def generate_correct_item_name(
-    raw_name, item_mappings, all_items, all_tags, all_recipes, is_retry=False
+    raw_name, item_mappings, all_items, all_tags, all_recipes, is_retry=False, version=None
 ):
     """Try to generate the correct item name, if the parsed name is not valid,
     then try to make it singular/plural and try again.
@@ -119,11 +217,12 @@ def generate_correct_item_name(
 
     Keyword Arguments:
         is_retry {bool} -- Is this a retry? (default: {False})
+        version {string} -- Version of Minecraft Java Edition the items are from (default: {None})
 
     Returns:
         string or bool -- Either return the correctly generated string or False
     """
-    cached_value = cache.get('correct_item_name', {}).get(raw_name)
+    cached_value = correct_item_name_cache.get(version, raw_name)
     if cached_value is not None:
         return cached_value
 
@@ -135,7 +234,7 @@ def generate_correct_item_name(
     name_parts = [word for word in name_parts if len(word) > 0]
 
     if len(name_parts) == 0:
-        cache['correct_item_name'][raw_name] = ""
+        correct_item_name_cache.set(version, raw_name, "")
         return ""
 
     # Check if the word is singular, if so we'll try to pluralize on the retry
@@ -173,12 +272,18 @@ def generate_correct_item_name(
     if not is_valid:
         if is_retry is False:
             return generate_correct_item_name(
-                raw_name, item_mappings, all_items, all_tags, all_recipes, is_retry=True
+                raw_name,
+                item_mappings,
+                all_items,
+                all_tags,
+                all_recipes,
+                is_retry=True,
+                version=version,
             )
         else:
             return False
 
-    cache['correct_item_name'][raw_name] = name
+    correct_item_name_cache.set(version, raw_name, name)
     return name
 
 
@@ -191,7 +296,7 @@ def is_valid_item(name, all_items, all_tags, all_recipes):
 
 
 def parse_items_from_string(
-    input_strings, all_items, all_tags, all_recipes, item_mappings
+    input_strings, all_items, all_tags, all_recipes, item_mappings, version=None
 ):
     """Gvien an array of strings, convert them to a proper array of items in the
     form of {"name": string, "amount": int}. For example, given an input of
@@ -204,6 +309,9 @@ def parse_items_from_string(
         all_recipes {dict} -- All the minecraft recipes for a given version
         item_mappings {dict} -- A map of bad item names to correct values
 
+    Keyword Arguments:
+        version {string} -- Version of Minecraft Java Edition the items are from (default: {None})
+
     Returns:
         dict -- {
             items: A properly formatted list of all items parsed
@@ -263,7 +371,7 @@ def parse_items_from_string(
 
             src_name = groups.get("name")
             name = generate_correct_item_name(
-                src_name, item_mappings, all_items, all_tags, all_recipes
+                src_name, item_mappings, all_items, all_tags, all_recipes, version=version
             )
 
             if name is False:
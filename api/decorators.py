@@ -12,8 +12,13 @@ def json_response(func):
     def wrapper_compress(*args, **kwargs):
         res_data = func(*args, **kwargs)
 
+        # Like flask, a view can return (data, status code)
+        status = None
+        if isinstance(res_data, tuple) and len(res_data) == 2 and isinstance(res_data[1], int):
+            res_data, status = res_data
+
         content = json.dumps(res_data)
-        response = make_response(content)
+        response = make_response(content, status)
         response.mimetype = 'application/json'
         return response
 
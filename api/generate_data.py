@@ -0,0 +1,10 @@
+import sys
+import cookbook
+
+# Regenerate the crafting data of the given versions (or all of them) from the source files
+#   python generate_data.py [version ...]
+versions = sys.argv[1:] if len(sys.argv) > 1 else None
+generated = cookbook.data.generate_all_versions(versions)
+
+for version, counts in generated.items():
+    print(f'{version}: {counts["items"]} items, {counts["recipes"]} recipes, {counts["tags"]} tags')
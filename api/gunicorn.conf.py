@@ -0,0 +1,83 @@
+"""GUNICORN
+The production server config, `python api.py` starts gunicorn with it (unless
+BG_API_ENV is debug) or it can be used directly:
+
+    gunicorn --config gunicorn.conf.py
+
+production -- Every version is loaded once, in the main process, before the
+    workers are forked so they all share the one copy of the data. Code and data
+    changes need a new main process, send it USR2 to start one next to the old
+    one and then TERM the old one to swap them over without dropping requests.
+    HUP gracefully restarts the workers (and reloads this config) with the data
+    that's already loaded.
+hot_production -- Workers restart when the code changes, so each loads the data
+    itself after it starts.
+debug -- Not meant for gunicorn, `python api.py` runs Werkzeug's development
+    server with the debugger. If it is used here it's the same as hot_production.
+"""
+import os
+import logging
+
+os.environ["TZ"] = "UTC"
+logger = logging.getLogger(__name__)
+
+API_ENV = os.environ['BG_API_ENV']
+HOT_RELOAD_ENABLED = API_ENV == 'debug' or API_ENV == 'hot_production'
+
+wsgi_app = "api:app"
+chdir = os.path.dirname(os.path.realpath(__file__))
+bind = f"0.0.0.0:{os.environ.get('BG_API_PORT', 5000)}"
+
+# Building recipe trees is CPU bound, and only one thread per process can run
+# Python at a time, so there's a worker process per CPU. The couple of threads
+# in each worker keep the cheap requests (items, recipes, tags...) from
+# queueing behind a big recipe tree.
+worker_class = "gthread"
+workers = int(os.environ.get('BG_API_WORKERS', os.cpu_count() or 1))
+threads = int(os.environ.get('BG_API_THREADS', 2))
+
+# Recipe trees have their own budget (BG_RECIPE_TREE_MAX_SECONDS, 30 seconds
+# by default) which has to stay below this, so this is only for workers that
+# have stopped responding altogether
+timeout = int(os.environ.get('BG_API_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('BG_API_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# The app (and with it the data) is loaded before forking in production, hot
+# reloading needs every worker to load it's own
+preload_app = not HOT_RELOAD_ENABLED
+reload = HOT_RELOAD_ENABLED
+
+
+def on_starting(server):
+    """Load every version in the main process before the workers are forked
+    (and before we start listening, so we're not sent requests until it's done)
+    """
+    if not preload_app:
+        return
+
+    import api
+    import cookbook
+
+    cookbook.preload.preload_before_fork(
+        versions=api.PRELOAD_VERSIONS,
+        max_workers=api.PRELOAD_WORKERS,
+        force_create=api.FORCE_RECREATE_DATA,
+    )
+
+
+def post_worker_init(worker):
+    """Without preloading, each worker loads the versions in the background as
+    soon as it starts, until they're loaded /ready says so
+    """
+    if preload_app:
+        return
+
+    import api
+    import cookbook
+
+    cookbook.preload.start_preload(
+        versions=api.PRELOAD_VERSIONS,
+        max_workers=api.PRELOAD_WORKERS,
+        force_create=api.FORCE_RECREATE_DATA,
+    )
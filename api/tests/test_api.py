@@ -0,0 +1,38 @@
+import log
+import os
+
+os.environ.setdefault("BG_API_ENV", "production")
+
+import api
+
+VERSION = "1.18"
+
+
+def test__recipe_tree_and_shopping_list__budget():
+    client = api.app.test_client()
+    items = [{"name": "iron_pickaxe", "amount_required": 1}]
+
+    response = client.post(
+        f"/{VERSION}/recipe_tree_and_shopping_list",
+        json={"items": items, "max_nodes": 2},
+    )
+    assert response.status_code == 200
+    data = response.get_json()
+
+    truncated_nodes = [
+        ingredient
+        for recipe in data["recipe_tree"][0]["recipes"]
+        for ingredient in recipe["ingredients"]
+        if isinstance(ingredient, dict) and ingredient.get("is_truncated")
+    ]
+
+    assert data["is_truncated"]
+    assert len(truncated_nodes) > 0
+    assert all(node["is_collapsed"] and node["handle"] for node in truncated_nodes)
+
+    # The truncated items are in the shopping list as they are, until they're expanded
+    shopping_list = data["shopping_list"]
+    assert shopping_list["iron_pickaxe"]["amount_required"] == 1
+    assert shopping_list["iron_ingot"]["amount_required"] == 3
+    assert not shopping_list["iron_ingot"]["has_recipe"]
+    assert "raw_iron" not in shopping_list
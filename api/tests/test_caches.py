@@ -0,0 +1,85 @@
+import log
+import threading
+import pytest
+
+import cookbook.caches
+
+
+def test__cache__get_and_set():
+    cache = cookbook.caches.Cache("test")
+    cache.set("1.18", "stick", 1)
+
+    assert cache.get("1.18", "stick") == 1
+    assert cache.get("1.16", "stick") is None
+    assert cache.get("1.16", "stick", default=False) is False
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["misses"] == 2
+
+
+def test__cache__evicts_least_recently_used():
+    cache = cookbook.caches.Cache("test", max_size=2)
+    cache.set("1.18", "stick", 1)
+    cache.set("1.18", "torch", 2)
+    cache.get("1.18", "stick")
+    cache.set("1.18", "chest", 3)
+
+    assert cache.get("1.18", "torch") is None
+    assert cache.get("1.18", "stick") == 1
+    assert cache.get("1.18", "chest") == 3
+    assert cache.get_stats()["evictions"] == 1
+    assert cache.get_stats()["size_by_version"] == {"1.18": 2}
+
+
+@pytest.mark.parametrize(
+    "test_input,expected",
+    [
+        ("1.18", {"1.16": 1}),
+        (None, {}),
+    ],
+)
+def test__cache__invalidate(test_input, expected):
+    cache = cookbook.caches.Cache("test")
+    cache.set("1.18", "stick", 1)
+    cache.set("1.18", "torch", 2)
+    cache.set("1.16", "stick", 3)
+    cache.invalidate(test_input)
+
+    assert cache.get_stats()["size_by_version"] == expected
+
+
+def test__invalidate_caches():
+    cache = cookbook.caches.create_cache("test_invalidate_caches")
+    cache.set("1.18", "stick", 1)
+
+    num_removed = cookbook.caches.invalidate_caches("1.18", names=[cache.name])
+
+    assert num_removed == {cache.name: 1}
+    assert cookbook.caches.get_caches_stats()[cache.name]["size"] == 0
+    del cookbook.caches.caches[cache.name]
+
+
+def test__single_flight__loads_once():
+    cache = cookbook.caches.Cache("test")
+    started = threading.Event()
+    num_loads = []
+
+    @cookbook.caches.single_flight(cache, "items")
+    def load_items(version):
+        cached_value = cache.get(version, "items")
+        if cached_value is not None:
+            return cached_value
+
+        num_loads.append(version)
+        started.wait(1)
+        cache.set(version, "items", ["stick"])
+        return ["stick"]
+
+    threads = [threading.Thread(target=load_items, args=("1.18",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    started.set()
+    for thread in threads:
+        thread.join()
+
+    assert num_loads == ["1.18"]
+    assert load_items("1.18") == ["stick"]
@@ -0,0 +1,565 @@
+import log
+import json
+import pytest
+
+import cookbook.calculator
+import cookbook.data
+
+VERSION = "test"
+
+ALL_TAGS = {
+    "planks": {"values": ["minecraft:oak_planks", "minecraft:birch_planks"]},
+}
+
+ALL_RECIPES = {
+    "stick": {
+        "name": "stick",
+        "type": "minecraft:crafting_shaped",
+        "pattern": ["#", "#"],
+        "key": {"#": {"tag": "minecraft:planks"}},
+        "result": {"item": "minecraft:stick", "count": 4},
+    },
+    "oak_planks": {
+        "name": "oak_planks",
+        "type": "minecraft:crafting_shapeless",
+        "ingredients": [{"item": "minecraft:oak_log"}],
+        "result": {"item": "minecraft:oak_planks", "count": 4},
+    },
+    "birch_planks": {
+        "name": "birch_planks",
+        "type": "minecraft:crafting_shapeless",
+        "ingredients": [{"item": "minecraft:birch_log"}],
+        "result": {"item": "minecraft:birch_planks", "count": 4},
+    },
+    "iron_ingot_from_smelting_raw_iron": {
+        "name": "iron_ingot_from_smelting_raw_iron",
+        "type": "minecraft:smelting",
+        "ingredient": {"item": "minecraft:raw_iron"},
+        "result": "minecraft:iron_ingot",
+    },
+    "iron_ingot_from_iron_block": {
+        "name": "iron_ingot_from_iron_block",
+        "type": "minecraft:crafting_shapeless",
+        "ingredients": [{"item": "minecraft:iron_block"}],
+        "result": {"item": "minecraft:iron_ingot", "count": 9},
+    },
+    "iron_block": {
+        "name": "iron_block",
+        "type": "minecraft:crafting_shaped",
+        "pattern": ["###", "###", "###"],
+        "key": {"#": {"item": "minecraft:iron_ingot"}},
+        "result": {"item": "minecraft:iron_block"},
+    },
+    "iron_pickaxe": {
+        "name": "iron_pickaxe",
+        "type": "minecraft:crafting_shaped",
+        "pattern": ["XXX", " # ", " # "],
+        "key": {"#": {"item": "minecraft:stick"}, "X": {"item": "minecraft:iron_ingot"}},
+        "result": {"item": "minecraft:iron_pickaxe"},
+    },
+}
+
+for recipe in ALL_RECIPES.values():
+    if isinstance(recipe["result"], str):
+        recipe["result"] = {"item": recipe["result"]}
+
+SUPPORTED_RECIPES = cookbook.data.get_supported_recipes_by_result(
+    VERSION, ALL_RECIPES, force_create=True
+)
+
+
+def create_recipe_tree(items, selected_build_paths=None):
+    return cookbook.calculator.create_recipe_tree(
+        items,
+        selected_build_paths or {},
+        version=VERSION,
+        all_recipes=ALL_RECIPES,
+        all_tags=ALL_TAGS,
+        supported_recipes=SUPPORTED_RECIPES,
+    )
+
+
+@pytest.mark.parametrize(
+    "test_input,expected",
+    [
+        ("iron_ingot", {"iron_ingot", "iron_block"}),
+        ("iron_block", {"iron_ingot", "iron_block"}),
+        ("stick", {"stick"}),
+        ("raw_iron", {"raw_iron"}),
+    ],
+)
+def test__find_strongly_connected_components(test_input, expected):
+    graph = cookbook.calculator.get_recipe_graph(
+        VERSION, ALL_RECIPES, ALL_TAGS, SUPPORTED_RECIPES
+    )
+    component_id = graph["item_components"][graph["item_ids"][test_input]]
+
+    assert graph["components"][component_id] == expected
+    assert graph["component_is_cyclic"][component_id] == (len(expected) > 1)
+
+
+def test__get_recipe_graph():
+    graph = cookbook.calculator.get_recipe_graph(
+        VERSION, ALL_RECIPES, ALL_TAGS, SUPPORTED_RECIPES
+    )
+    item_ids = graph["item_ids"]
+
+    iron_ingot_recipes = [
+        graph["recipe_names"][recipe_id]
+        for recipe_id in graph["item_recipes"][item_ids["iron_ingot"]]
+    ]
+    assert iron_ingot_recipes == [
+        "iron_ingot_from_iron_block",
+        "iron_ingot_from_smelting_raw_iron",
+    ]
+
+    stick_id = graph["recipe_ids"]["stick"]
+    assert graph["recipe_results"][stick_id] == item_ids["stick"]
+    assert graph["recipe_amounts_created"][stick_id] == 4
+    assert graph["recipe_ingredient_ids"][stick_id] == tuple(sorted(
+        [item_ids["oak_planks"], item_ids["birch_planks"]]
+    ))
+    assert graph["item_recipes"][item_ids["oak_log"]] == ()
+
+
+@pytest.mark.parametrize(
+    "test_input", ["stick", "iron_ingot", "iron_block", "iron_pickaxe"]
+)
+def test__get_recipe_stats_table(test_input):
+    graph = cookbook.calculator.get_recipe_graph(
+        VERSION, ALL_RECIPES, ALL_TAGS, SUPPORTED_RECIPES
+    )
+    stats_table = cookbook.calculator.get_recipe_stats_table(
+        VERSION, ALL_RECIPES, ALL_TAGS, SUPPORTED_RECIPES
+    )
+    tree, _ = create_recipe_tree([{"name": test_input, "amount_required": 1}])
+    item_id = graph["item_ids"][test_input]
+    item_stats = cookbook.calculator.get_item_stats(
+        test_input,
+        {},
+        version=VERSION,
+        all_recipes=ALL_RECIPES,
+        all_tags=ALL_TAGS,
+        supported_recipes=SUPPORTED_RECIPES,
+        ancestors={},
+    )
+
+    assert stats_table["max_recipe_efficiency"][item_id] == tree[0]["stats"]["max_recipe_efficiency"]
+    assert stats_table["min_recipe_ingredients"][item_id] == tree[0]["stats"]["min_recipe_ingredients"]
+    assert stats_table["node_is_circular"][item_id] == item_stats["node_is_circular"]
+
+
+def test__get_item_node_stats__reads_stats_table(monkeypatch):
+    cookbook.calculator.get_recipe_stats_table(
+        VERSION, ALL_RECIPES, ALL_TAGS, SUPPORTED_RECIPES
+    )
+
+    def fail_get_item_stats(*args, **kwargs):
+        raise AssertionError("get_item_stats shouldn't be needed")
+
+    monkeypatch.setattr(cookbook.calculator, "get_item_stats", fail_get_item_stats)
+    item_stats = cookbook.calculator.get_item_node_stats(
+        "iron_pickaxe",
+        {},
+        version=VERSION,
+        all_recipes=ALL_RECIPES,
+        all_tags=ALL_TAGS,
+        supported_recipes=SUPPORTED_RECIPES,
+        ancestors={"iron_block": True},
+    )
+
+    assert item_stats["stats"]["max_recipe_efficiency"] is not None
+
+
+def test__create_recipe_tree__reuses_cached_subtrees():
+    tree, _ = create_recipe_tree([{"name": "iron_pickaxe", "amount_required": 2}])
+    cached_tree, _ = create_recipe_tree(
+        [{"name": "iron_pickaxe", "amount_required": 1}]
+    )
+
+    recipe = tree[0]["recipes"][0]
+    cached_recipe = cached_tree[0]["recipes"][0]
+
+    assert recipe["amount_required"] == 2
+    assert cached_recipe["amount_required"] == 1
+    assert cached_recipe["ingredients"] is recipe["ingredients"]
+    assert cached_tree[0]["stats"] == tree[0]["stats"]
+
+
+def test__create_recipe_tree__deterministic_ids():
+    items = [{"name": "iron_pickaxe", "amount_required": 2}, {"name": "stick", "amount_required": 1}]
+    tree, _ = create_recipe_tree(items)
+
+    cookbook.calculator.recipe_tree_cache.invalidate(VERSION)
+    cookbook.calculator.recipe_stats_cache.invalidate(VERSION)
+    rebuilt_tree, _ = create_recipe_tree(items)
+
+    assert json.dumps(rebuilt_tree) == json.dumps(tree)
+    assert tree[0]["id"] != tree[1]["id"]
+    assert tree[0]["recipes"][0]["id"].startswith("recipe-iron_pickaxe-")
+
+    stick = [
+        node for node in tree[0]["recipes"][0]["ingredients"]
+        if node["name"] == "stick"
+    ][0]
+    assert stick["id"] != tree[1]["id"]
+
+
+def test__create_recipe_tree__circular_references():
+    tree, stats = create_recipe_tree([{"name": "iron_ingot", "amount_required": 1}])
+    recipes = {recipe["name"]: recipe for recipe in tree[0]["recipes"]}
+
+    assert stats["node_is_circular"]
+    assert recipes["iron_ingot_from_iron_block"]["recipe_stats"]["node_is_circular"]
+    assert recipes["iron_ingot_from_smelting_raw_iron"]["selected"]
+
+
+def test__create_recipe_tree__collapse_cycles():
+    tree, stats = cookbook.calculator.create_recipe_tree(
+        [{"name": "iron_ingot", "amount_required": 1}],
+        {},
+        version=VERSION,
+        all_recipes=ALL_RECIPES,
+        all_tags=ALL_TAGS,
+        supported_recipes=SUPPORTED_RECIPES,
+        collapse_cycles=True,
+    )
+    recipes = {recipe["name"]: recipe for recipe in tree[0]["recipes"]}
+    iron_block = recipes["iron_ingot_from_iron_block"]["ingredients"][0]
+
+    assert stats["node_is_circular"]
+    assert iron_block["name"] == "iron_block"
+    assert iron_block["recipes"] == []
+
+
+def test__create_recipe_tree__expand_depth():
+    tree, _ = cookbook.calculator.create_recipe_tree(
+        [{"name": "iron_pickaxe", "amount_required": 2}],
+        {},
+        version=VERSION,
+        all_recipes=ALL_RECIPES,
+        all_tags=ALL_TAGS,
+        supported_recipes=SUPPORTED_RECIPES,
+        expand_depth=1,
+    )
+    full_tree, _ = create_recipe_tree([{"name": "iron_pickaxe", "amount_required": 2}])
+
+    ingredients = tree[0]["recipes"][0]["ingredients"]
+    stick = [node for node in ingredients if node["name"] == "stick"][0]
+    full_stick = [
+        node for node in full_tree[0]["recipes"][0]["ingredients"]
+        if node["name"] == "stick"
+    ][0]
+
+    assert "is_collapsed" not in tree[0]
+    assert stick["is_collapsed"]
+    assert stick["recipes"] == []
+    assert stick["num_recipes"] == full_stick["num_recipes"]
+    assert stick["stats"] == full_stick["stats"]
+
+    expanded_stick = cookbook.calculator.expand_recipe_node(
+        stick["handle"],
+        version=VERSION,
+        all_recipes=ALL_RECIPES,
+        all_tags=ALL_TAGS,
+        supported_recipes=SUPPORTED_RECIPES,
+        expand_depth=None,
+    )
+
+    assert expanded_stick["name"] == "stick"
+    assert expanded_stick["amount_required"] == full_stick["amount_required"]
+    assert expanded_stick["stats"] == full_stick["stats"]
+    assert len(expanded_stick["recipes"]) == len(full_stick["recipes"])
+    assert expanded_stick["recipes"][0]["recipe_stats"] == full_stick["recipes"][0]["recipe_stats"]
+
+
+def test__create_recipe_tree__expand_selected():
+    tree, _ = cookbook.calculator.create_recipe_tree(
+        [{"name": "iron_ingot", "amount_required": 1}],
+        {},
+        version=VERSION,
+        all_recipes=ALL_RECIPES,
+        all_tags=ALL_TAGS,
+        supported_recipes=SUPPORTED_RECIPES,
+        expand_depth=0,
+        expand_selected=True,
+    )
+    recipes = {recipe["name"]: recipe for recipe in tree[0]["recipes"]}
+    iron_block = recipes["iron_ingot_from_iron_block"]["ingredients"][0]
+
+    assert recipes["iron_ingot_from_smelting_raw_iron"]["selected"]
+    assert iron_block["is_collapsed"]
+
+    # iron_ingot is already an ancestor of the collapsed node, so it's still
+    # a circular reference when it's expanded later on
+    expanded_block = cookbook.calculator.expand_recipe_node(
+        iron_block["handle"],
+        version=VERSION,
+        all_recipes=ALL_RECIPES,
+        all_tags=ALL_TAGS,
+        supported_recipes=SUPPORTED_RECIPES,
+    )
+    iron_ingot = expanded_block["recipes"][0]["ingredients"][0]
+
+    assert iron_ingot["name"] == "iron_ingot"
+    assert iron_ingot["recipes"] == []
+
+
+def test__parse_node_handle__invalid():
+    with pytest.raises(ValueError):
+        cookbook.calculator.parse_node_handle("not a handle")
+
+
+def test__create_recipe_tree_dag():
+    tree, _ = create_recipe_tree([
+        {"name": "iron_pickaxe", "amount_required": 1},
+        {"name": "stick", "amount_required": 2},
+    ])
+    dag = cookbook.calculator.create_recipe_tree_dag(tree)
+
+    def resolve(refs):
+        resolved = []
+        for ref in refs:
+            if isinstance(ref, list):
+                resolved.append(resolve(ref))
+                continue
+
+            node = dict(dag["nodes"][ref])
+            node["recipes"] = [
+                dict(recipe, ingredients=resolve(recipe["ingredients"]))
+                for recipe in node["recipes"]
+            ]
+            resolved.append(node)
+        return resolved
+
+    assert dag["root"] == [tree[0]["id"], tree[1]["id"]]
+    assert resolve(dag["root"]) == tree
+
+    # The pickaxe needs 2 sticks too, so that subtree is only stored once
+    stick_ids = [node_id for node_id in dag["nodes"] if node_id.startswith("node-stick-")]
+    assert stick_ids == [tree[1]["id"]]
+
+
+def test__create_shopping_list():
+    path = {
+        "iron_pickaxe": {
+            "amount_required": 2,
+            "recipe": {
+                "type": "minecraft:crafting_shaped",
+                "amount_created": 1,
+                "ingredients": {
+                    "iron_ingot": {"amount_required": 3},
+                    "stick": {
+                        "amount_required": 2,
+                        "recipe": {
+                            "type": "minecraft:crafting_shaped",
+                            "amount_created": 4,
+                            "ingredients": {
+                                "oak_planks": {"amount_required": 2},
+                            },
+                        },
+                    },
+                },
+            },
+        },
+    }
+    shopping_list = cookbook.calculator.create_shopping_list(
+        path, have_already={"iron_ingot": 2}
+    )
+
+    assert shopping_list["iron_pickaxe"]["requires"] == ["iron_ingot", "stick"]
+    assert shopping_list["iron_pickaxe"]["amount_used_for"]["self"] == 2
+    assert shopping_list["iron_ingot"]["amount_required"] == 6
+    assert shopping_list["iron_ingot"]["amount_available"] == 2
+    assert shopping_list["stick"]["total_created"] == 4
+    assert shopping_list["stick"]["level"] == 1
+    assert shopping_list["oak_planks"]["amount_required"] == 2
+    assert shopping_list["oak_planks"]["amount_used_for"] == {"self": 0, "recipes": 2, "stick": 2}
+
+
+def test__create_shopping_list__deep_path():
+    path = {"item_0": {"amount_required": 1}}
+    for level in range(1, 5000):
+        path = {
+            f"item_{level}": {
+                "amount_required": 1,
+                "recipe": {"type": "test", "amount_created": 1, "ingredients": path},
+            }
+        }
+
+    shopping_list = cookbook.calculator.create_shopping_list(path)
+
+    assert len(shopping_list) == 5000
+    assert shopping_list["item_0"]["level"] == 4999
+    assert shopping_list["item_0"]["amount_required"] == 1
+
+
+def test__create_shopping_lists():
+    path = {
+        "stick": {
+            "amount_required": 6,
+            "recipe": {
+                "type": "minecraft:crafting_shaped",
+                "amount_created": 4,
+                "ingredients": {
+                    "oak_planks": {"amount_required": 2},
+                },
+            },
+        },
+    }
+    scenarios = [
+        {},
+        {"have_already": {"stick": 6}},
+        {"have_already": {"oak_planks": 1}, "recipe_multiplier": 3},
+    ]
+    shopping_lists = cookbook.calculator.create_shopping_lists(path, scenarios)
+
+    assert shopping_lists == [
+        cookbook.calculator.create_shopping_list(path, **scenario)
+        for scenario in scenarios
+    ]
+    assert shopping_lists[0]["oak_planks"]["amount_required"] == 4
+    assert shopping_lists[1]["oak_planks"]["amount_required"] == 0
+    assert shopping_lists[2]["oak_planks"]["amount_required"] == 10
+
+
+def test__create_build_paths():
+    items = [{"name": "iron_pickaxe", "amount_required": 3}]
+    tree, _ = create_recipe_tree(items)
+    path = cookbook.calculator.create_build_paths(tree, items)
+
+    pickaxe = path["iron_pickaxe"]
+    stick = pickaxe["recipe"]["ingredients"]["stick"]
+
+    assert list(path.keys()) == ["iron_pickaxe"]
+    assert pickaxe["amount_required"] == 3
+    assert pickaxe["recipe"]["name"] == "iron_pickaxe"
+    assert pickaxe["recipe"]["amount_created"] == 1
+    assert list(pickaxe["recipe"]["ingredients"].keys()) == ["iron_ingot", "stick"]
+    assert pickaxe["recipe"]["ingredients"]["iron_ingot"]["recipe"]["name"] == "iron_ingot_from_smelting_raw_iron"
+
+    # Only one of the planks in the group is selected
+    assert len(stick["recipe"]["ingredients"]) == 1
+
+    shopping_list = cookbook.calculator.create_shopping_list(path)
+    assert shopping_list["iron_ingot"]["amount_required"] == 9
+    assert shopping_list["raw_iron"]["amount_required"] == 9
+
+
+def test__precompile_ingredients():
+    ingredients = cookbook.calculator.precompile_ingredients(
+        VERSION, ALL_RECIPES, ALL_TAGS, SUPPORTED_RECIPES, force_create=True
+    )
+
+    assert set(ingredients.keys()) == set(ALL_RECIPES.keys())
+    assert ingredients["iron_pickaxe"] == [
+        {"name": "iron_ingot", "amount_required": 3},
+        {"name": "stick", "amount_required": 2},
+    ]
+    assert cookbook.calculator.get_ingredients(
+        ALL_RECIPES["stick"], ALL_TAGS, VERSION
+    ) is ingredients["stick"]
+
+
+def test__get_tag_index():
+    all_tags = {
+        "logs": {"values": ["#minecraft:oak_logs", "#minecraft:birch_logs", "minecraft:oak_log"]},
+        "oak_logs": {"values": ["minecraft:oak_log", "minecraft:oak_wood"]},
+        "birch_logs": {"values": ["minecraft:birch_log", "#minecraft:logs"]},
+    }
+    tag_index = cookbook.calculator.get_tag_index("test-tags", all_tags)
+
+    assert tag_index["tag_values"]["logs"] == (
+        ("oak_log", "oak_logs"),
+        ("oak_wood", "oak_logs"),
+        ("birch_log", "birch_logs"),
+    )
+    assert tag_index["item_tags"]["oak_log"] == ("logs", "oak_logs")
+    assert cookbook.calculator.get_item_tags("birch_log", "test-tags", all_tags) == (
+        "birch_logs", "logs"
+    )
+    assert cookbook.calculator.get_tag_values(
+        "#minecraft:oak_logs", all_tags, version="test-tags"
+    ) == [
+        {"item": "oak_log", "group": "oak_logs"},
+        {"item": "oak_wood", "group": "oak_logs"},
+    ]
+
+
+@pytest.mark.parametrize(
+    "test_input,expected",
+    [
+        (["iron_ingot"], {"recipes": ["iron_block", "iron_pickaxe"], "results": ["iron_block", "iron_pickaxe"]}),
+        (["iron_ingot", "stick"], {"recipes": ["iron_pickaxe"], "results": ["iron_pickaxe"]}),
+        (["#minecraft:planks"], {"recipes": ["stick"], "results": ["stick"]}),
+        (["minecraft:oak_log"], {"recipes": ["oak_planks"], "results": ["oak_planks"]}),
+        (["oak_log", "stick"], {"recipes": [], "results": []}),
+        (["diamond"], {"recipes": [], "results": []}),
+    ],
+)
+def test__get_recipes_using(test_input, expected):
+    assert cookbook.calculator.get_recipes_using(
+        test_input,
+        version=VERSION,
+        all_recipes=ALL_RECIPES,
+        all_tags=ALL_TAGS,
+        supported_recipes=SUPPORTED_RECIPES,
+    ) == expected
+
+
+@pytest.mark.parametrize("max_nodes", [1, 2, 4])
+def test__create_recipe_tree__budget(max_nodes):
+    items = [{"name": "iron_pickaxe", "amount_required": 1}]
+    full_tree, full_stats = create_recipe_tree(items)
+
+    tree, stats = cookbook.calculator.create_recipe_tree(
+        items,
+        {},
+        version=VERSION,
+        all_recipes=ALL_RECIPES,
+        all_tags=ALL_TAGS,
+        supported_recipes=SUPPORTED_RECIPES,
+        budget=cookbook.calculator.create_tree_budget(max_nodes=max_nodes),
+    )
+
+    def find_truncated(tree):
+        truncated = []
+        for node in tree:
+            if isinstance(node, list):
+                truncated += find_truncated(node)
+                continue
+            if node.get("is_truncated"):
+                truncated.append(node)
+            for recipe in node["recipes"]:
+                truncated += find_truncated(recipe["ingredients"])
+        return truncated
+
+    truncated = find_truncated(tree)
+
+    assert not full_stats["is_truncated"]
+    assert stats["is_truncated"]
+    assert stats["num_nodes"] < full_stats["num_nodes"]
+    assert len(truncated) > 0
+    assert all(node["is_collapsed"] and node["handle"] for node in truncated)
+    assert tree[0]["id"] != full_tree[0]["id"] or tree[0].get("is_truncated")
+
+    # The truncated tree isn't cached, the whole tree is still there
+    cached_tree, cached_stats = create_recipe_tree(items)
+    assert cached_tree == full_tree
+    assert not cached_stats["is_truncated"]
+
+
+def test__create_recipe_tree__time_budget():
+    tree, stats = cookbook.calculator.create_recipe_tree(
+        [{"name": "iron_pickaxe", "amount_required": 1}],
+        {},
+        version=VERSION,
+        all_recipes=ALL_RECIPES,
+        all_tags=ALL_TAGS,
+        supported_recipes=SUPPORTED_RECIPES,
+        budget=cookbook.calculator.create_tree_budget(max_seconds=0),
+    )
+
+    assert stats["is_truncated"]
+    assert tree[0]["is_truncated"]
+    assert tree[0]["recipes"] == []
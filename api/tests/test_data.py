@@ -0,0 +1,203 @@
+import log
+import os
+import json
+import threading
+import pytest
+
+import cookbook.data
+
+SNAPSHOT = {
+    "sources": [["all_items.json", 10, 20], None],
+    "datasets": {
+        "items": ["stick", "planks"],
+        "supported_recipes_by_result": {"stick": ["stick"]},
+    },
+    "precompiled": {
+        "tag_index": {"item_tags": {"stick": ("#minecraft:sticks",)}},
+        "recipe_graph": {"components": [frozenset(["stick"])]},
+    },
+}
+
+
+def test__snapshot__round_trip(tmp_path):
+    target_file = str(tmp_path / "1.18" / "snapshot.bin")
+    cookbook.data.write_snapshot(target_file, SNAPSHOT)
+
+    assert cookbook.data.read_snapshot(target_file) == SNAPSHOT
+
+
+def test__snapshot__bad_checksum(tmp_path):
+    target_file = str(tmp_path / "snapshot.bin")
+    cookbook.data.write_snapshot(target_file, SNAPSHOT)
+
+    with open(target_file, "r+b") as f:
+        f.seek(-1, 2)
+        last_byte = f.read(1)
+        f.seek(-1, 2)
+        f.write(bytes([last_byte[0] ^ 0xFF]))
+
+    assert cookbook.data.read_snapshot(target_file) is None
+
+
+def test__snapshot__other_schema_version(tmp_path, monkeypatch):
+    target_file = str(tmp_path / "snapshot.bin")
+    cookbook.data.write_snapshot(target_file, SNAPSHOT)
+
+    monkeypatch.setattr(
+        cookbook.data,
+        "SNAPSHOT_SCHEMA_VERSION",
+        cookbook.data.SNAPSHOT_SCHEMA_VERSION + 1
+    )
+    assert cookbook.data.read_snapshot(target_file) is None
+
+
+def test__snapshot__truncated(tmp_path):
+    target_file = str(tmp_path / "snapshot.bin")
+    with open(target_file, "wb") as f:
+        f.write(cookbook.data.SNAPSHOT_MAGIC)
+
+    assert cookbook.data.read_snapshot(target_file) is None
+
+
+def test__read_source_files__keeps_order(tmp_path):
+    filepaths = []
+    for i in range(50):
+        filepath = str(tmp_path / f"{i}.json")
+        with open(filepath, "w") as f:
+            f.write(f'{{"index": {i}}}')
+        filepaths.append(filepath)
+
+    results = cookbook.data.read_source_files(filepaths, max_workers=8)
+
+    assert [filepath for (filepath, _) in results] == filepaths
+    assert [data["index"] for (_, data) in results] == list(range(50))
+
+
+def test__excluded_items_regex():
+    assert cookbook.data.EXCLUDED_ITEMS_REGEX.match("light_12")
+    assert not cookbook.data.EXCLUDED_ITEMS_REGEX.match("light_blue_wool")
+
+
+def write_tag_file(tag_dir, name, values):
+    os.makedirs(tag_dir, exist_ok=True)
+    with open(os.path.join(tag_dir, f"{name}.json"), "w") as f:
+        json.dump({"values": values}, f)
+
+
+def test__update_generated_dataset__only_parses_changed_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(cookbook.data, "cur_dir", str(tmp_path))
+    minecraft_dir = str(tmp_path / cookbook.data.ITEM_TAGS_FILES_DIR.format(version="test")[:-1])
+    custom_dir = str(tmp_path / cookbook.data.CUSTOM_ITEM_TAGS_FILES_DIR.format(version="test")[:-1])
+
+    write_tag_file(minecraft_dir, "planks", ["minecraft:oak_planks"])
+    write_tag_file(minecraft_dir, "logs", ["minecraft:oak_log"])
+    write_tag_file(custom_dir, "logs", ["minecraft:birch_log"])
+
+    tags, is_changed = cookbook.data.update_generated_dataset("test", "tags")
+    assert is_changed
+    assert tags == {
+        "logs": {"values": ["minecraft:oak_log"]},
+        "planks": {"values": ["minecraft:oak_planks"]},
+    }
+
+    tags, is_changed = cookbook.data.update_generated_dataset("test", "tags")
+    assert not is_changed
+
+    parsed_files = []
+    parse_tag_file = cookbook.data.parse_tag_file
+
+    def spy_parse_tag_file(filepath, item_tag_data):
+        parsed_files.append(os.path.basename(filepath))
+        return parse_tag_file(filepath, item_tag_data)
+
+    monkeypatch.setitem(cookbook.data.GENERATED_DATASETS["tags"], "parse_file", spy_parse_tag_file)
+
+    write_tag_file(minecraft_dir, "planks", ["minecraft:spruce_planks"])
+    write_tag_file(minecraft_dir, "wool", ["minecraft:white_wool"])
+    os.remove(os.path.join(minecraft_dir, "logs.json"))
+
+    tags, is_changed = cookbook.data.update_generated_dataset("test", "tags")
+    assert is_changed
+    assert "wool.json" in parsed_files
+    assert "planks.json" in parsed_files
+    assert tags == {
+        "logs": {"values": ["minecraft:birch_log"]},
+        "planks": {"values": ["minecraft:spruce_planks"]},
+        "wool": {"values": ["minecraft:white_wool"]},
+    }
+
+    # And it's exactly the same as generating everything from scratch
+    os.remove(str(tmp_path / cookbook.data.MANIFEST_FILE.format(version="test")))
+    from_scratch_tags, _ = cookbook.data.update_generated_dataset("test", "tags")
+    assert from_scratch_tags == tags
+
+
+def test__write_file__replaces_file(tmp_path):
+    target_file = str(tmp_path / "generated" / "all_items.json")
+    cookbook.data.write_file(target_file, '["stick"]')
+    cookbook.data.write_file(target_file, '["stick", "torch"]')
+
+    assert cookbook.data.read_json_file(target_file) == ["stick", "torch"]
+    assert os.listdir(str(tmp_path / "generated")) == ["all_items.json"]
+    assert os.stat(target_file).st_mode & 0o777 == cookbook.data.GENERATED_FILE_MODE
+
+
+def test__fetch_all_tags__concurrent_requests_load_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(cookbook.data, "cur_dir", str(tmp_path))
+    minecraft_dir = str(tmp_path / cookbook.data.ITEM_TAGS_FILES_DIR.format(version="test-concurrent")[:-1])
+    for i in range(20):
+        write_tag_file(minecraft_dir, f"tag_{i}", [f"minecraft:item_{i}"])
+
+    parsed_files = []
+    parse_tag_file = cookbook.data.parse_tag_file
+
+    def spy_parse_tag_file(filepath, item_tag_data):
+        parsed_files.append(filepath)
+        return parse_tag_file(filepath, item_tag_data)
+
+    monkeypatch.setitem(cookbook.data.GENERATED_DATASETS["tags"], "parse_file", spy_parse_tag_file)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cookbook.data.fetch_all_tags("test-concurrent")))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(parsed_files) == 20
+    assert len(results) == 8
+    assert all(tags is results[0] for tags in results)
+    cookbook.caches.invalidate_caches("test-concurrent")
+
+
+def test__get_all_crafting_data__cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(cookbook.data, "cur_dir", str(tmp_path))
+    monkeypatch.setattr(cookbook.data, "save_snapshot", lambda version: None)
+
+    crafting_data = cookbook.data.get_all_crafting_data("test-crafting-data")
+    assert cookbook.data.get_all_crafting_data("test-crafting-data") is crafting_data
+    cookbook.caches.invalidate_caches("test-crafting-data")
+
+
+def test__get_all_crafting_data__snapshot_failure_not_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(cookbook.data, "cur_dir", str(tmp_path))
+    save_attempts = []
+
+    def failing_save_snapshot(version):
+        save_attempts.append(version)
+        raise OSError("Read-only file system")
+
+    monkeypatch.setattr(cookbook.data, "save_snapshot", failing_save_snapshot)
+
+    cookbook.data.get_all_crafting_data("test-snapshot")
+    cookbook.data.get_all_crafting_data("test-snapshot")
+    assert save_attempts == ["test-snapshot"]
+
+    # Loading the version again tries again
+    cookbook.caches.invalidate_caches("test-snapshot")
+    cookbook.data.get_all_crafting_data("test-snapshot")
+    assert save_attempts == ["test-snapshot", "test-snapshot"]
+    cookbook.caches.invalidate_caches("test-snapshot")
@@ -0,0 +1,59 @@
+import log
+import gc
+import pytest
+
+import cookbook.preload
+import cookbook.data
+
+
+@pytest.fixture(autouse=True)
+def clear_versions_status():
+    cookbook.preload.versions_status.clear()
+    yield
+    cookbook.preload.versions_status.clear()
+
+
+def test__preload_versions__ready(monkeypatch):
+    monkeypatch.setattr(cookbook.data, "get_all_crafting_data", lambda version, force_create=False: {
+        "recipes": {},
+        "tags": {},
+        "supported_recipes": {},
+    })
+
+    assert not cookbook.preload.is_ready()
+
+    status = cookbook.preload.preload_versions(["test-a", "test-b"], max_workers=2)
+
+    assert cookbook.preload.is_ready()
+    assert status["test-a"]["state"] == cookbook.preload.READY
+    assert status["test-b"]["state"] == cookbook.preload.READY
+    assert set(status["test-a"]["timings"].keys()) == {"crafting_data", "tag_index", "recipe_stats"}
+
+
+def test__preload_versions__failed(monkeypatch):
+    def get_all_crafting_data(version, force_create=False):
+        raise FileNotFoundError(version)
+
+    monkeypatch.setattr(cookbook.data, "get_all_crafting_data", get_all_crafting_data)
+
+    status = cookbook.preload.preload_versions(["test-missing"])
+
+    assert not cookbook.preload.is_ready()
+    assert status["test-missing"]["state"] == cookbook.preload.FAILED
+    assert status["test-missing"]["error"] == "test-missing"
+
+
+def test__preload_before_fork__freezes_loaded_data(monkeypatch):
+    monkeypatch.setattr(cookbook.data, "get_all_crafting_data", lambda version, force_create=False: {
+        "recipes": {},
+        "tags": {},
+        "supported_recipes": {},
+    })
+
+    try:
+        status = cookbook.preload.preload_before_fork(["test-a"])
+
+        assert status["test-a"]["state"] == cookbook.preload.READY
+        assert gc.get_freeze_count() > 0
+    finally:
+        gc.unfreeze()
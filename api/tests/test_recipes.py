@@ -0,0 +1,133 @@
+import log
+import pytest
+
+import cookbook.recipes
+
+
+def test__create_recipe_ir__shaped():
+    recipe_ir = cookbook.recipes.create_recipe_ir({
+        "name": "iron_pickaxe",
+        "type": "minecraft:crafting_shaped",
+        "pattern": ["XXX", " # ", " # "],
+        "key": {
+            "#": {"tag": "minecraft:sticks"},
+            "X": [{"item": "minecraft:iron_ingot"}, {"item": "minecraft:gold_ingot"}],
+        },
+        "result": {"item": "minecraft:iron_pickaxe"},
+    })
+
+    assert recipe_ir == {
+        "name": "iron_pickaxe",
+        "type": "minecraft:crafting_shaped",
+        "kind": "shaped",
+        "result": "iron_pickaxe",
+        "count": 1,
+        "ingredients": [
+            {"options": [{"item": "iron_ingot", "amount": 3}, {"item": "gold_ingot", "amount": 3}]},
+            {"tag": "sticks", "amount": 2},
+        ],
+    }
+
+
+def test__create_recipe_ir__counts_listed_ingredients():
+    recipe_ir = cookbook.recipes.create_recipe_ir({
+        "name": "book",
+        "type": "minecraft:crafting_shapeless",
+        "ingredients": [
+            {"tag": "minecraft:wool"},
+            {"item": "minecraft:paper"},
+            "minecraft:leather",
+            {"item": "minecraft:paper"},
+        ],
+        "result": {"item": "minecraft:book"},
+    })
+
+    assert recipe_ir["kind"] == "shapeless"
+    assert recipe_ir["ingredients"] == [
+        {"item": "paper", "amount": 2},
+        {"item": "leather", "amount": 1},
+        {"tag": "wool", "amount": 1},
+    ]
+
+
+def test__create_recipe_ir__single_ingredient_options():
+    recipe_ir = cookbook.recipes.create_recipe_ir({
+        "name": "glass",
+        "type": "minecraft:smelting",
+        "ingredient": [{"item": "minecraft:sand"}, {"item": "minecraft:red_sand"}],
+        "result": "minecraft:glass",
+    })
+    recipe = cookbook.recipes.create_recipe(recipe_ir)
+
+    assert recipe.kind == cookbook.recipes.SINGLE_INGREDIENT
+    assert recipe.result_name == "glass"
+    assert recipe.amount_created == 1
+    assert recipe.ingredients == (
+        {"options": [{"item": "sand", "amount": 1}, {"item": "red_sand", "amount": 1}]},
+    )
+
+
+@pytest.mark.parametrize(
+    "recipe",
+    [
+        {"name": "no_type"},
+        {"name": "no_result", "type": "minecraft:crafting_shapeless", "ingredients": []},
+        {
+            "name": "no_key",
+            "type": "minecraft:crafting_shaped",
+            "pattern": ["#"],
+            "result": {"item": "minecraft:stick"},
+        },
+        {
+            "name": "no_item",
+            "type": "minecraft:smithing",
+            "base": {"item": "minecraft:diamond_sword"},
+            "result": {"item": "minecraft:netherite_sword"},
+        },
+    ],
+)
+def test__create_recipe_ir__invalid(recipe):
+    with pytest.raises(ValueError):
+        cookbook.recipes.create_recipe_ir(recipe)
+
+
+@pytest.mark.parametrize(
+    "recipe_type,expected",
+    [
+        ("minecraft:crafting_shapeless", cookbook.recipes.SHAPELESS),
+        ("minecraft:campfire_cooking", cookbook.recipes.SHAPELESS),
+        ("minecraft:smithing", cookbook.recipes.SMITHING),
+        ("minecraft:stonecutting", cookbook.recipes.SINGLE_INGREDIENT),
+        ("cookbook:custom", cookbook.recipes.SHAPELESS),
+        ("minecraft:crafting_special_bookcloning", cookbook.recipes.UNSUPPORTED),
+    ],
+)
+def test__get_recipe_kind(recipe_type, expected):
+    assert cookbook.recipes.get_recipe_kind(recipe_type) == expected
+
+
+def test__get_recipe_models__prefers_recipe_ir():
+    all_recipes = {
+        "bookcloning": {"type": "minecraft:crafting_special_bookcloning"},
+        "stick": {"type": "minecraft:crafting_shapeless", "result": "minecraft:stick"},
+    }
+    recipe_ir = {
+        "stick": {
+            "name": "stick",
+            "type": "minecraft:crafting_shaped",
+            "kind": "shaped",
+            "result": "stick",
+            "count": 4,
+            "ingredients": [{"tag": "planks", "amount": 2}],
+        },
+    }
+    recipe_models = cookbook.recipes.get_recipe_models(
+        "test-recipes", all_recipes, recipe_ir=recipe_ir, force_create=True
+    )
+
+    assert recipe_models["bookcloning"].name == "bookcloning"
+    assert not recipe_models["bookcloning"].is_supported
+    assert recipe_models["bookcloning"].ingredients == ()
+    assert recipe_models["stick"].kind == cookbook.recipes.SHAPED
+    assert recipe_models["stick"].amount_created == 4
+    cookbook.caches.invalidate_caches("test-recipes")
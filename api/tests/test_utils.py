@@ -127,3 +127,44 @@ def test__is_supported_recipe(test_input, expected):
 #         all_crafting_data["recipes"],
 #     )
 #     assert output == expected
+
+
+def test__share_record():
+    recipe = {"type": "minecraft:crafting_shapeless", "result": {"item": "minecraft:stick"}}
+    same_recipe = {"result": {"item": "minecraft:stick"}, "type": "minecraft:crafting_shapeless"}
+    other_recipe = {"type": "minecraft:crafting_shapeless", "result": {"item": "minecraft:torch"}}
+
+    shared_recipe = cookbook.utils.share_record(recipe)
+
+    assert cookbook.utils.share_record(same_recipe) is shared_recipe
+    assert cookbook.utils.share_record(other_recipe) is not shared_recipe
+    assert cookbook.utils.share_record(other_recipe) == other_recipe
+
+
+def test__share_dataset_between_versions():
+    recipes = {"stick": {"type": "minecraft:crafting_shaped", "result": {"item": "minecraft:stick"}}}
+    recipes_copy = {"stick": {"type": "minecraft:crafting_shaped", "result": {"item": "minecraft:stick"}}}
+
+    shared_recipes = cookbook.data.share_dataset("recipes", recipes)
+    other_shared_recipes = cookbook.data.share_dataset("recipes", recipes_copy)
+
+    assert shared_recipes == recipes
+    assert other_shared_recipes["stick"] is shared_recipes["stick"]
+
+
+def test__share_record__released_when_unused():
+    record = cookbook.utils.share_record({"name": "released_record", "amount_required": 1})
+    record_key = next(
+        key for (key, value) in cookbook.utils.shared_records.items() if value is record
+    )
+
+    del record
+    assert record_key not in cookbook.utils.shared_records
+
+
+def test__to_plain_data():
+    record = cookbook.utils.share_record([{"name": "stick", "amount_required": 2}])
+    plain_data = cookbook.utils.to_plain_data({"ingredients": (record,)})
+
+    assert plain_data == {"ingredients": ([{"name": "stick", "amount_required": 2}],)}
+    assert type(plain_data["ingredients"][0]) is list
@@ -167,3 +167,31 @@ export function createBuildPaths (recipeTree, selectedItems, isGroup) {
 
   return path
 }
+
+export function resolveRecipeTreeDag (dag, refs) {
+  if (typeof refs === 'undefined') {
+    refs = dag.root
+  }
+
+  const tree = []
+
+  for (let i = 0, l = refs.length; i < l; i += 1) {
+    const ref = refs[i]
+
+    if (Array.isArray(ref)) {
+      tree.push(resolveRecipeTreeDag(dag, ref))
+      continue
+    }
+
+    // Every place a node is used gets it's own copy, the tree is changed
+    // as recipes are selected
+    const node = Object.assign({}, dag.nodes[ref])
+    node.recipes = node.recipes.map(recipe => Object.assign({}, recipe, {
+      ingredients: resolveRecipeTreeDag(dag, recipe.ingredients)
+    }))
+
+    tree.push(node)
+  }
+
+  return tree
+}
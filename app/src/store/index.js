@@ -2,7 +2,7 @@ import Vue from 'vue'
 import Vuex from 'vuex'
 import VuexPersistence from 'vuex-persist'
 import axios from 'axios'
-import { clone, createBuildPaths } from '@/helpers.js'
+import { clone, createBuildPaths, resolveRecipeTreeDag } from '@/helpers.js'
 const CancelToken = axios.CancelToken
 
 Vue.use(Vuex)
@@ -174,7 +174,6 @@ export default new Vuex.Store({
           }
 
           dispatch('fetchRecipeTree')
-            .then(() => dispatch('fetchShoppingList'))
 
           resolve()
         })
@@ -234,24 +233,35 @@ export default new Vuex.Store({
           commit('setRequest', { requestName, cancelToken: null })
           commit('setDefaultRecipeTree', [])
           commit('setRecipeTree', [])
+          commit('setDefaultShoppingList', [])
+          commit('setShoppingList', [])
+          commit('setHaveAlready')
           resolve()
           return
         }
 
+        // The shopping list for the default path comes back with the tree
         axios
           .post(
-            `${getters.apiURL}/recipe_tree`,
+            `${getters.apiURL}/recipe_tree_and_shopping_list`,
             {
               items: getters.compatibleSelectedItems,
-              selected_build_paths: state.selectedBuildPaths
+              selected_build_paths: state.selectedBuildPaths,
+              have_already: state.haveAlready,
+              format: 'dag'
             },
             { cancelToken: cancelToken.token }
           )
           .then(response => {
+            const recipeTree = resolveRecipeTreeDag(response.data.recipe_tree)
+            const shoppingList = response.data.shopping_list
             commit('setRequest', { requestName, cancelToken: null })
-            commit('setDefaultRecipeTree', clone(response.data))
-            commit('setRecipeTree', response.data)
+            commit('setDefaultRecipeTree', clone(recipeTree))
+            commit('setRecipeTree', recipeTree)
             commit('setSelectedBuildPaths')
+            commit('setDefaultShoppingList', clone(shoppingList))
+            commit('setShoppingList', shoppingList)
+            commit('setHaveAlready')
             resolve()
           })
           .catch((err) => {
@@ -392,7 +402,6 @@ export default new Vuex.Store({
 
       if (fetchTree) {
         return dispatch('fetchRecipeTree')
-          .then(() => dispatch('fetchShoppingList'))
       }
 
       return dispatch('fetchShoppingList')